@@ -0,0 +1,217 @@
+"""
+Admission control for Grabitar's ingest endpoints.
+Per-client token buckets, a streaming cap on request bodies and a global
+limit on concurrent image decodes, so one misbehaving client cannot push
+the server into swap or slow everyone else down.
+
+Response contract:
+    413  body larger than the upload limit (checked against Content-Length
+         up front, and while the body streams in)
+    429  client over its rate limit, or every decode slot busy; carries a
+         Retry-After header (seconds)
+"""
+
+import asyncio
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, Iterable, Optional, Tuple
+
+
+class RateLimited(Exception):
+    """Raised when a request has to wait; ``retry_after`` is in seconds."""
+    
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Allows ``rate`` events per second on average, in bursts of up to ``burst``."""
+    
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+    
+    def take(self, now: Optional[float] = None) -> float:
+        """Spend a token; returns 0 if one was available, else seconds until one is."""
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """
+    One token bucket per client key.
+    
+    Only the ``max_clients`` most recently seen clients are tracked; a client
+    forgotten in between starts again with a full bucket.
+    """
+    
+    def __init__(self, rate: float, burst: float, max_clients: int = 1024):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[Tuple, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def check(self, key: Tuple):
+        """Spend one of the client's tokens or raise RateLimited."""
+        with self._lock:
+            bucket = self._buckets.pop(key, None)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst)
+            self._buckets[key] = bucket
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+            retry_after = bucket.take()
+        if retry_after:
+            raise RateLimited("Too many uploads from this client", retry_after)
+
+
+class DecodeLimiter:
+    """
+    Caps the number of image decodes in flight across all clients.
+    
+    A request waits up to ``max_wait`` seconds for a slot, then is turned
+    away instead of queueing without bound behind the decodes ahead of it.
+    """
+    
+    def __init__(self, slots: int, max_wait: float = 2.0):
+        self.slots = slots
+        self.max_wait = max_wait
+        self._semaphore: Optional[asyncio.Semaphore] = None
+    
+    @asynccontextmanager
+    async def slot(self):
+        if self._semaphore is None:
+            # Created lazily so it binds to the server's event loop
+            self._semaphore = asyncio.Semaphore(self.slots)
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.max_wait)
+        except asyncio.TimeoutError:
+            raise RateLimited("Server is busy decoding other uploads", 1.0)
+        try:
+            yield
+        finally:
+            self._semaphore.release()
+
+
+def client_key(scope) -> Tuple:
+    """
+    Identify the client: its address plus the page origin, since every tab
+    using the bookmarklet reaches the server from the same local address.
+    """
+    host = (scope.get("client") or ("local",))[0]
+    origin = b""
+    for name, value in scope.get("headers", ()):
+        if name == b"origin":
+            origin = value
+            break
+    return host, origin.decode("latin-1")
+
+
+def _error_messages(status: int, detail: str, headers: Iterable[Tuple[bytes, bytes]] = ()):
+    body = json.dumps({"detail": detail}).encode()
+    return [
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"),
+                        (b"content-length", str(len(body)).encode()), *headers],
+        },
+        {"type": "http.response.body", "body": body},
+    ]
+
+
+def retry_after_header(seconds: float) -> Dict[str, str]:
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware guarding uploads before their bodies are read.
+    
+    Requests to ``rate_limited_paths`` spend a token from their client's
+    bucket. Every request body is capped at ``max_body_bytes`` (except
+    under ``unlimited_paths``): a larger Content-Length is refused at
+    once, and a body without one is counted as it streams in and cut off
+    with 413 as soon as it passes the cap.
+    """
+    
+    def __init__(self, app, limiter: RateLimiter, rate_limited_paths: Iterable[str],
+                 max_body_bytes: int, unlimited_paths: Iterable[str] = ()):
+        self.app = app
+        self.limiter = limiter
+        self.rate_limited_paths = set(rate_limited_paths)
+        self.max_body_bytes = max_body_bytes
+        self.unlimited_paths = tuple(unlimited_paths)
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS"):
+            await self.app(scope, receive, send)
+            return
+        
+        path = scope["path"]
+        if path in self.rate_limited_paths:
+            try:
+                self.limiter.check(client_key(scope))
+            except RateLimited as e:
+                headers = [(k.lower().encode(), v.encode()) for k, v in retry_after_header(e.retry_after).items()]
+                for message in _error_messages(429, str(e), headers):
+                    await send(message)
+                return
+        
+        if path.startswith(self.unlimited_paths):
+            await self.app(scope, receive, send)
+            return
+        
+        limit = self.max_body_bytes
+        too_large = f"Upload exceeds the {limit // (1024 * 1024)} MB limit"
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                if value.isdigit() and int(value) > limit:
+                    for message in _error_messages(413, too_large):
+                        await send(message)
+                    return
+                break
+        
+        received = 0
+        cut_off = False
+        rejected = False
+        response_started = False
+        
+        async def limited_receive():
+            nonlocal received, cut_off, rejected
+            if cut_off:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    cut_off = True
+                    if not response_started:
+                        rejected = True
+                        for error in _error_messages(413, too_large):
+                            await send(error)
+                    # The app sees a client that went away and stops reading
+                    return {"type": "http.disconnect"}
+            return message
+        
+        async def guarded_send(message):
+            nonlocal response_started
+            if rejected:
+                return
+            response_started = True
+            await send(message)
+        
+        await self.app(scope, limited_receive, guarded_send)
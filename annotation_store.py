@@ -0,0 +1,249 @@
+"""
+Columnar annotation storage for Grabitar.
+Keeps a capture's annotations as parallel arrays so thousands of them stay
+cheap to add, serialize and render.
+"""
+
+from array import array
+from typing import Dict, Iterator, List, Optional, Sequence, Union
+from PIL import ImageDraw
+
+from annotations import (
+    Annotation, BoxAnnotation, TextAnnotation, box_bounds, draw_box, draw_text, text_bounds
+)
+from spatial_index import Box, GridIndex
+
+KIND_BOX = 0
+KIND_TEXT = 1
+
+# Index stored in the background column for "no background"
+_NO_STRING = 0xFFFF
+
+# Range of the "i" coordinate columns
+_INT32_MIN = -2 ** 31
+_INT32_MAX = 2 ** 31 - 1
+
+
+class _StringTable:
+    """Interns repeated strings (colors) so each row stores a small index."""
+    
+    def __init__(self):
+        self.values: List[str] = []
+        self._index: Dict[str, int] = {}
+    
+    def intern(self, value: str) -> int:
+        index = self._index.get(value)
+        if index is None:
+            if len(self.values) >= _NO_STRING:
+                raise ValueError("Too many distinct annotation colors")
+            index = self._index[value] = len(self.values)
+            self.values.append(value)
+        return index
+
+
+class AnnotationStore(Sequence[Annotation]):
+    """
+    Struct-of-arrays store of box and text annotations.
+    
+    Coordinates, sizes and interned color indexes live in typed arrays; only
+    labels and texts are Python strings. Indexing or iterating builds the
+    pydantic models on demand, for use at the API boundary; serialization
+    and rendering read the arrays directly.
+    """
+    
+    def __init__(self):
+        self.kind = array("B")
+        self.x = array("i")
+        self.y = array("i")
+        # Zero for text annotations, whose extent depends on the font
+        self.width = array("i")
+        self.height = array("i")
+        # Line width for boxes, font size for texts
+        self.size = array("H")
+        self.color = array("H")
+        self.background = array("H")
+        # Label for boxes, text for texts
+        self.text: List[Optional[str]] = []
+        self.colors = _StringTable()
+        # Built on the first spatial query, then kept up to date on append
+        self._index: Optional[GridIndex] = None
+    
+    def __len__(self) -> int:
+        return len(self.kind)
+    
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("annotation index out of range")
+        return self._model(index)
+    
+    def __iter__(self) -> Iterator[Annotation]:
+        for i in range(len(self)):
+            yield self._model(i)
+    
+    def _model(self, i: int) -> Annotation:
+        if self.kind[i] == KIND_TEXT:
+            return TextAnnotation(**self._text_dict(i))
+        return BoxAnnotation(**self._box_dict(i))
+    
+    def _string(self, index: int) -> Optional[str]:
+        return None if index == _NO_STRING else self.colors.values[index]
+    
+    # ----- adding -----
+    
+    def add_box(self, x: int, y: int, width: int, height: int,
+                color: str = "red", line_width: int = 3, label: Optional[str] = None):
+        """Append a box annotation."""
+        self._append(KIND_BOX, x, y, width, height, line_width, color, None, label)
+    
+    def add_text(self, x: int, y: int, text: str, font_size: int = 20,
+                 color: str = "red", background: Optional[str] = "white"):
+        """Append a text annotation."""
+        if not isinstance(text, str):
+            raise ValueError("Text annotation text must be a string")
+        self._append(KIND_TEXT, x, y, 0, 0, font_size, color, background, text)
+    
+    def extend_from_dicts(self, items: List[dict]):
+        """Append annotations in their serialized form (as in capture metadata)."""
+        for item in items:
+            if item.get("type") == "text":
+                self.add_text(
+                    item["x"], item["y"], item["text"],
+                    item.get("font_size", 20), item.get("color", "red"),
+                    item.get("background", "white")
+                )
+            else:
+                self.add_box(
+                    item["x"], item["y"], item["width"], item["height"],
+                    item.get("color", "red"), item.get("line_width", 3), item.get("label")
+                )
+    
+    def _append(self, kind: int, x, y, width, height, size, color: str,
+                background: Optional[str], text: Optional[str]):
+        # Validate everything before touching the columns, so they stay aligned
+        try:
+            values = (int(x), int(y), int(width), int(height), int(size))
+        except (TypeError, ValueError):
+            raise ValueError("Annotation coordinates and sizes must be integers") from None
+        if not isinstance(color, str) or (background is not None and not isinstance(background, str)):
+            raise ValueError("Annotation colors must be strings")
+        if text is not None and not isinstance(text, str):
+            raise ValueError("Annotation label must be a string")
+        if not all(_INT32_MIN <= value <= _INT32_MAX for value in values[:4]):
+            raise ValueError("Annotation coordinates out of range")
+        if not 0 <= values[4] <= 0xFFFF:
+            raise ValueError("Annotation line width / font size out of range")
+        color_index = self.colors.intern(color)
+        background_index = _NO_STRING if background is None else self.colors.intern(background)
+        
+        self.kind.append(kind)
+        self.x.append(values[0])
+        self.y.append(values[1])
+        self.width.append(values[2])
+        self.height.append(values[3])
+        self.size.append(values[4])
+        self.color.append(color_index)
+        self.background.append(background_index)
+        self.text.append(text)
+        if self._index is not None:
+            self._index.insert(len(self.kind) - 1, self.bounds(len(self.kind) - 1))
+    
+    def clear(self):
+        """Remove every annotation."""
+        for column in (self.kind, self.x, self.y, self.width, self.height,
+                       self.size, self.color, self.background):
+            del column[:]
+        self.text.clear()
+        self.colors = _StringTable()
+        self._index = None
+    
+    # ----- spatial queries -----
+    
+    def bounds(self, i: int) -> Box:
+        """Pixel extent (left, top, right, bottom; exclusive) of annotation ``i``."""
+        if self.kind[i] == KIND_TEXT:
+            return text_bounds(self.x[i], self.y[i], self.text[i], self.size[i],
+                               self._string(self.background[i]))
+        return box_bounds(self.x[i], self.y[i], self.width[i], self.height[i], self.text[i])
+    
+    def _spatial_index(self) -> GridIndex:
+        if self._index is None:
+            index = GridIndex()
+            for i in range(len(self.kind)):
+                index.insert(i, self.bounds(i))
+            self._index = index
+        return self._index
+    
+    def query(self, box: Box) -> List[int]:
+        """Indexes of annotations intersecting ``box``, in drawing order."""
+        return self._spatial_index().query(box)
+    
+    def to_dict(self, i: int) -> dict:
+        """Serialize one annotation, including its index and bounds."""
+        data = self._text_dict(i) if self.kind[i] == KIND_TEXT else self._box_dict(i)
+        left, top, right, bottom = self._spatial_index().bounds(i)
+        data["index"] = i
+        data["bounds"] = {"x": left, "y": top, "width": right - left, "height": bottom - top}
+        return data
+    
+    # ----- serialization -----
+    
+    def _box_dict(self, i: int) -> dict:
+        return {
+            "type": "box",
+            "x": self.x[i],
+            "y": self.y[i],
+            "width": self.width[i],
+            "height": self.height[i],
+            "color": self.colors.values[self.color[i]],
+            "line_width": self.size[i],
+            "label": self.text[i],
+        }
+    
+    def _text_dict(self, i: int) -> dict:
+        return {
+            "type": "text",
+            "x": self.x[i],
+            "y": self.y[i],
+            "text": self.text[i],
+            "font_size": self.size[i],
+            "color": self.colors.values[self.color[i]],
+            "background": self._string(self.background[i]),
+        }
+    
+    def to_dicts(self) -> List[dict]:
+        """Serialize every annotation, without building pydantic models."""
+        kinds = self.kind
+        return [
+            self._text_dict(i) if kinds[i] == KIND_TEXT else self._box_dict(i)
+            for i in range(len(kinds))
+        ]
+    
+    # ----- rendering -----
+    
+    def render(self, draw: ImageDraw.ImageDraw, region: Optional[Box] = None, scale: float = 1.0):
+        """
+        Draw the annotations, in insertion order.
+        
+        With a ``region``, only annotations intersecting it are drawn, shifted
+        so the region's top-left corner lands at the drawing's origin. With a
+        ``scale``, they are drawn to match the image resized by that factor.
+        """
+        if region is None:
+            indexes = range(len(self.kind))
+            dx = dy = 0
+        else:
+            indexes = self.query(region)
+            dx, dy = -region[0], -region[1]
+        
+        colors = self.colors.values
+        for i in indexes:
+            if self.kind[i] == KIND_TEXT:
+                draw_text(draw, self.x[i] + dx, self.y[i] + dy, self.text[i], self.size[i],
+                          colors[self.color[i]], self._string(self.background[i]), scale)
+            else:
+                draw_box(draw, self.x[i] + dx, self.y[i] + dy, self.width[i], self.height[i],
+                         colors[self.color[i]], self.size[i], self.text[i], scale)
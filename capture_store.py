@@ -0,0 +1,443 @@
+"""
+Persistent capture storage for Grabitar.
+SQLite holds capture metadata and annotations; pixels live in a blob
+directory as fast-compressed PNGs, one file per content digest.
+
+A store can also be shared by several server processes. Writes then go
+through before returning, every change is logged so the other processes
+can catch up, capture numbers come from a shared counter, and pixels are
+stored raw so a process loads them by mapping the file instead of
+decoding a PNG.
+"""
+
+import json
+import logging
+import mmap
+import os
+import queue
+import sqlite3
+import struct
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from PIL import Image
+
+logger = logging.getLogger("grabitar.store")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS captures (
+    id TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    timestamp TEXT NOT NULL,
+    monitor INTEGER NOT NULL,
+    region TEXT,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    pixel_keys TEXT NOT NULL,
+    tiles TEXT,
+    revision INTEGER NOT NULL,
+    annotations TEXT NOT NULL,
+    parent_id TEXT,
+    crop TEXT,
+    dhash TEXT
+);
+CREATE INDEX IF NOT EXISTS captures_seq ON captures (seq);
+CREATE TABLE IF NOT EXISTS changes (
+    version INTEGER PRIMARY KEY AUTOINCREMENT,
+    capture_id TEXT,
+    op TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+# Columns added after the first release, for upgrading existing databases
+_ADDED_COLUMNS = {
+    "parent_id": "TEXT",
+    "crop": "TEXT",
+    "dhash": "TEXT",
+    "expires_at": "REAL",
+}
+
+_INDEX_COLUMNS = (
+    "id, timestamp, monitor, region, width, height, pixel_keys, tiles, revision, annotations, "
+    "parent_id, crop, dhash, expires_at"
+)
+
+# Logged changes kept for processes catching up; one further behind reloads the index
+_CHANGE_LOG_LENGTH = 10000
+
+# Raw pixel blobs: magic, mode (padded to 4 bytes), width, height, then pixel rows
+_RAW_MAGIC = b"GRAW"
+_RAW_HEADER = struct.Struct("<4s4sII")
+
+
+def _hex(value: Optional[int]) -> Optional[str]:
+    # Stored as text: SQLite integers are signed and hashes use all 64 bits
+    return f"{value:016x}" if value is not None else None
+
+
+def _row_dict(row) -> dict:
+    return {
+        "id": row[0],
+        "timestamp": row[1],
+        "monitor": row[2],
+        "region": json.loads(row[3]) if row[3] else None,
+        "width": row[4],
+        "height": row[5],
+        "pixel_keys": json.loads(row[6]),
+        "tiles": json.loads(row[7]) if row[7] else None,
+        "revision": row[8],
+        "annotations_json": row[9],
+        "parent_id": row[10],
+        "crop": json.loads(row[11]) if row[11] else None,
+        "dhash": int(row[12], 16) if row[12] else None,
+        "expires_at": row[13],
+    }
+
+
+class CaptureStore:
+    """
+    Write-behind persistent store for captures.
+    
+    Callers enqueue changes and return immediately; a writer thread batches
+    them into a single SQLite transaction per flush interval, so capturing
+    and annotating never wait on disk I/O or fsync.
+    
+    With ``shared``, each change is written before the call returns (so
+    other processes can see it at once) and recorded in the change log.
+    """
+    
+    def __init__(self, directory: str, flush_interval: float = 0.5, batch_size: int = 64,
+                 shared: bool = False):
+        self.directory = directory
+        self.blob_dir = os.path.join(directory, "blobs")
+        self.db_path = os.path.join(directory, "captures.db")
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.shared = shared
+        self._local = threading.local()
+        os.makedirs(self.blob_dir, exist_ok=True)
+        
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(captures)")}
+            for column, column_type in _ADDED_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE captures ADD COLUMN {column} {column_type}")
+        
+        self._queue: queue.Queue = queue.Queue()
+        self._seq = 0
+        self._writer = threading.Thread(target=self._run, name="grabitar-store", daemon=True)
+        self._writer.start()
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+    
+    def _reader(self) -> sqlite3.Connection:
+        """This thread's connection, for reads and shared-counter updates."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+    
+    def _blob_path(self, key: str, extension: str = ".png") -> str:
+        return os.path.join(self.blob_dir, key.replace(":", "_") + extension)
+    
+    # ----- reads (caller's thread) -----
+    
+    def load_index(self) -> List[dict]:
+        """
+        Load the lightweight capture index, oldest first.
+        
+        Only metadata columns are read; pixels stay on disk and the
+        annotation JSON is handed back unparsed.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT {_INDEX_COLUMNS} FROM captures ORDER BY seq").fetchall()
+            self._seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM captures").fetchone()[0]
+        
+        return [_row_dict(row) for row in rows]
+    
+    def load_row(self, capture_id: str) -> Optional[dict]:
+        """Load one capture's index entry, as in ``load_index``."""
+        row = self._reader().execute(
+            f"SELECT {_INDEX_COLUMNS} FROM captures WHERE id = ?", (capture_id,)
+        ).fetchone()
+        return _row_dict(row) if row else None
+    
+    def load_blob(self, key: str) -> Image.Image:
+        """Load a stored pixel buffer."""
+        raw_path = self._blob_path(key, ".raw")
+        if os.path.exists(raw_path):
+            with open(raw_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                magic, mode, width, height = _RAW_HEADER.unpack_from(mapped)
+                if magic != _RAW_MAGIC:
+                    raise ValueError(f"Corrupt pixel blob {raw_path}")
+                # One copy out of the page cache, which all processes share
+                return Image.frombytes(mode.rstrip(b"\0").decode(), (width, height),
+                                       memoryview(mapped)[_RAW_HEADER.size:])
+        image = Image.open(self._blob_path(key))
+        image.load()
+        return image
+    
+    def latest_change(self) -> int:
+        """Version of the newest logged change (0 if none)."""
+        return self._reader().execute("SELECT COALESCE(MAX(version), 0) FROM changes").fetchone()[0]
+    
+    def changes_since(self, version: int) -> Tuple[int, Optional[List[Tuple[str, str]]]]:
+        """
+        (latest version, [(capture_id, op), ...]) for changes after ``version``,
+        oldest first. The list is None if those changes have already been
+        dropped from the log; the caller must reload the whole index.
+        """
+        conn = self._reader()
+        rows = conn.execute(
+            "SELECT version, capture_id, op FROM changes WHERE version > ? ORDER BY version", (version,)
+        ).fetchall()
+        if not rows:
+            return version, []
+        if rows[0][0] != version + 1:
+            oldest = conn.execute("SELECT MIN(version) FROM changes").fetchone()[0]
+            if oldest > version + 1:
+                return rows[-1][0], None
+        return rows[-1][0], [(capture_id, op) for _, capture_id, op in rows]
+    
+    def next_capture_number(self) -> int:
+        """Allocate the next capture number from the counter shared by all processes."""
+        conn = self._reader()
+        with conn:
+            return conn.execute(
+                "INSERT INTO counters (name, value) VALUES ('capture', 1) "
+                "ON CONFLICT (name) DO UPDATE SET value = value + 1 RETURNING value"
+            ).fetchone()[0]
+    
+    def reserve_capture_number(self, number: int):
+        """Make sure the shared counter never hands out ``number`` (or less) again."""
+        conn = self._reader()
+        with conn:
+            conn.execute(
+                "INSERT INTO counters (name, value) VALUES ('capture', ?) "
+                "ON CONFLICT (name) DO UPDATE SET value = MAX(value, excluded.value)", (number,)
+            )
+    
+    # ----- writes (queued for the writer thread) -----
+    
+    def _submit(self, op: str, arg, seq: Optional[int] = None):
+        self._queue.put((op, arg, seq))
+        if self.shared:
+            self.flush()
+    
+    def save_capture(self, capture):
+        """Persist a new capture (its pixels and metadata)."""
+        if self.shared:
+            # Ordered by the database, since other processes insert too
+            self._submit("put", capture)
+            return
+        self._seq += 1
+        self._submit("put", capture, self._seq)
+    
+    def save_annotations(self, capture):
+        """Persist a capture's current annotations."""
+        self._submit("annotations", capture)
+    
+    def save_dhash(self, capture):
+        """Persist a perceptual hash computed after the capture was stored."""
+        self._submit("dhash", capture)
+    
+    def save_expiry(self, capture):
+        """Persist a capture's changed expiry time."""
+        self._submit("expiry", capture)
+    
+    def delete_capture(self, capture_id: str):
+        self._submit("delete", capture_id)
+    
+    def delete_captures(self, capture_ids: List[str]):
+        """Delete several captures, waiting (when shared) only once."""
+        for capture_id in capture_ids:
+            self._queue.put(("delete", capture_id, None))
+        if self.shared:
+            self.flush()
+    
+    def clear(self):
+        self._submit("clear", None)
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything queued so far has been written."""
+        done = threading.Event()
+        self._queue.put(("flush", done, None))
+        return done.wait(timeout)
+    
+    def close(self):
+        """Flush pending writes and stop the writer thread."""
+        self._queue.put(("close", None, None))
+        self._writer.join()
+    
+    # ----- writer thread -----
+    
+    def _run(self):
+        conn = self._connect()
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and batch[-1][0] not in ("flush", "close"):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            try:
+                self._apply(conn, batch)
+            except Exception as e:
+                logger.error(f"Failed to persist {len(batch)} capture change(s): {e}", exc_info=True)
+            
+            for op, arg, _ in batch:
+                if op == "flush":
+                    arg.set()
+                elif op == "close":
+                    running = False
+        conn.close()
+    
+    def _apply(self, conn: sqlite3.Connection, batch: list):
+        """Write one batch of queued operations in a single transaction."""
+        # Later changes to the same capture supersede earlier ones
+        written: Dict[str, int] = {}
+        # Blobs that may have lost their last reference in this batch
+        orphans = set()
+        with conn:
+            if self.shared:
+                # Take the write lock up front, so another process cannot
+                # remove a blob between our existence check and our insert
+                conn.execute("BEGIN IMMEDIATE")
+            for op, arg, seq in batch:
+                if op == "put":
+                    if not self._write_blobs(arg):
+                        # Deleted before we got to it; its delete follows in the queue
+                        continue
+                    written[arg.id] = self._write_row(conn, arg, seq)
+                    self._log_change(conn, arg.id, op)
+                elif op == "annotations":
+                    # Revision and annotations from one snapshot, taken together
+                    metadata = arg.get_metadata()
+                    if written.get(arg.id) == metadata["revision"]:
+                        continue
+                    # The stored revision always moves past the one it replaces, so
+                    # when two workers edit from the same revision the later write
+                    # gets a higher revision and the other worker reloads it
+                    conn.execute(
+                        "UPDATE captures SET revision = MAX(revision + 1, ?), annotations = ? WHERE id = ?",
+                        (metadata["revision"], json.dumps(metadata["annotations"]), arg.id)
+                    )
+                    written[arg.id] = metadata["revision"]
+                    self._log_change(conn, arg.id, op)
+                elif op == "dhash":
+                    conn.execute(
+                        "UPDATE captures SET dhash = ? WHERE id = ?",
+                        (_hex(arg.dhash), arg.id)
+                    )
+                elif op == "expiry":
+                    conn.execute(
+                        "UPDATE captures SET expires_at = ? WHERE id = ?",
+                        (arg.expires_at, arg.id)
+                    )
+                    self._log_change(conn, arg.id, op)
+                elif op == "delete":
+                    for (keys,) in conn.execute("SELECT pixel_keys FROM captures WHERE id = ?", (arg,)):
+                        orphans.update(json.loads(keys))
+                    conn.execute("DELETE FROM captures WHERE id = ?", (arg,))
+                    written.pop(arg, None)
+                    self._log_change(conn, arg, op)
+                elif op == "clear":
+                    for (keys,) in conn.execute("SELECT pixel_keys FROM captures"):
+                        orphans.update(json.loads(keys))
+                    conn.execute("DELETE FROM captures")
+                    conn.execute("DELETE FROM counters WHERE name = 'capture'")
+                    written.clear()
+                    self._log_change(conn, None, op)
+            
+            for key in orphans:
+                still_used = conn.execute(
+                    "SELECT 1 FROM captures WHERE pixel_keys LIKE ? LIMIT 1", (f'%"{key}"%',)
+                ).fetchone()
+                if not still_used:
+                    for extension in (".png", ".raw"):
+                        try:
+                            os.remove(self._blob_path(key, extension))
+                        except OSError:
+                            pass
+            
+            if self.shared:
+                conn.execute("DELETE FROM changes WHERE version <= (SELECT MAX(version) FROM changes) - ?",
+                             (_CHANGE_LOG_LENGTH,))
+    
+    def _log_change(self, conn: sqlite3.Connection, capture_id: Optional[str], op: str):
+        if self.shared:
+            conn.execute("INSERT INTO changes (capture_id, op) VALUES (?, ?)", (capture_id, op))
+    
+    def _write_blobs(self, capture) -> bool:
+        """
+        Write any pixel buffers of the capture that are not on disk yet.
+        Returns False, writing nothing, if the capture was deleted first.
+        """
+        try:
+            with capture.pinned_pixels():
+                for key, image in zip(list(capture.pixel_keys), capture.source_images()):
+                    self._write_blob(key, image)
+        except KeyError:
+            return False
+        return True
+    
+    def _write_blob(self, key: str, image: Image.Image):
+        """Write one pixel buffer, unless it is on disk already."""
+        if os.path.exists(self._blob_path(key)) or os.path.exists(self._blob_path(key, ".raw")):
+            return
+        if self.shared:
+            path = self._blob_path(key, ".raw")
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(_RAW_HEADER.pack(_RAW_MAGIC, image.mode.encode().ljust(4, b"\0"),
+                                         image.width, image.height))
+                f.write(image.tobytes())
+        else:
+            path = self._blob_path(key)
+            tmp_path = f"{path}.tmp"
+            image.save(tmp_path, format="PNG", compress_level=1)
+        os.replace(tmp_path, path)
+    
+    def _write_row(self, conn: sqlite3.Connection, capture, seq: int) -> int:
+        """Insert or replace a capture's row; returns the revision written."""
+        metadata = capture.get_metadata()
+        # Tiles describe the stored source pixels, which a crop only views
+        source_tiles = capture.get_source_tiles_metadata()
+        conn.execute(
+            "INSERT OR REPLACE INTO captures "
+            f"({_INDEX_COLUMNS}, seq) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, "
+            "COALESCE(?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM captures)))",
+            (
+                capture.id,
+                capture.timestamp,
+                capture.monitor,
+                json.dumps(capture.region) if capture.region else None,
+                capture.width,
+                capture.height,
+                json.dumps(capture.pixel_keys),
+                json.dumps(source_tiles) if source_tiles else None,
+                metadata["revision"],
+                json.dumps(metadata["annotations"]),
+                capture.parent_id,
+                json.dumps(capture.crop_box) if capture.crop_box is not None else None,
+                _hex(capture.dhash),
+                capture.expires_at,
+                seq,
+            )
+        )
+        return metadata["revision"]
@@ -0,0 +1,141 @@
+"""
+HTTP response compression for Grabitar.
+Negotiates brotli or gzip from Accept-Encoding and compresses text-like
+responses (JSON, HTML, JS, CSS). Brotli is used when the ``brotli`` package
+is installed; otherwise only gzip is offered.
+"""
+
+import asyncio
+import gzip
+from typing import Dict, Iterable, Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Encodings we can produce, in order of preference when the client rates them equally
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/javascript",
+    "text/javascript",
+    "text/css",
+    "text/html",
+    "text/plain",
+    "image/svg+xml",
+}
+
+# Smaller bodies are sent as they are: the saving would not cover the headers
+MIN_COMPRESS_BYTES = 1024
+# Larger bodies are compressed on a worker thread instead of the event loop
+THREAD_COMPRESS_BYTES = 64 * 1024
+
+
+def choose_encoding(accept_encoding: Optional[str], available: Iterable[str] = ENCODINGS) -> Optional[str]:
+    """
+    The best encoding in ``available`` the client accepts, or None for identity.
+    
+    Honors q-values (``q=0`` refuses an encoding) and ``*``.
+    """
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            weights[name] = quality
+    
+    best, best_quality = None, 0.0
+    for encoding in available:
+        quality = weights.get(encoding, weights.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(data: bytes, encoding: str, static: bool = False) -> bytes:
+    """
+    Compress ``data``. ``static`` selects the strongest (slowest) settings,
+    for content that is compressed once and served many times.
+    """
+    if encoding == "br":
+        return brotli.compress(data, quality=11 if static else 5)
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=9 if static else 6, mtime=0)
+    raise ValueError(f"Unsupported encoding '{encoding}'")
+
+
+def _header(headers, name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing complete text-like responses.
+    
+    Only responses sent as a single body are compressed; streamed responses
+    (images, archives, event streams) and responses that already carry a
+    Content-Encoding pass through untouched.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        accept_encoding = _header(scope["headers"], b"accept-encoding")
+        encoding = choose_encoding(accept_encoding.decode("latin-1") if accept_encoding else None)
+        start = None
+        
+        async def send_compressed(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if start is None:
+                await send(message)
+                return
+            
+            initial, start = start, None
+            headers = initial["headers"]
+            content_type = (_header(headers, b"content-type") or b"").split(b";")[0].strip().decode("latin-1")
+            body = message.get("body", b"")
+            compressible = (
+                content_type in COMPRESSIBLE_TYPES and
+                _header(headers, b"content-encoding") is None and
+                initial["status"] == 200 and
+                not message.get("more_body", False)
+            )
+            if compressible:
+                if b"accept-encoding" not in (_header(headers, b"vary") or b"").lower():
+                    headers = headers + [(b"vary", b"Accept-Encoding")]
+                if encoding is not None and len(body) >= MIN_COMPRESS_BYTES:
+                    if len(body) >= THREAD_COMPRESS_BYTES:
+                        body = await asyncio.to_thread(compress, body, encoding)
+                    else:
+                        body = compress(body, encoding)
+                    headers = [(k, v) for k, v in headers if k.lower() != b"content-length"]
+                    headers += [(b"content-encoding", encoding.encode()),
+                                (b"content-length", str(len(body)).encode())]
+                    message = {**message, "body": body}
+                initial = {**initial, "headers": headers}
+            await send(initial)
+            await send(message)
+        
+        await self.app(scope, receive, send_compressed)
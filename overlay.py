@@ -4,24 +4,49 @@ Transparent overlay with right-click context menu for screen capture and annotat
 """
 
 import tkinter as tk
-from tkinter import simpledialog, messagebox
+from tkinter import filedialog, simpledialog, messagebox
 import asyncio
 import json
 import logging
-from typing import Optional, Tuple
-from capture_manager import CaptureManager
+import os
+import queue
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+from capture_manager import Capture, CaptureManager
+from grabitar_client import GrabitarClient, RemoteCaptureManager
+from save_formats import SAVE_FORMATS
 import threading
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("grabitar.overlay")
 
+# How often the Tk loop checks for finished background work
+RESULT_POLL_MS = 50
+# Longest to wait for the window manager to unmap the overlay before
+# capturing anyway (some window managers never send <Unmap>)
+UNMAP_TIMEOUT_MS = 500
+
+# Where saved captures go unless another folder is chosen from the menu
+DEFAULT_SAVE_DIR = os.environ.get(
+    "GRABITAR_SAVE_DIR", os.path.join(os.path.expanduser("~"), "Pictures", "Grabitar")
+)
+
 
 class GrabitarOverlay:
     """Transparent overlay window with context menu for screen capture"""
     
     def __init__(self):
         self.root = tk.Tk()
-        self.capture_manager = CaptureManager()
+        
+        # Share captures with a running server when there is one; its
+        # socket takes raw frames, so captures are not encoded here
+        client = GrabitarClient()
+        if client.is_available():
+            logger.info(f"Sending captures to the server on {client.socket_path}")
+            self.capture_manager = RemoteCaptureManager(client)
+        else:
+            logger.info("No local server found; keeping captures in this process")
+            self.capture_manager = CaptureManager()
         
         # Store selection coordinates
         self.start_x = None
@@ -33,9 +58,26 @@ class GrabitarOverlay:
         # Store current capture ID
         self.current_capture_id = None
         
+        # Captures run on a worker thread; results come back through a queue
+        # that the Tk loop drains, since Tk may only be touched from its own thread
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="grabitar-capture")
+        self._results: "queue.Queue[Tuple[Callable, object]]" = queue.Queue()
+        self._pending_hidden: Optional[Callable[[], None]] = None
+        self._unmap_timer = None
+        
+        # Saves render and encode in parallel; Pillow releases the GIL while
+        # encoding, so the threads really do spread over the cores
+        self._save_executor = ThreadPoolExecutor(
+            max_workers=os.cpu_count() or 1, thread_name_prefix="grabitar-save"
+        )
+        self.save_dir = DEFAULT_SAVE_DIR
+        self.save_format = tk.StringVar(self.root, value="png")
+        self._saves_running = 0
+        
         self._setup_window()
         self._create_canvas()
         self._bind_events()
+        self.root.after(RESULT_POLL_MS, self._poll_results)
         
     def _setup_window(self):
         """Configure the overlay window"""
@@ -86,6 +128,78 @@ class GrabitarOverlay:
         # Keyboard shortcuts
         self.root.bind("<Control-q>", lambda e: self.quit())
         
+        # Fires once the overlay is really off screen after withdraw()
+        self.root.bind("<Unmap>", self._on_unmap)
+    
+    def _run_in_background(self, work: Callable[[], object],
+                           on_done: Callable[[object], None],
+                           on_error: Callable[[Exception], None]):
+        """Run ``work`` on the worker thread, then its callback on the Tk thread."""
+        def job():
+            try:
+                result = work()
+            except Exception as e:
+                self._results.put((on_error, e))
+            else:
+                self._results.put((on_done, result))
+        self._executor.submit(job)
+    
+    def _poll_results(self):
+        """Deliver finished background work to its callbacks"""
+        while True:
+            try:
+                callback, result = self._results.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(result)
+            except Exception as e:
+                logger.error(f"Error handling background result: {e}")
+        self.root.after(RESULT_POLL_MS, self._poll_results)
+    
+    def _hide_then(self, action: Callable[[], None]):
+        """Hide the overlay and call ``action`` once it is no longer on screen"""
+        if not self.root.winfo_viewable():
+            action()
+            return
+        self._pending_hidden = action
+        self.root.withdraw()
+        self._unmap_timer = self.root.after(UNMAP_TIMEOUT_MS, self._run_pending_hidden)
+    
+    def _on_unmap(self, event):
+        # <Unmap> on the toplevel is also reported for each child widget
+        if event.widget is self.root:
+            self._run_pending_hidden()
+    
+    def _run_pending_hidden(self):
+        action, self._pending_hidden = self._pending_hidden, None
+        if self._unmap_timer is not None:
+            self.root.after_cancel(self._unmap_timer)
+            self._unmap_timer = None
+        if action is not None:
+            action()
+    
+    def _start_capture(self, region: Optional[dict], on_done: Callable[[Capture], None], what: str):
+        """Grab and encode a capture on the worker thread once the overlay is hidden"""
+        def work() -> Capture:
+            capture = self.capture_manager.capture_screen(region=region)
+            if isinstance(capture, Capture):
+                # Encode now so the first request for the image is served from cache
+                capture.to_bytes()
+            return capture
+        
+        def done(capture: Capture):
+            self.root.deiconify()
+            self.current_capture_id = capture.id
+            on_done(capture)
+        
+        def failed(e: Exception):
+            self.root.deiconify()
+            logger.error(f"Error in {what} capture: {e}")
+            messagebox.showerror("Error", f"Failed to capture {what}: {e}")
+        
+        self._hide_then(lambda: self._run_in_background(work, done, failed))
+    
     def _show_context_menu(self, event):
         """Show right-click context menu"""
         menu = tk.Menu(self.root, tearoff=0)
@@ -112,6 +226,18 @@ class GrabitarOverlay:
             label="💾 Save Current Capture",
             command=self._save_capture
         )
+        menu.add_command(
+            label="💾 Save All Captures",
+            command=self._save_all_captures
+        )
+        format_menu = tk.Menu(menu, tearoff=0)
+        for name in SAVE_FORMATS:
+            format_menu.add_radiobutton(label=name.upper(), value=name, variable=self.save_format)
+        menu.add_cascade(label="🖼️ Save Format", menu=format_menu)
+        menu.add_command(
+            label="📁 Choose Save Folder...",
+            command=self._choose_save_dir
+        )
         menu.add_command(
             label="🗑️ Clear Annotations",
             command=self._clear_annotations
@@ -139,38 +265,15 @@ class GrabitarOverlay:
         
     def _capture_window(self):
         """Capture the full screen/window"""
-        try:
-            # Hide overlay temporarily
-            self.root.withdraw()
-            self.root.update()
+        self._start_capture(None, self._on_window_captured, "window")
             
-            # Wait a bit for overlay to hide
-            self.root.after(200, self._do_capture_window)
-        except Exception as e:
-            logger.error(f"Error capturing window: {e}")
-            messagebox.showerror("Error", f"Failed to capture window: {e}")
-            self.root.deiconify()
-            
-    def _do_capture_window(self):
-        """Actually perform the window capture"""
-        try:
-            # Capture full screen
-            capture_id = self.capture_manager.capture_screen()
-            self.current_capture_id = capture_id
-            
-            logger.info(f"Captured window with ID: {capture_id}")
-            messagebox.showinfo(
-                "Capture Complete",
-                f"Screen captured!\nCapture ID: {capture_id}\n\n"
-                "You can now add annotations or use this in VS Code chat."
-            )
-            
-        except Exception as e:
-            logger.error(f"Error in capture: {e}")
-            messagebox.showerror("Error", f"Failed to capture: {e}")
-        finally:
-            # Show overlay again
-            self.root.deiconify()
+    def _on_window_captured(self, capture: Capture):
+        logger.info(f"Captured window with ID: {capture.id}")
+        messagebox.showinfo(
+            "Capture Complete",
+            f"Screen captured!\nCapture ID: {capture.id}\n\n"
+            "You can now add annotations or use this in VS Code chat."
+        )
             
     def _start_add_square(self):
         """Start adding a square annotation"""
@@ -283,47 +386,35 @@ class GrabitarOverlay:
         
     def _capture_area(self, x: int, y: int, width: int, height: int):
         """Capture a specific area"""
-        try:
-            # Hide overlay
-            self.root.withdraw()
-            self.root.update()
-            
-            # Wait a bit
-            self.root.after(200, lambda: self._do_capture_area(x, y, width, height))
+        region = {"x": x, "y": y, "width": width, "height": height}
+        self._start_capture(region, self._on_area_captured, "area")
             
-        except Exception as e:
-            logger.error(f"Error capturing area: {e}")
-            messagebox.showerror("Error", f"Failed to capture area: {e}")
-            self.root.deiconify()
+    def _on_area_captured(self, capture: Capture):
+        region = capture.region
+        logger.info(f"Captured area with ID: {capture.id}")
+        messagebox.showinfo(
+            "Capture Complete",
+            f"Area captured!\nCapture ID: {capture.id}\n"
+            f"Region: {region['width']}x{region['height']} at ({region['x']}, {region['y']})\n\n"
+            "You can now add annotations or use this in VS Code chat."
+        )
             
-    def _do_capture_area(self, x: int, y: int, width: int, height: int):
-        """Actually perform the area capture"""
-        try:
-            # Capture the region
-            region = {"x": x, "y": y, "width": width, "height": height}
-            capture_id = self.capture_manager.capture_screen(region=region)
-            self.current_capture_id = capture_id
+    def _current_capture(self) -> Capture:
+        capture = self.capture_manager.get_capture(self.current_capture_id)
+        if capture is None:
+            raise ValueError(f"Capture {self.current_capture_id} no longer exists")
+        return capture
             
-            logger.info(f"Captured area with ID: {capture_id}")
-            messagebox.showinfo(
-                "Capture Complete",
-                f"Area captured!\nCapture ID: {capture_id}\n"
-                f"Region: {width}x{height} at ({x}, {y})\n\n"
-                "You can now add annotations or use this in VS Code chat."
-            )
-            
-        except Exception as e:
-            logger.error(f"Error in area capture: {e}")
-            messagebox.showerror("Error", f"Failed to capture area: {e}")
-        finally:
-            self.root.deiconify()
+    def _to_capture_coords(self, capture: Capture, x: int, y: int) -> Tuple[int, int]:
+        """Convert overlay (screen) coordinates to the capture's pixel coordinates"""
+        return x - capture.region.get("x", 0), y - capture.region.get("y", 0)
             
     def _add_square_annotation(self, x: int, y: int, width: int, height: int):
         """Add a square annotation to the current capture"""
         try:
-            self.capture_manager.add_box_annotation(
-                self.current_capture_id,
-                x, y, width, height,
+            capture = self._current_capture()
+            capture.add_box_annotation(
+                *self._to_capture_coords(capture, x, y), width, height,
                 color="red",
                 line_width=3
             )
@@ -340,10 +431,10 @@ class GrabitarOverlay:
         """Place text annotation at position"""
         try:
             text = self.pending_text
-            self.capture_manager.add_text_annotation(
-                self.current_capture_id,
+            capture = self._current_capture()
+            capture.add_text_annotation(
+                *self._to_capture_coords(capture, x, y),
                 text,
-                x, y,
                 color="red",
                 font_size=16
             )
@@ -379,34 +470,101 @@ class GrabitarOverlay:
             )
             return
             
+        self._save_captures([self.current_capture_id])
+    
+    def _save_all_captures(self):
+        """Save every capture to the save folder"""
+        capture_ids = [item["id"] for item in self.capture_manager.list_captures()]
+        if not capture_ids:
+            messagebox.showwarning("No Captures", "There are no captures to save yet.")
+            return
+        
+        self._save_captures(capture_ids)
+    
+    def _choose_save_dir(self):
+        """Pick the folder captures are saved to"""
+        directory = filedialog.askdirectory(
+            parent=self.root, initialdir=self.save_dir, title="Save captures to"
+        )
+        if directory:
+            self.save_dir = directory
+            logger.info(f"Saving captures to {directory}")
+    
+    def _save_captures(self, capture_ids: List[str]):
+        """
+        Render and encode captures on the save workers, one task per capture.
+        
+        Progress is shown in the window title as each file finishes and a
+        summary is shown once all of them have.
+        """
+        directory = self.save_dir
+        format = self.save_format.get()
+        extension = SAVE_FORMATS[format][1]
+        batch = {"total": len(capture_ids), "saved": [], "failed": []}
+        self._saves_running += 1
+        
+        def prepare():
+            os.makedirs(directory, exist_ok=True)
+        
+        def save(capture_id: str) -> str:
+            capture = self.capture_manager.get_capture(capture_id)
+            if capture is None:
+                raise ValueError(f"Capture {capture_id} no longer exists")
+            return capture.save(os.path.join(directory, f"{capture_id}{extension}"), format)
+        
+        def submit_all(_):
+            for capture_id in capture_ids:
+                future = self._save_executor.submit(save, capture_id)
+                future.add_done_callback(
+                    lambda f, capture_id=capture_id: self._results.put(
+                        (self._on_save_progress, (batch, capture_id, f))
+                    )
+                )
+        
+        def failed(e: Exception):
+            self._saves_running -= 1
+            self._update_title()
+            logger.error(f"Error creating {directory}: {e}")
+            messagebox.showerror("Error", f"Failed to save: {e}")
+        
+        self._update_title(batch)
+        self._run_in_background(prepare, submit_all, failed)
+    
+    def _on_save_progress(self, progress: Tuple[dict, str, Future]):
+        batch, capture_id, future = progress
         try:
-            # Get the annotated image
-            image_data = self.capture_manager.get_capture(self.current_capture_id)
+            batch["saved"].append(future.result())
+        except Exception as e:
+            logger.error(f"Error saving {capture_id}: {e}")
+            batch["failed"].append(f"{capture_id}: {e}")
             
-            if image_data and 'annotated_image' in image_data:
-                # Save to file
-                filename = f"capture_{self.current_capture_id}.png"
-                filepath = f"/workspaces/grabitar/captures/{filename}"
-                
-                # Create captures directory if needed
-                import os
-                os.makedirs("/workspaces/grabitar/captures", exist_ok=True)
+        if len(batch["saved"]) + len(batch["failed"]) < batch["total"]:
+            self._update_title(batch)
+            return
                 
-                # Save the image
-                with open(filepath, 'wb') as f:
-                    import base64
-                    f.write(base64.b64decode(image_data['annotated_image']))
-                    
-                messagebox.showinfo(
-                    "Saved",
-                    f"Capture saved to:\n{filepath}"
-                )
-            else:
-                messagebox.showerror("Error", "No image data available")
+        self._saves_running -= 1
+        self._update_title()
+        if batch["failed"]:
+            messagebox.showerror(
+                "Save Failed",
+                f"Saved {len(batch['saved'])} of {batch['total']} captures.\n\n" +
+                "\n".join(batch["failed"][:10])
+            )
+        elif batch["total"] == 1:
+            messagebox.showinfo("Saved", f"Capture saved to:\n{batch['saved'][0]}")
+        else:
+            messagebox.showinfo(
+                "Saved",
+                f"Saved {batch['total']} captures to:\n{os.path.dirname(batch['saved'][0])}"
+            )
                 
-        except Exception as e:
-            logger.error(f"Error saving capture: {e}")
-            messagebox.showerror("Error", f"Failed to save: {e}")
+    def _update_title(self, batch: Optional[dict] = None):
+        """Show save progress in the window title"""
+        if batch is not None:
+            done = len(batch["saved"]) + len(batch["failed"])
+            self.root.title(f"Grabitar Overlay - Saving {done}/{batch['total']}")
+        elif not self._saves_running:
+            self.root.title("Grabitar Overlay")
             
     def _clear_annotations(self):
         """Clear all annotations from current capture"""
@@ -418,7 +576,7 @@ class GrabitarOverlay:
             return
             
         try:
-            self.capture_manager.clear_annotations(self.current_capture_id)
+            self._current_capture().clear_annotations()
             messagebox.showinfo(
                 "Cleared",
                 "All annotations cleared from current capture."
@@ -429,6 +587,10 @@ class GrabitarOverlay:
             
     def quit(self):
         """Quit the overlay"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._save_executor.shutdown(wait=False, cancel_futures=True)
+        if isinstance(self.capture_manager, RemoteCaptureManager):
+            self.capture_manager.close()
         self.root.quit()
         self.root.destroy()
         
@@ -0,0 +1,12 @@
+"""
+Image formats Grabitar can save captures in.
+Shared by the capture manager and the local client, which saves without
+importing the capture machinery.
+"""
+
+# Format name -> (Pillow format, file extension)
+SAVE_FORMATS = {
+    "png": ("PNG", ".png"),
+    "jpeg": ("JPEG", ".jpg"),
+    "webp": ("WEBP", ".webp"),
+}
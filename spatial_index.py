@@ -0,0 +1,100 @@
+"""
+Spatial index for Grabitar annotations.
+A uniform grid over item bounding boxes, for rectangle and point queries.
+"""
+
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+# (left, top, right, bottom), right/bottom exclusive
+Box = Tuple[int, int, int, int]
+
+# Items spanning more cells than this are kept out of the grid
+MAX_ITEM_CELLS = 64
+
+
+class GridIndex:
+    """
+    Uniform grid of buckets holding item IDs.
+    
+    Items are identified by dense integer IDs (0, 1, 2, ...) assigned in
+    insertion order, so results can be returned in that order, which for
+    annotations is also their drawing order. Each item is filed under every
+    cell its box overlaps; queries visit only the cells the query touches
+    and then check the exact boxes. Items that would span more than
+    ``MAX_ITEM_CELLS`` cells go on a separate list that every query scans,
+    so one huge box cannot fill millions of cells.
+    """
+    
+    def __init__(self, cell_size: int = 256):
+        self.cell_size = cell_size
+        self._cells: Dict[Tuple[int, int], List[int]] = {}
+        # 64-bit: bounds extend past the 32-bit coordinates they derive from
+        self._left = array("q")
+        self._top = array("q")
+        self._right = array("q")
+        self._bottom = array("q")
+        # IDs of items too large for the grid, in insertion order
+        self._large: List[int] = []
+        # Extent of occupied cells, so huge queries only visit real cells
+        self._extent: Optional[Box] = None
+    
+    def __len__(self) -> int:
+        return len(self._left)
+    
+    def _cell_range(self, box: Box):
+        size = self.cell_size
+        return (
+            range(box[0] // size, (box[2] - 1) // size + 1),
+            range(box[1] // size, (box[3] - 1) // size + 1),
+        )
+    
+    def insert(self, item_id: int, box: Box):
+        """Add the next item; IDs must be inserted in order."""
+        if item_id != len(self._left):
+            raise ValueError(f"Expected item {len(self._left)}, got {item_id}")
+        left, top, right, bottom = box
+        # Degenerate boxes still occupy a pixel, so they can be hit
+        right = max(right, left + 1)
+        bottom = max(bottom, top + 1)
+        self._left.append(left)
+        self._top.append(top)
+        self._right.append(right)
+        self._bottom.append(bottom)
+        
+        columns, rows = self._cell_range((left, top, right, bottom))
+        if len(columns) * len(rows) > MAX_ITEM_CELLS:
+            self._large.append(item_id)
+            return
+        extent = self._extent or (columns[0], rows[0], columns[-1], rows[-1])
+        self._extent = (min(extent[0], columns[0]), min(extent[1], rows[0]),
+                        max(extent[2], columns[-1]), max(extent[3], rows[-1]))
+        for cx in columns:
+            for cy in rows:
+                self._cells.setdefault((cx, cy), []).append(item_id)
+    
+    def query(self, box: Box) -> List[int]:
+        """IDs of items whose boxes intersect ``box``, in insertion order."""
+        left, top, right, bottom = box
+        if right <= left or bottom <= top:
+            return []
+        
+        def hit(item_id: int) -> bool:
+            return (self._left[item_id] < right and self._right[item_id] > left and
+                    self._top[item_id] < bottom and self._bottom[item_id] > top)
+        
+        found = {item_id for item_id in self._large if hit(item_id)}
+        if self._extent is not None:
+            columns, rows = self._cell_range(box)
+            columns = range(max(columns.start, self._extent[0]), min(columns.stop, self._extent[2] + 1))
+            rows = range(max(rows.start, self._extent[1]), min(rows.stop, self._extent[3] + 1))
+            for cx in columns:
+                for cy in rows:
+                    for item_id in self._cells.get((cx, cy), ()):
+                        if hit(item_id):
+                            found.add(item_id)
+        return sorted(found)
+    
+    def bounds(self, item_id: int) -> Box:
+        return (self._left[item_id], self._top[item_id],
+                self._right[item_id], self._bottom[item_id])
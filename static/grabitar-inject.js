@@ -490,6 +490,7 @@
                 // Wait a tiny bit for the DOM to update
                 await new Promise(resolve => setTimeout(resolve, 100));
                 
+                const captureStart = performance.now();
                 const imageData = await htmlToImage.toPng(document.body, {
                     cacheBust: true,
                     pixelRatio: window.devicePixelRatio || 1
@@ -503,11 +504,12 @@
                     headers: { 'Content-Type': 'application/json' },
                     body: JSON.stringify({ monitor: 0, region: null, imageData: imageData })
                 });
+                const captureMs = performance.now() - captureStart;
                 
                 if (response.ok) {
                     const data = await response.json();
                     this.currentCaptureId = data.id;
-                    this.showStatus(`Window captured! ID: ${data.id}`, 3000);
+                    this.showStatus(`Window captured! ID: ${data.id} (${Math.round(captureMs)} ms)`, 3000);
                     this.showCaptureNotification(data.id);
                 } else {
                     this.showStatus('Failed to capture window', 3000);
@@ -655,6 +657,20 @@
             await this.captureArea(x, y, width, height);
         }
         
+        // Smallest element whose box covers the viewport rect (x, y, width, height)
+        findCoveringElement(x, y, width, height) {
+            let node = document.elementFromPoint(x + width / 2, y + height / 2);
+            while (node && node !== document.body && node !== document.documentElement) {
+                const rect = node.getBoundingClientRect();
+                if (rect.left <= x && rect.top <= y &&
+                    rect.right >= x + width && rect.bottom >= y + height) {
+                    return node;
+                }
+                node = node.parentElement;
+            }
+            return document.body;
+        }
+        
         async captureArea(x, y, width, height) {
             this.showStatus('Capturing area...');
             
@@ -667,31 +683,32 @@
                 // Wait a tiny bit for the DOM to update
                 await new Promise(resolve => setTimeout(resolve, 100));
                 
-                const pixelRatio = window.devicePixelRatio || 1;
+                const renderStart = performance.now();
                 
-                // Capture full page first
-                const fullImageData = await htmlToImage.toPng(document.body, {
+                // Only clone the subtree that covers the selection, and only
+                // rasterize the selection's box: the output canvas is the size
+                // of the selection, with the node shifted so the selection
+                // lands at (0, 0), instead of the whole page at full DPR.
+                const node = this.findCoveringElement(x, y, width, height);
+                const rect = node.getBoundingClientRect();
+                const canvas = await htmlToImage.toCanvas(node, {
                     cacheBust: true,
-                    pixelRatio: pixelRatio
+                    // The upload is in CSS pixels, so render at that size directly
+                    pixelRatio: 1,
+                    width: width,
+                    height: height,
+                    style: {
+                        // Keep the node's real size; width/height above only size the output
+                        width: `${rect.width}px`,
+                        height: `${rect.height}px`,
+                        margin: '0',
+                        transform: `translate(${rect.left - x}px, ${rect.top - y}px)`,
+                        transformOrigin: 'top left'
+                    },
+                    filter: (el) => !(el.id && el.id.startsWith('grabitar'))
                 });
                 
-                // Crop to the selected region
-                const img = new Image();
-                img.src = fullImageData;
-                await new Promise(resolve => img.onload = resolve);
-                
-                const cropCanvas = document.createElement('canvas');
-                cropCanvas.width = width;
-                cropCanvas.height = height;
-                const cropCtx = cropCanvas.getContext('2d');
-                
-                // Scale coordinates by pixelRatio for high-DPI displays
-                const sx = (x + window.scrollX) * pixelRatio;
-                const sy = (y + window.scrollY) * pixelRatio;
-                const sw = width * pixelRatio;
-                const sh = height * pixelRatio;
-                
-                cropCtx.drawImage(img, sx, sy, sw, sh, 0, 0, width, height);
+                const renderMs = performance.now() - renderStart;
                 
                 // Show overlay again
                 this.overlay.style.display = 'block';
@@ -701,18 +718,23 @@
                     this.selectionBox.style.display = 'block';
                 }
                 
-                const imageData = cropCanvas.toDataURL('image/png');
+                const imageData = canvas.toDataURL('image/png');
                 
+                const uploadStart = performance.now();
                 const response = await fetch(`${this.serverUrl}/api/capture`, {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
                     body: JSON.stringify({ monitor: 0, region: { x, y, width, height }, imageData: imageData })
                 });
+                const uploadMs = performance.now() - uploadStart;
                 
                 if (response.ok) {
                     const data = await response.json();
                     this.currentCaptureId = data.id;
-                    this.showStatus(`Area captured! ID: ${data.id}`, 3000);
+                    this.showStatus(
+                        `Area captured! ID: ${data.id} (render ${Math.round(renderMs)} ms, upload ${Math.round(uploadMs)} ms)`,
+                        4000
+                    );
                     this.showCaptureNotification(data.id);
                 } else {
                     this.showStatus('Failed to capture area', 3000);
@@ -0,0 +1,167 @@
+"""
+Visual diff for Grabitar captures.
+Finds the regions that changed between two images, block by block, with NumPy.
+"""
+
+from typing import List, Tuple
+import numpy as np
+from PIL import Image
+
+# (left, top, right, bottom), right/bottom exclusive
+Region = Tuple[int, int, int, int]
+
+
+def _rows(image: Image.Image, width: int, height: int) -> np.ndarray:
+    """The top-left width x height of the image as rows of interleaved RGB bytes."""
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    if image.size != (width, height):
+        image = image.crop((0, 0, width, height))
+    return np.frombuffer(image.tobytes(), dtype=np.uint8).reshape(height, width * 3)
+
+
+def _block_max(values: np.ndarray, block_height: int, block_width: int) -> np.ndarray:
+    """Maximum of each block_height x block_width block of a 2D array."""
+    height, width = values.shape
+    rows, cols = height // block_height, width // block_width
+    # Reduce with elementwise maximums over strided views: much faster than
+    # ndarray.max over short axes, which numpy handles one tiny slice at a time
+    values = values.reshape(rows, block_height, width)
+    row_max = values[:, 0].copy()
+    for k in range(1, block_height):
+        np.maximum(row_max, values[:, k], out=row_max)
+    row_max = row_max.reshape(rows, cols, block_width)
+    result = row_max[:, :, 0].copy()
+    for k in range(1, block_width):
+        np.maximum(result, row_max[:, :, k], out=result)
+    return result
+
+
+def _downsampled(image: Image.Image, width: int, height: int, factor: int) -> Image.Image:
+    """The top-left width x height of the image, averaged over factor x factor squares."""
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    return image.reduce(factor, box=(0, 0, width, height))
+
+
+def changed_blocks(before: Image.Image, after: Image.Image, block_size: int = 8,
+                   threshold: int = 32, downsample: int = 2) -> np.ndarray:
+    """
+    Boolean grid of the blocks whose pixels differ.
+    
+    Both images are compared over their common area. They are first
+    averaged over ``downsample`` x ``downsample`` squares, when that
+    divides ``block_size``, which quarters the pixels compared at the
+    default of 2. A block counts as changed when any of its (averaged)
+    pixels differs by more than ``threshold`` in some channel, so a
+    one-pixel caret move registers but tiny anti-aliasing or
+    color-profile drift does not. Pass ``downsample=1`` to compare every
+    pixel.
+    """
+    width = min(before.width, after.width)
+    height = min(before.height, after.height)
+    if downsample > 1 and block_size % downsample == 0:
+        before = _downsampled(before, width, height, downsample)
+        after = _downsampled(after, width, height, downsample)
+        width, height = before.size
+        block_size //= downsample
+    a = _rows(before, width, height)
+    b = _rows(after, width, height)
+    
+    # |a - b| without widening to a larger dtype
+    diff = np.maximum(a, b)
+    diff -= np.minimum(a, b)
+    
+    rows = -(-height // block_size)
+    cols = -(-width // block_size)
+    pad_y = rows * block_size - height
+    pad_x = (cols * block_size - width) * 3
+    if pad_y or pad_x:
+        diff = np.pad(diff, ((0, pad_y), (0, pad_x)))
+    return _block_max(diff, block_size, block_size * 3) > threshold
+
+
+def _components(mask: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    """
+    Bounding boxes (in blocks) of the 8-connected components of ``mask``.
+    
+    Vectorized over horizontal runs of set blocks: runs in neighbouring
+    rows that touch (diagonally included) are joined with a union-find
+    whose hooking and path halving run as whole-array operations.
+    """
+    rows, cols = mask.shape
+    if not mask.any():
+        return []
+    # Run starts and (exclusive) ends, in row-major order
+    edges = np.diff(np.pad(mask, ((0, 0), (1, 1))).astype(np.int8), axis=1)
+    run_row, run_start = np.nonzero(edges == 1)
+    run_end = np.nonzero(edges == -1)[1]
+    count = len(run_row)
+    
+    # Run j in the next row touches run i if start_j <= end_i and end_j >= start_i;
+    # within a row both are sorted, so the matches are a contiguous range of j
+    stride = cols + 2
+    start_keys = run_row * stride + run_start
+    end_keys = run_row * stride + run_end
+    below = (run_row + 1) * stride
+    first = np.searchsorted(end_keys, below + run_start, side="left")
+    stop = np.searchsorted(start_keys, below + run_end, side="right")
+    matches = np.maximum(stop - first, 0)
+    upper = np.repeat(np.arange(count), matches)
+    offsets = np.arange(matches.sum()) - np.repeat(np.cumsum(matches) - matches, matches)
+    lower = np.repeat(first, matches) + offsets
+    
+    parent = np.arange(count)
+    while True:
+        root_upper, root_lower = parent[upper], parent[lower]
+        joined = root_upper != root_lower
+        if not joined.any():
+            break
+        # Hook the larger root under the smaller, then flatten every tree
+        np.minimum.at(parent, np.maximum(root_upper, root_lower)[joined],
+                      np.minimum(root_upper, root_lower)[joined])
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+    
+    roots, label = np.unique(parent, return_inverse=True)
+    left = np.full(len(roots), cols)
+    top = np.full(len(roots), rows)
+    right = np.zeros(len(roots), dtype=np.intp)
+    bottom = np.zeros(len(roots), dtype=np.intp)
+    np.minimum.at(left, label, run_start)
+    np.minimum.at(top, label, run_row)
+    np.maximum.at(right, label, run_end)
+    np.maximum.at(bottom, label, run_row + 1)
+    return [
+        (int(l), int(t), int(r), int(b))
+        for l, t, r, b in zip(left.tolist(), top.tolist(), right.tolist(), bottom.tolist())
+    ]
+
+
+def diff_regions(before: Image.Image, after: Image.Image, block_size: int = 8,
+                 threshold: int = 32) -> List[Region]:
+    """
+    Pixel boxes around each changed region of ``after``, top to bottom.
+    
+    If the images differ in size, the area only ``after`` has is reported
+    as changed too.
+    """
+    if block_size < 1:
+        raise ValueError("block_size must be at least 1")
+    width = min(before.width, after.width)
+    height = min(before.height, after.height)
+    
+    regions = [
+        (left * block_size, top * block_size,
+         min(right * block_size, width), min(bottom * block_size, height))
+        for left, top, right, bottom in _components(changed_blocks(before, after, block_size, threshold))
+    ]
+    if after.width > width:
+        regions.append((width, 0, after.width, after.height))
+    if after.height > height:
+        regions.append((0, height, width, after.height))
+    regions.sort(key=lambda region: (region[1], region[0]))
+    return regions
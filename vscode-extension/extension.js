@@ -9,12 +9,19 @@ let serverProcess = null;
 let outputChannel = null;
 let statusBarItem = null;
 let chatParticipant = null;
+let extensionContext = null;
+let imageCache = null;
+let eventSubscription = null;
+
+// One pool of keep-alive connections for all API requests
+const httpAgent = new http.Agent({ keepAlive: true, maxSockets: 4 });
 
 /**
  * @param {vscode.ExtensionContext} context
  */
 function activate(context) {
     console.log('Grabitar extension is now active');
+    extensionContext = context;
     
     // Create output channel
     outputChannel = vscode.window.createOutputChannel('Grabitar');
@@ -27,6 +34,13 @@ function activate(context) {
     updateStatusBar('stopped');
     statusBarItem.show();
     
+    // Capture images, kept in memory and in the extension's storage
+    const config = vscode.workspace.getConfiguration('grabitar');
+    imageCache = new CaptureImageCache(
+        path.join(context.globalStorageUri.fsPath, 'image-cache'),
+        config.get('imageCacheSizeMB', 256) * 1024 * 1024
+    );
+    
     // Find server.py in the extension directory
     const serverPath = path.join(context.extensionPath, 'server', 'server.py');
     
@@ -46,7 +60,6 @@ function activate(context) {
     context.subscriptions.push(chatParticipant);
     
     // Auto-start if configured
-    const config = vscode.workspace.getConfiguration('grabitar');
     if (config.get('autoStart', true)) {
         startServer(serverPath);
     }
@@ -69,6 +82,7 @@ try:
     import fastapi
     import uvicorn
     import PIL
+    import numpy
     import mss
     import mcp
     sys.exit(0)
@@ -163,7 +177,7 @@ async function startServer(serverPath) {
     
     if (!depsInstalled) {
         const choice = await vscode.window.showWarningMessage(
-            'Grabitar requires Python packages (fastapi, uvicorn, pillow, mss, mcp). Install them now?',
+            'Grabitar requires Python packages (fastapi, uvicorn, pillow, numpy, mss, mcp). Install them now?',
             'Install', 'Cancel'
         );
         
@@ -189,6 +203,13 @@ async function startServer(serverPath) {
     // Set environment variable for port
     const env = { ...process.env, GRABITAR_PORT: port.toString() };
     
+    // Keep captures across server restarts in the extension's storage
+    if (config.get('persistCaptures', true) && extensionContext) {
+        const storeDir = path.join(extensionContext.globalStorageUri.fsPath, 'captures');
+        env.GRABITAR_STORE_DIR = storeDir;
+        outputChannel.appendLine(`Capture store: ${storeDir}`);
+    }
+    
     // Start the server process
     serverProcess = spawn(pythonPath, [serverPath], {
         cwd: path.dirname(serverPath),
@@ -221,6 +242,8 @@ async function startServer(serverPath) {
     
     updateStatusBar('running');
     vscode.window.showInformationMessage('Grabitar server started on port ' + port);
+    
+    subscribeToEvents(`http://localhost:${port}`);
 }
 
 function stopServer() {
@@ -230,6 +253,7 @@ function stopServer() {
     }
     
     outputChannel.appendLine('Stopping Grabitar server...');
+    unsubscribeFromEvents();
     serverProcess.kill('SIGTERM');
     
     // Force kill after 5 seconds if not stopped
@@ -334,6 +358,8 @@ function updateStatusBar(state) {
 }
 
 function deactivate() {
+    unsubscribeFromEvents();
+    httpAgent.destroy();
     if (serverProcess) {
         outputChannel.appendLine('Deactivating extension, stopping server...');
         serverProcess.kill('SIGTERM');
@@ -434,7 +460,7 @@ async function handleShowCommand(stream, serverUrl, captureId) {
         stream.markdown(`Annotations: ${capture.annotation_count}\n\n`);
         
         // Fetch the image as base64 for AI context
-        const imageBuffer = await fetchImage(`${serverUrl}/api/captures/${captureId}/image?format=png`);
+        const imageBuffer = await imageCache.get(serverUrl, capture);
         const base64Image = imageBuffer.toString('base64');
         
         // Pass base64 data
@@ -467,7 +493,7 @@ async function handleLatestCommand(stream, serverUrl) {
         stream.markdown(`Annotations: ${latest.annotation_count}\n\n`);
         
         // Fetch the image as base64 for AI context
-        const imageBuffer = await fetchImage(`${serverUrl}/api/captures/${latest.id}/image?format=png`);
+        const imageBuffer = await imageCache.get(serverUrl, latest);
         const base64Image = imageBuffer.toString('base64');
         
         // Pass base64 data
@@ -530,30 +556,262 @@ async function sendLatestCaptureToChat() {
 
 // ========== HELPER FUNCTIONS ==========
 
-function fetchJSON(url) {
+function httpGet(url) {
     return new Promise((resolve, reject) => {
-        http.get(url, (res) => {
-            let data = '';
-            res.on('data', chunk => data += chunk);
+        http.get(url, { agent: httpAgent }, (res) => {
+            const chunks = [];
+            res.on('data', chunk => chunks.push(chunk));
             res.on('end', () => {
-                try {
-                    resolve(JSON.parse(data));
-                } catch (e) {
-                    reject(new Error('Failed to parse JSON'));
+                const body = Buffer.concat(chunks);
+                if (res.statusCode >= 400) {
+                    reject(new Error(`HTTP ${res.statusCode} from ${url}`));
+                } else {
+                    resolve(body);
                 }
             });
+            res.on('error', reject);
         }).on('error', reject);
     });
 }
 
+async function fetchJSON(url) {
+    const body = await httpGet(url);
+    try {
+        return JSON.parse(body.toString('utf8'));
+    } catch (e) {
+        throw new Error('Failed to parse JSON');
+    }
+}
+
 function fetchImage(url) {
-    return new Promise((resolve, reject) => {
-        http.get(url, (res) => {
-            const chunks = [];
-            res.on('data', chunk => chunks.push(chunk));
-            res.on('end', () => resolve(Buffer.concat(chunks)));
-        }).on('error', reject);
-    });
+    return httpGet(url);
+}
+
+/**
+ * LRU cache of rendered capture PNGs, in memory and on disk.
+ *
+ * Entries are keyed by capture ID, revision and timestamp, so an annotated
+ * capture (new revision) or a reused ID (new timestamp) is never served
+ * stale. Memory holds the most recently used images up to a quarter of the
+ * budget; the disk copy, in the extension's storage, survives restarts and
+ * is trimmed to the full budget, oldest use first.
+ */
+class CaptureImageCache {
+    constructor(directory, maxBytes) {
+        this.directory = directory;
+        this.maxBytes = maxBytes;
+        this.maxMemoryBytes = Math.floor(maxBytes / 4);
+        this.memory = new Map();  // key -> Buffer, least recently used first
+        this.memoryBytes = 0;
+        this.pending = new Map();  // key -> Promise<Buffer>
+        fs.mkdirSync(directory, { recursive: true });
+    }
+    
+    static keyFor(capture) {
+        const stamp = String(capture.timestamp || '').replace(/[^0-9A-Za-z]/g, '');
+        return `${capture.id}@${capture.revision || 0}-${stamp}`.replace(/[^\w@.-]/g, '_');
+    }
+    
+    filePath(key) {
+        return path.join(this.directory, `${key}.png`);
+    }
+    
+    /** The capture's PNG: from memory, else disk, else the server. */
+    async get(serverUrl, capture) {
+        const key = CaptureImageCache.keyFor(capture);
+        const cached = this.memory.get(key);
+        if (cached) {
+            this.memory.delete(key);
+            this.memory.set(key, cached);
+            return cached;
+        }
+        if (this.pending.has(key)) {
+            return this.pending.get(key);
+        }
+        
+        const load = this.load(serverUrl, capture, key);
+        this.pending.set(key, load);
+        try {
+            return await load;
+        } finally {
+            this.pending.delete(key);
+        }
+    }
+    
+    async load(serverUrl, capture, key) {
+        const file = this.filePath(key);
+        try {
+            const data = await fs.promises.readFile(file);
+            const now = new Date();
+            fs.promises.utimes(file, now, now).catch(() => {});
+            this.remember(key, data);
+            return data;
+        } catch (e) {
+            // Not on disk yet
+        }
+        
+        const data = await fetchImage(`${serverUrl}/api/captures/${encodeURIComponent(capture.id)}/image?format=png`);
+        this.remember(key, data);
+        await this.evict(capture.id, key);
+        try {
+            await fs.promises.writeFile(file, data);
+            await this.trimDisk();
+        } catch (e) {
+            outputChannel.appendLine(`Failed to cache ${capture.id}: ${e.message}`);
+        }
+        return data;
+    }
+    
+    remember(key, data) {
+        this.memory.set(key, data);
+        this.memoryBytes += data.length;
+        for (const [oldKey, oldData] of this.memory) {
+            if (this.memoryBytes <= this.maxMemoryBytes || oldKey === key) {
+                break;
+            }
+            this.memory.delete(oldKey);
+            this.memoryBytes -= oldData.length;
+        }
+    }
+    
+    /** Drop every cached image of a capture, except the entry ``keepKey``. */
+    async evict(captureId, keepKey = null) {
+        const prefix = CaptureImageCache.keyFor({ id: captureId }).split('@')[0] + '@';
+        for (const [key, data] of this.memory) {
+            if (key.startsWith(prefix) && key !== keepKey) {
+                this.memory.delete(key);
+                this.memoryBytes -= data.length;
+            }
+        }
+        const files = await fs.promises.readdir(this.directory).catch(() => []);
+        await Promise.all(files
+            .filter(f => f.startsWith(prefix) && f !== `${keepKey}.png`)
+            .map(f => fs.promises.unlink(path.join(this.directory, f)).catch(() => {})));
+    }
+    
+    async clear() {
+        this.memory.clear();
+        this.memoryBytes = 0;
+        const files = await fs.promises.readdir(this.directory).catch(() => []);
+        await Promise.all(files.map(f => fs.promises.unlink(path.join(this.directory, f)).catch(() => {})));
+    }
+    
+    async trimDisk() {
+        const names = await fs.promises.readdir(this.directory);
+        const files = [];
+        for (const name of names) {
+            try {
+                const stat = await fs.promises.stat(path.join(this.directory, name));
+                files.push({ name, size: stat.size, time: stat.mtimeMs });
+            } catch (e) {
+                // Removed meanwhile
+            }
+        }
+        files.sort((a, b) => b.time - a.time);  // Newest first
+        
+        let total = 0;
+        for (const file of files) {
+            total += file.size;
+            if (total > this.maxBytes) {
+                await fs.promises.unlink(path.join(this.directory, file.name)).catch(() => {});
+            }
+        }
+    }
+}
+
+/**
+ * Follow the server's capture events (/api/events, server-sent events) and
+ * prefetch each new capture into the image cache, so /show and /latest find
+ * it already there; changed captures are only evicted, and fetched again
+ * when next shown. Reconnects while the server is running.
+ */
+function subscribeToEvents(serverUrl) {
+    unsubscribeFromEvents();
+    const subscription = { request: null, timer: null, closed: false };
+    eventSubscription = subscription;
+    
+    const reconnect = () => {
+        if (!subscription.closed && serverProcess) {
+            subscription.timer = setTimeout(connect, 2000);
+        }
+    };
+    
+    const handleEvent = (type, data) => {
+        let event;
+        try {
+            event = JSON.parse(data);
+        } catch (e) {
+            return;
+        }
+        if (type === 'created') {
+            imageCache.get(serverUrl, event).catch(err => {
+                outputChannel.appendLine(`Prefetch of ${event.id} failed: ${err.message}`);
+            });
+        } else if (type === 'updated' || type === 'deleted') {
+            // Annotating can fire many updates in a row; the next view fetches the new revision
+            imageCache.evict(event.id);
+        } else if (type === 'cleared') {
+            imageCache.clear();
+        }
+    };
+    
+    const connect = () => {
+        let retried = false;
+        const retry = () => {
+            if (!retried) {
+                retried = true;
+                reconnect();
+            }
+        };
+        
+        // A dedicated connection: this one stays open for the whole session
+        subscription.request = http.get(`${serverUrl}/api/events`, { agent: false }, (res) => {
+            if (res.statusCode !== 200) {
+                res.resume();
+                retry();
+                return;
+            }
+            res.setEncoding('utf8');
+            let buffer = '';
+            res.on('data', (chunk) => {
+                buffer += chunk;
+                let end;
+                while ((end = buffer.indexOf('\n\n')) !== -1) {
+                    const block = buffer.slice(0, end);
+                    buffer = buffer.slice(end + 2);
+                    let type = 'message';
+                    const data = [];
+                    for (const line of block.split('\n')) {
+                        if (line.startsWith('event:')) {
+                            type = line.slice(6).trim();
+                        } else if (line.startsWith('data:')) {
+                            data.push(line.slice(5).trim());
+                        }
+                    }
+                    if (data.length > 0) {
+                        handleEvent(type, data.join('\n'));
+                    }
+                }
+            });
+            res.on('close', retry);
+            res.on('error', () => {});
+        });
+        subscription.request.on('error', retry);
+    };
+    
+    connect();
+}
+
+function unsubscribeFromEvents() {
+    if (!eventSubscription) {
+        return;
+    }
+    eventSubscription.closed = true;
+    clearTimeout(eventSubscription.timer);
+    if (eventSubscription.request) {
+        eventSubscription.request.destroy();
+    }
+    eventSubscription = null;
 }
 
 async function saveImageToTemp(imageData, captureId) {
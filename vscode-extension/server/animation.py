@@ -0,0 +1,227 @@
+"""
+Animated export for Grabitar.
+Streams a sequence of frames into an animated GIF, APNG or WebP, encoding
+one frame at a time so a long capture sequence never sits in memory.
+"""
+
+import io
+import struct
+import tempfile
+import zlib
+from typing import Iterable, Iterator, Optional, Tuple
+from PIL import Image, ImageChops, GifImagePlugin
+
+FORMATS = {
+    "gif": "image/gif",
+    "apng": "image/apng",
+    "webp": "image/webp",
+}
+
+# WebP frames are buffered here before the RIFF header (which needs the
+# total size) can be written; larger animations spill to disk
+_WEBP_SPOOL_BYTES = 8 * 1024 * 1024
+_COPY_CHUNK = 64 * 1024
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def _to_canvas(frame: Image.Image, size: Tuple[int, int]) -> Image.Image:
+    if frame.mode != "RGB":
+        frame = frame.convert("RGB")
+    if frame.size != size:
+        canvas = Image.new("RGB", size)
+        canvas.paste(frame, (0, 0))
+        frame = canvas
+    return frame
+
+
+def _deltas(frames: Iterable[Image.Image], size: Tuple[int, int], crop_deltas: bool,
+            even_offsets: bool = False) -> Iterator[Tuple[Image.Image, Tuple[int, int]]]:
+    """
+    Yield (image, offset) for each frame.
+    
+    With ``crop_deltas``, every frame after the first is cropped to the box
+    that changed since the previous frame; only that frame and the current
+    one are held at any time.
+    """
+    previous = None
+    for frame in frames:
+        frame = _to_canvas(frame, size)
+        if previous is None or not crop_deltas:
+            yield frame, (0, 0)
+        else:
+            # An unchanged frame still needs an entry (for its duration)
+            box = ImageChops.difference(previous, frame).getbbox() or (0, 0, 1, 1)
+            left, top, right, bottom = box
+            if even_offsets:
+                left, top = left & ~1, top & ~1
+            yield frame.crop((left, top, right, bottom)), (left, top)
+        previous = frame
+
+
+# ----- GIF -----
+
+def _iter_gif(frames, size, duration, loop, reuse_palette, crop_deltas) -> Iterator[bytes]:
+    palette_image = None
+    for image, offset in _deltas(frames, size, crop_deltas):
+        if palette_image is None:
+            # The first frame's adaptive palette becomes the global palette
+            indexed = image.quantize(256, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE)
+            header, _ = GifImagePlugin.getheader(indexed, info={"loop": loop, "duration": duration})
+            palette_image = indexed
+            yield b"".join(header)
+            params = {}
+        elif reuse_palette:
+            indexed = image.quantize(palette=palette_image, dither=Image.Dither.NONE)
+            params = {}
+        else:
+            indexed = image.quantize(256, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE)
+            params = {"include_color_table": True}
+        # Disposal 1 keeps the previous frame, so a cropped delta draws over it
+        yield b"".join(GifImagePlugin.getdata(indexed, offset, duration=duration, disposal=1, **params))
+    yield b";"
+
+
+# ----- APNG -----
+
+def _png_chunks(data: bytes) -> Iterator[Tuple[bytes, bytes]]:
+    position = len(_PNG_SIGNATURE)
+    while position < len(data):
+        length, = struct.unpack(">I", data[position:position + 4])
+        chunk_type = data[position + 4:position + 8]
+        yield chunk_type, data[position + 8:position + 8 + length]
+        position += 12 + length
+
+
+def _png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return (struct.pack(">I", len(data)) + chunk_type + data +
+            struct.pack(">I", zlib.crc32(chunk_type + data) & 0xFFFFFFFF))
+
+
+def _iter_apng(frames, size, frame_count, duration, loop, reuse_palette, crop_deltas) -> Iterator[bytes]:
+    sequence = 0
+    palette_image = None
+    for index, (image, offset) in enumerate(_deltas(frames, size, crop_deltas)):
+        if reuse_palette:
+            if palette_image is None:
+                image = palette_image = image.quantize(256, method=Image.Quantize.FASTOCTREE,
+                                                       dither=Image.Dither.NONE)
+            else:
+                image = image.quantize(palette=palette_image, dither=Image.Dither.NONE)
+        
+        buffer = io.BytesIO()
+        # Palette frames keep the full 8-bit depth so every frame matches IHDR
+        image.save(buffer, format="PNG", compress_level=6, bits=8)
+        chunks = list(_png_chunks(buffer.getvalue()))
+        image_data = b"".join(data for chunk_type, data in chunks if chunk_type == b"IDAT")
+        
+        if index == 0:
+            header = [_PNG_SIGNATURE]
+            header += [_png_chunk(t, d) for t, d in chunks if t in (b"IHDR", b"PLTE")]
+            header.append(_png_chunk(b"acTL", struct.pack(">II", frame_count, loop)))
+            yield b"".join(header)
+        
+        # Delay as a fraction of a second: duration/1000; keep the previous frame (dispose op 0)
+        # and overwrite the changed box (blend op 0)
+        yield _png_chunk(b"fcTL", struct.pack(
+            ">IIIIIHHBB", sequence, image.width, image.height, offset[0], offset[1],
+            duration, 1000, 0, 0
+        ))
+        sequence += 1
+        if index == 0:
+            yield _png_chunk(b"IDAT", image_data)
+        else:
+            yield _png_chunk(b"fdAT", struct.pack(">I", sequence) + image_data)
+            sequence += 1
+    yield _png_chunk(b"IEND", b"")
+
+
+# ----- WebP -----
+
+def _riff_chunk(fourcc: bytes, data: bytes) -> bytes:
+    padding = b"\0" if len(data) % 2 else b""
+    return fourcc + struct.pack("<I", len(data)) + data + padding
+
+
+def _webp_frame_chunks(data: bytes) -> bytes:
+    """The bitstream chunks (ALPH, VP8, VP8L) of a still WebP file."""
+    position = 12
+    chunks = []
+    while position < len(data):
+        fourcc = data[position:position + 4]
+        length, = struct.unpack("<I", data[position + 4:position + 8])
+        end = position + 8 + length + (length % 2)
+        if fourcc in (b"ALPH", b"VP8 ", b"VP8L"):
+            chunks.append(data[position:end])
+        position = end
+    return b"".join(chunks)
+
+
+def _uint24(value: int) -> bytes:
+    return struct.pack("<I", value)[:3]
+
+
+def _iter_webp(frames, size, duration, loop, lossless, quality, crop_deltas) -> Iterator[bytes]:
+    with tempfile.SpooledTemporaryFile(max_size=_WEBP_SPOOL_BYTES) as spool:
+        body_size = 0
+        for image, offset in _deltas(frames, size, crop_deltas, even_offsets=True):
+            buffer = io.BytesIO()
+            image.save(buffer, format="WEBP", lossless=lossless, quality=quality, method=4)
+            frame = (
+                _uint24(offset[0] // 2) + _uint24(offset[1] // 2) +
+                _uint24(image.width - 1) + _uint24(image.height - 1) +
+                _uint24(duration) +
+                # Don't blend with the previous frame; don't dispose it
+                b"\x02" +
+                _webp_frame_chunks(buffer.getvalue())
+            )
+            chunk = _riff_chunk(b"ANMF", frame)
+            spool.write(chunk)
+            body_size += len(chunk)
+        
+        vp8x = _riff_chunk(b"VP8X", b"\x02\0\0\0" + _uint24(size[0] - 1) + _uint24(size[1] - 1))
+        anim = _riff_chunk(b"ANIM", b"\0\0\0\0" + struct.pack("<H", loop))
+        riff_size = 4 + len(vp8x) + len(anim) + body_size
+        yield b"RIFF" + struct.pack("<I", riff_size) + b"WEBP" + vp8x + anim
+        
+        spool.seek(0)
+        while True:
+            data = spool.read(_COPY_CHUNK)
+            if not data:
+                break
+            yield data
+
+
+def iter_animation(frames: Iterable[Image.Image], frame_count: int, size: Tuple[int, int],
+                   format: str = "gif", duration: int = 500, loop: int = 0,
+                   reuse_palette: bool = True, crop_deltas: bool = True,
+                   quality: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Encode frames into an animation, yielding the file in chunks.
+    
+    Args:
+        frames: Frames in order; pulled one at a time and never stored
+        frame_count: Number of frames ``frames`` will yield
+        size: Canvas size; smaller frames are placed at the top-left
+        format: "gif", "apng" or "webp"
+        duration: Time each frame is shown, in milliseconds
+        loop: Number of times to play (0 = forever)
+        reuse_palette: Quantize every frame against the first frame's
+            palette (GIF: one global color table; APNG: indexed color)
+            instead of full color / per-frame palettes
+        crop_deltas: Encode only the changed box of each frame after the first
+        quality: WebP quality (0-100); lossless if not given
+    """
+    format = format.lower()
+    if format not in FORMATS:
+        raise ValueError(f"Unsupported animation format '{format}' (use {', '.join(FORMATS)})")
+    if frame_count < 1:
+        raise ValueError("An animation needs at least one frame")
+    duration = max(10, int(duration))
+    
+    if format == "gif":
+        return _iter_gif(frames, size, duration, loop, reuse_palette, crop_deltas)
+    if format == "apng":
+        return _iter_apng(frames, size, frame_count, duration, loop, reuse_palette, crop_deltas)
+    lossless = quality is None
+    return _iter_webp(frames, size, duration, loop, lossless, 80 if lossless else int(quality), crop_deltas)
@@ -3,11 +3,124 @@ Annotation classes for Grabitar screen capture tool.
 Supports box and text annotations on captured images.
 """
 
-from typing import Literal, Optional
+from functools import lru_cache
+from typing import Literal, Optional, Tuple
 from PIL import Image, ImageDraw, ImageFont
 from pydantic import BaseModel
 
 
+@lru_cache(maxsize=64)
+def load_font(size: int, bold: bool = False) -> ImageFont.ImageFont:
+    """Load (and cache) the annotation font at the given size."""
+    paths = ["/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"]
+    if bold:
+        paths.insert(0, "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf")
+    for path in paths:
+        try:
+            return ImageFont.truetype(path, size)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
+
+def _scaled(value: int, scale: float) -> int:
+    # Strokes and fonts keep at least one pixel however far they are scaled down
+    return max(1, round(value * scale)) if value > 0 else value
+
+
+def draw_box(draw: ImageDraw.ImageDraw, x: int, y: int, width: int, height: int,
+             color: str, line_width: int, label: Optional[str], scale: float = 1.0):
+    """
+    Draw a box annotation, with its label above the box.
+    
+    ``scale`` draws it as it appears in an image resized by that factor,
+    with coordinates, stroke and label all scaled.
+    """
+    x, y = round(x * scale), round(y * scale)
+    width, height = round(width * scale), round(height * scale)
+    draw.rectangle([x, y, x + width, y + height], outline=color, width=_scaled(line_width, scale))
+    
+    if label:
+        font = load_font(_scaled(16, scale))
+        
+        # Calculate text size and position
+        bbox = draw.textbbox((0, 0), label, font=font)
+        text_width = bbox[2] - bbox[0]
+        text_height = bbox[3] - bbox[1]
+        
+        # Position label above the box
+        margin = round(2 * scale)
+        label_x = x
+        label_y = max(0, y - text_height - round(5 * scale))
+        
+        # Draw background for text
+        draw.rectangle(
+            [label_x - margin, label_y - margin, label_x + text_width + margin, label_y + text_height + margin],
+            fill="white"
+        )
+        draw.text((label_x, label_y), label, fill=color, font=font)
+
+
+def draw_text(draw: ImageDraw.ImageDraw, x: int, y: int, text: str, font_size: int,
+              color: str, background: Optional[str], scale: float = 1.0):
+    """Draw a text annotation, with an optional outlined background (``scale`` as in draw_box)."""
+    x, y = round(x * scale), round(y * scale)
+    font = load_font(_scaled(font_size, scale), bold=True)
+    
+    # Calculate text size
+    bbox = draw.textbbox((0, 0), text, font=font)
+    text_width = bbox[2] - bbox[0]
+    text_height = bbox[3] - bbox[1]
+    
+    # Draw background if specified
+    if background:
+        padding = round(4 * scale)
+        draw.rectangle(
+            [x - padding, y - padding, x + text_width + padding, y + text_height + padding],
+            fill=background,
+            outline=color,
+            width=_scaled(2, scale)
+        )
+    
+    draw.text((x, y), text, fill=color, font=font)
+
+
+# Scratch surface for measuring text outside of a render
+_MEASURE = ImageDraw.Draw(Image.new("1", (1, 1)))
+
+
+def box_bounds(x: int, y: int, width: int, height: int,
+               label: Optional[str]) -> Tuple[int, int, int, int]:
+    """Pixel extent (left, top, right, bottom; exclusive) drawn by ``draw_box``."""
+    left, right = sorted((x, x + width))
+    top, bottom = sorted((y, y + height))
+    right += 1
+    bottom += 1
+    
+    if label:
+        bbox = _MEASURE.textbbox((0, 0), label, font=load_font(16))
+        text_height = bbox[3] - bbox[1]
+        label_y = max(0, y - text_height - 5)
+        left = min(left, x - 2)
+        top = min(top, label_y - 2)
+        right = max(right, x + max(bbox[2], bbox[2] - bbox[0] + 2) + 1)
+        bottom = max(bottom, label_y + max(bbox[3], text_height + 2) + 1)
+    return left, top, right, bottom
+
+
+def text_bounds(x: int, y: int, text: str, font_size: int,
+                background: Optional[str]) -> Tuple[int, int, int, int]:
+    """Pixel extent (left, top, right, bottom; exclusive) drawn by ``draw_text``."""
+    bbox = _MEASURE.textbbox((0, 0), text, font=load_font(font_size, bold=True))
+    padding = 4 if background else 0
+    return (
+        x + min(0, bbox[0]) - padding,
+        y + min(0, bbox[1]) - padding,
+        x + max(bbox[2], bbox[2] - bbox[0]) + padding + 1,
+        y + max(bbox[3], bbox[3] - bbox[1]) + padding + 1,
+    )
+
+
 class Annotation(BaseModel):
     """Base class for annotations."""
     type: str
@@ -30,41 +143,8 @@ class BoxAnnotation(Annotation):
     
     def render(self, draw: ImageDraw.ImageDraw, image: Image.Image):
         """Draw a box annotation on the image."""
-        # Draw the rectangle
-        x2 = self.x + self.width
-        y2 = self.y + self.height
-        
-        draw.rectangle(
-            [self.x, self.y, x2, y2],
-            outline=self.color,
-            width=self.line_width
-        )
-        
-        # Add label if provided
-        if self.label:
-            # Load default font
-            try:
-                font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 16)
-            except:
-                font = ImageFont.load_default()
-            
-            # Calculate text size and position
-            bbox = draw.textbbox((0, 0), self.label, font=font)
-            text_width = bbox[2] - bbox[0]
-            text_height = bbox[3] - bbox[1]
-            
-            # Position label above the box
-            label_x = self.x
-            label_y = max(0, self.y - text_height - 5)
-            
-            # Draw background for text
-            draw.rectangle(
-                [label_x - 2, label_y - 2, label_x + text_width + 2, label_y + text_height + 2],
-                fill="white"
-            )
-            
-            # Draw text
-            draw.text((label_x, label_y), self.label, fill=self.color, font=font)
+        draw_box(draw, self.x, self.y, self.width, self.height,
+                 self.color, self.line_width, self.label)
 
 
 class TextAnnotation(Annotation):
@@ -79,34 +159,5 @@ class TextAnnotation(Annotation):
     
     def render(self, draw: ImageDraw.ImageDraw, image: Image.Image):
         """Draw text annotation on the image."""
-        # Load font
-        try:
-            font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", self.font_size)
-        except:
-            try:
-                font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", self.font_size)
-            except:
-                font = ImageFont.load_default()
-        
-        # Calculate text size
-        bbox = draw.textbbox((0, 0), self.text, font=font)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-        
-        # Draw background if specified
-        if self.background:
-            padding = 4
-            draw.rectangle(
-                [
-                    self.x - padding,
-                    self.y - padding,
-                    self.x + text_width + padding,
-                    self.y + text_height + padding
-                ],
-                fill=self.background,
-                outline=self.color,
-                width=2
-            )
-        
-        # Draw text
-        draw.text((self.x, self.y), self.text, fill=self.color, font=font)
+        draw_text(draw, self.x, self.y, self.text, self.font_size,
+                  self.color, self.background)
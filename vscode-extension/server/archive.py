@@ -0,0 +1,112 @@
+"""
+Capture archives for Grabitar.
+Captures are exported to and imported from a tar stream, one entry at a
+time, so archiving a whole session never needs it all in memory.
+
+Layout::
+    
+    manifest.json                   {"version", "exported", "captures": [get_metadata(), ...]}
+    captures/<id>/original.png      captured pixels
+    captures/<id>/rendered.png      pixels with annotations drawn
+"""
+
+import json
+import shutil
+import tarfile
+import tempfile
+import time
+from datetime import datetime
+from typing import Iterable, Iterator, Tuple
+from PIL import Image
+
+ARCHIVE_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+
+# Each entry is encoded here first, since a tar header needs the entry's
+# size; anything larger than this spills to disk
+_ENTRY_SPOOL_BYTES = 32 * 1024 * 1024
+
+
+def _add_entry(tar: tarfile.TarFile, name: str, write):
+    """Add an entry whose content ``write(fileobj)`` produces."""
+    with tempfile.SpooledTemporaryFile(max_size=_ENTRY_SPOOL_BYTES) as spool:
+        write(spool)
+        info = tarfile.TarInfo(name)
+        info.size = spool.tell()
+        info.mtime = int(time.time())
+        info.mode = 0o644
+        spool.seek(0)
+        tar.addfile(info, spool)
+
+
+def _save_original(capture, f):
+    with capture.pinned_pixels():
+        capture.original_image.save(f, format="PNG", compress_level=1)
+
+
+def write_archive(captures: Iterable, fileobj):
+    """
+    Write captures to ``fileobj`` as a tar stream.
+    
+    The stream is written strictly front to back, so ``fileobj`` only needs
+    ``write``; each capture's images are rendered, written and dropped
+    before the next capture is touched.
+    """
+    captures = list(captures)
+    manifest = {
+        "version": ARCHIVE_VERSION,
+        "exported": datetime.now().isoformat(),
+        "captures": [capture.get_metadata() for capture in captures],
+    }
+    
+    with tarfile.open(fileobj=fileobj, mode="w|", format=tarfile.PAX_FORMAT) as tar:
+        _add_entry(tar, MANIFEST_NAME, lambda f: f.write(json.dumps(manifest, indent=2).encode()))
+        for capture in captures:
+            prefix = f"captures/{capture.id}"
+            _add_entry(tar, f"{prefix}/original.png",
+                       lambda f: _save_original(capture, f))
+            # Encoded straight into the entry, not through the capture's PNG cache,
+            # so an export does not leave every capture's PNG in memory
+            _add_entry(tar, f"{prefix}/rendered.png",
+                       lambda f: capture.render_annotated_image().save(f, format="PNG"))
+
+
+def read_archive(fileobj) -> Iterator[Tuple[dict, Image.Image]]:
+    """
+    Read a capture archive from a tar stream, yielding (metadata, original
+    pixels) per capture as soon as its pixels arrive.
+    
+    Entries are read strictly in order, so ``fileobj`` only needs ``read``.
+    Rendered images are skipped; they are redrawn from the annotations.
+    """
+    metadata_by_id = None
+    with tarfile.open(fileobj=fileobj, mode="r|*") as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            if member.name == MANIFEST_NAME:
+                manifest = json.loads(tar.extractfile(member).read())
+                if manifest.get("version") != ARCHIVE_VERSION:
+                    raise ValueError(f"Unsupported archive version {manifest.get('version')!r}")
+                metadata_by_id = {item["id"]: item for item in manifest["captures"]}
+                continue
+            
+            parts = member.name.split("/")
+            if len(parts) != 3 or parts[0] != "captures" or parts[2] != "original.png":
+                continue
+            if metadata_by_id is None:
+                raise ValueError(f"Archive entry '{member.name}' comes before {MANIFEST_NAME}")
+            metadata = metadata_by_id.get(parts[1])
+            if metadata is None:
+                continue
+            
+            # Decoders may seek, which a streamed entry cannot do
+            with tempfile.SpooledTemporaryFile(max_size=_ENTRY_SPOOL_BYTES) as spool:
+                shutil.copyfileobj(tar.extractfile(member), spool)
+                spool.seek(0)
+                image = Image.open(spool)
+                image.load()
+            yield metadata, image
+    
+    if metadata_by_id is None:
+        raise ValueError(f"Not a capture archive: no {MANIFEST_NAME}")
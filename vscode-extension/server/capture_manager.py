@@ -4,77 +4,604 @@ Handles screen capture and annotation management.
 """
 
 import io
+import re
+import json
+import heapq
+import time
+import atexit
 import base64
+import binascii
 import os
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
-from typing import Dict, List, Optional, Union
+from typing import Callable, ContextManager, Dict, Iterator, List, Optional, Tuple, Union
 from PIL import Image, ImageDraw, ImageFont
 import mss
 
-from annotations import Annotation, BoxAnnotation, TextAnnotation
+from animation import iter_animation
+from annotation_store import AnnotationStore
+from archive import read_archive, write_archive
+from capture_store import CaptureStore
+from frame_pool import FrameBufferPool
+from pixel_store import PixelStore, image_nbytes
+from save_formats import SAVE_FORMATS
+from similarity_index import BKTree, HASH_BITS, dhash
+from visual_diff import diff_regions
+
+logger = logging.getLogger("grabitar.captures")
+
+
+class OperationCancelled(Exception):
+    """Raised by a progress callback to abandon a capture or an encode."""
+
+
+# Called with the name of each stage as it starts ("grab", "store", "render",
+# "encode"), and again as work within a stage proceeds (such as each encoded
+# chunk). It may raise OperationCancelled to stop the work at that point.
+ProgressCallback = Callable[[str], None]
+
+
+class _ChunkWriter(io.RawIOBase):
+    """Write-only file object that hands every encoder write to a callback."""
+    
+    def __init__(self, sink):
+        self._sink = sink
+    
+    def writable(self) -> bool:
+        return True
+    
+    def write(self, data) -> int:
+        self._sink(bytes(data))
+        return len(data)
+
+
+# Base64 characters decoded per call (a multiple of 4)
+_BASE64_SLICE_CHARS = 1 << 20
+
+
+def _decode_base64(data: str) -> bytes:
+    """
+    Decode base64 a slice at a time, so the event loop gets the GIL back
+    between slices while a large upload decodes on a worker thread. Input
+    that is not strict base64 is decoded leniently, in one go.
+    """
+    try:
+        return b"".join(
+            base64.b64decode(data[i:i + _BASE64_SLICE_CHARS], validate=True)
+            for i in range(0, len(data), _BASE64_SLICE_CHARS)
+        )
+    except binascii.Error:
+        return base64.b64decode(data)
+
+
+def _resize(image: Image.Image, box: Tuple[int, int, int, int], size: Tuple[int, int]) -> Image.Image:
+    """
+    Resize the (left, top, right, bottom) box of ``image`` to ``size``.
+    
+    Reductions first shrink the box by a whole factor with ``Image.reduce``
+    (through ``reducing_gap``), so Lanczos only filters a few times the
+    output's pixels; nothing is cropped or copied at full resolution.
+    """
+    shrinking = size[0] < box[2] - box[0] or size[1] < box[3] - box[1]
+    return image.resize(size, Image.LANCZOS, box=box, reducing_gap=3.0 if shrinking else None)
+
+
+class TiledImage:
+    """
+    A logical image stored as separate tiles, one per monitor.
+    
+    Tile offsets are relative to the top-left of the bounding box of all
+    tiles, which is also the coordinate space annotations use. The dead space
+    between monitors is never stored; it only appears (as black) when a
+    composite is requested.
+    """
+    
+    def __init__(self, tiles: List[Tuple[int, int, Image.Image]]):
+        """
+        Args:
+            tiles: (left, top, image) per tile, in global screen coordinates
+        """
+        min_left = min(left for left, _, _ in tiles)
+        min_top = min(top for _, top, _ in tiles)
+        # Global coordinates of the capture's (0, 0)
+        self.origin = (min_left, min_top)
+        self.tiles = [(left - min_left, top - min_top, image) for left, top, image in tiles]
+        self.size = (
+            max(left + image.width for left, _, image in self.tiles),
+            max(top + image.height for _, top, image in self.tiles),
+        )
+    
+    def composite(self) -> Image.Image:
+        """Build a single image with every tile pasted in place."""
+        image = Image.new("RGB", self.size)
+        for left, top, tile in self.tiles:
+            image.paste(tile, (left, top))
+        return image
+    
+    def crop(self, box: Tuple[int, int, int, int]) -> Image.Image:
+        """Build just the (left, top, right, bottom) box from the tiles it touches."""
+        left, top, right, bottom = box
+        image = Image.new("RGB", (right - left, bottom - top))
+        for tile_left, tile_top, tile in self.tiles:
+            if (tile_left >= right or tile_top >= bottom or
+                    tile_left + tile.width <= left or tile_top + tile.height <= top):
+                continue
+            image.paste(tile, (tile_left - left, tile_top - top))
+        return image
+    
+    def resize(self, box: Tuple[int, int, int, int], size: Tuple[int, int]) -> Image.Image:
+        """
+        Build the (left, top, right, bottom) box scaled to ``size``.
+        
+        Each tile the box touches is resized on its own and pasted at its
+        scaled position, so the box is never assembled at full resolution.
+        """
+        left, top, right, bottom = box
+        scale_x = size[0] / (right - left)
+        scale_y = size[1] / (bottom - top)
+        image = Image.new("RGB", size)
+        for tile_left, tile_top, tile in self.tiles:
+            # The part of the box this tile covers, in capture coordinates
+            part = (max(left, tile_left), max(top, tile_top),
+                    min(right, tile_left + tile.width), min(bottom, tile_top + tile.height))
+            if part[2] <= part[0] or part[3] <= part[1]:
+                continue
+            dest = (round((part[0] - left) * scale_x), round((part[1] - top) * scale_y),
+                    round((part[2] - left) * scale_x), round((part[3] - top) * scale_y))
+            if dest[2] <= dest[0] or dest[3] <= dest[1]:
+                continue
+            source = (part[0] - tile_left, part[1] - tile_top, part[2] - tile_left, part[3] - tile_top)
+            image.paste(_resize(tile, source, (dest[2] - dest[0], dest[3] - dest[1])), dest[:2])
+        return image
+    
+    def get_metadata(self) -> List[dict]:
+        """Describe each tile's placement in capture and global coordinates."""
+        return [
+            {
+                "x": left,
+                "y": top,
+                "width": tile.width,
+                "height": tile.height,
+                "global_x": self.origin[0] + left,
+                "global_y": self.origin[1] + top,
+            }
+            for left, top, tile in self.tiles
+        ]
+
+
+# Serializes lazy loads of persisted pixels
+_LAZY_LOAD_LOCK = threading.Lock()
+
+# Longest side of thumbnails, in pixels
+THUMBNAIL_SIZE = 256
+
+# Longest side tiled captures are reduced to before hashing
+HASH_PREVIEW_SIZE = 256
+
+# Largest zoom factor for region renders
+MAX_RENDER_SCALE = 8.0
+# Region renders kept per capture, least recently used dropped first
+REGION_CACHE_ENTRIES = 8
+_REGION_CACHE_LOCK = threading.Lock()
 
 
 class Capture:
     """Represents a single screen capture with annotations."""
     
-    def __init__(self, capture_id: str, image: Image.Image, monitor: int = 0, region: Optional[dict] = None):
+    def __init__(self, capture_id: str, image: Optional[Image.Image], monitor: int = 0,
+                 region: Optional[dict] = None, tiles: Optional[TiledImage] = None):
         self.id = capture_id
-        self.original_image = image
+        self._image = image
+        # Multi-monitor captures keep per-monitor tiles instead of one image
+        self.tiles = tiles
         self.monitor = monitor
         self.region = region or {}
+        # PixelStore keys of the buffers this capture references
+        self.pixel_keys: List[str] = []
+        # Derived captures are a (left, top, right, bottom) view of a parent's pixels
+        self.parent_id: Optional[str] = None
+        self.crop_box: Optional[Tuple[int, int, int, int]] = None
+        # Perceptual hash of the captured pixels (annotations excluded)
+        self.dhash: Optional[int] = None
         self.timestamp = datetime.now().isoformat()
-        self.annotations: List[Annotation] = []
+        # Epoch seconds after which the capture is swept away (None: kept until deleted)
+        self.expires_at: Optional[float] = None
+        self._annotations = AnnotationStore()
+        # Held while annotations change or are read, since captures are
+        # annotated on the event loop and rendered or stored on other threads
+        self._annotations_lock = threading.RLock()
+        # Bumped on every change that affects the rendered image
+        self.revision = 0
+        # (revision, PNG bytes) of the last complete encode
+        self._png_cache: Optional[tuple] = None
+        # (revision, PNG bytes) of the last thumbnail
+        self._thumbnail_cache: Optional[tuple] = None
+        # (revision, box, scale) -> PNG bytes of recent region renders
+        self._region_cache: "OrderedDict[tuple, bytes]" = OrderedDict()
+        # Called with this capture after every annotation change
+        self.on_change: Optional[Callable[["Capture"], None]] = None
+        # Holds the pixel buffers for the length of a read, so a delete
+        # cannot recycle them underneath it (see CaptureManager._pin_pixels)
+        self.pixel_pin: Optional[Callable[["Capture"], ContextManager]] = None
+        # Set once pixel_keys are released; the buffers may then be reused
+        self.pixels_released = False
+        
+        # Restored captures load pixels and annotations on first use
+        self._pixel_loader: Optional[Callable[["Capture"], None]] = None
+        self._lazy_size: Optional[Tuple[int, int]] = None
+        self._lazy_tiles: Optional[List[dict]] = None
+        self._annotations_json: Optional[str] = None
+    
+    def set_lazy_state(self, size: Tuple[int, int], tiles: Optional[List[dict]],
+                       annotations_json: str, pixel_loader: Callable[["Capture"], None]):
+        """Defer loading pixels and parsing annotations until first use."""
+        self._lazy_size = size
+        self._lazy_tiles = tiles
+        self._annotations_json = annotations_json
+        self._pixel_loader = pixel_loader
+    
+    def _ensure_pixels(self):
+        if self._pixel_loader is None:
+            return
+        with _LAZY_LOAD_LOCK:
+            if self._pixel_loader is not None:
+                self._pixel_loader(self)
+                self._pixel_loader = None
+                self._lazy_size = None
+                self._lazy_tiles = None
+    
+    @property
+    def annotations(self) -> AnnotationStore:
+        if self._annotations_json is not None:
+            with self._annotations_lock:
+                if self._annotations_json is not None:
+                    self._annotations.extend_from_dicts(json.loads(self._annotations_json))
+                    self._annotations_json = None
+        return self._annotations
+    
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change(self)
     
     def add_box_annotation(self, x: int, y: int, width: int, height: int, 
                           color: str = "red", line_width: int = 3, label: Optional[str] = None):
         """Add a box annotation to this capture."""
-        annotation = BoxAnnotation(
-            x=x, y=y, width=width, height=height,
-            color=color, line_width=line_width, label=label
-        )
-        self.annotations.append(annotation)
+        with self._annotations_lock:
+            self.annotations.add_box(x, y, width, height, color, line_width, label)
+            self.revision += 1
+        self._changed()
     
     def add_text_annotation(self, x: int, y: int, text: str, 
                            font_size: int = 20, color: str = "red", background: Optional[str] = "white"):
         """Add a text annotation to this capture."""
-        annotation = TextAnnotation(
-            x=x, y=y, text=text,
-            font_size=font_size, color=color, background=background
-        )
-        self.annotations.append(annotation)
+        with self._annotations_lock:
+            self.annotations.add_text(x, y, text, font_size, color, background)
+            self.revision += 1
+        self._changed()
+    
+    def clear_annotations(self):
+        """Remove all annotations from this capture."""
+        with self._annotations_lock:
+            self.annotations.clear()
+            self.revision += 1
+        self._changed()
+    
+    def replace_annotations(self, annotations_json: str, revision: int):
+        """Adopt annotations saved by another process sharing the store."""
+        with self._annotations_lock:
+            self._annotations.clear()
+            self._annotations_json = annotations_json
+            self.revision = revision
+        self._png_cache = None
+        self._thumbnail_cache = None
+        with _REGION_CACHE_LOCK:
+            self._region_cache.clear()
+    
+    def pinned_pixels(self) -> ContextManager:
+        """
+        Keep this capture's pixel buffers from being recycled until the
+        block ends. Raises KeyError if the capture has already been deleted.
+        """
+        if self.pixel_pin is None:
+            return nullcontext()
+        return self.pixel_pin(self)
+    
+    @property
+    def original_image(self) -> Image.Image:
+        """
+        The captured pixels; tiled captures are composited and derived
+        captures cropped from their parent's pixels on demand. Hold
+        ``pinned_pixels`` while using them.
+        """
+        self._ensure_pixels()
+        if self.crop_box is not None:
+            if self.tiles is not None:
+                return self.tiles.crop(self.crop_box)
+            return self._image.crop(self.crop_box)
+        if self.tiles is not None:
+            return self.tiles.composite()
+        return self._image
+    
+    @property
+    def size(self) -> Tuple[int, int]:
+        if self.crop_box is not None:
+            left, top, right, bottom = self.crop_box
+            return right - left, bottom - top
+        if self._lazy_size is not None:
+            return self._lazy_size
+        return self.tiles.size if self.tiles is not None else self._image.size
+    
+    @property
+    def width(self) -> int:
+        return self.size[0]
+    
+    @property
+    def height(self) -> int:
+        return self.size[1]
+    
+    def source_images(self) -> List[Image.Image]:
+        """The shared pixel buffers behind this capture, aligned with pixel_keys."""
+        self._ensure_pixels()
+        if self.tiles is not None:
+            return [tile for _, _, tile in self.tiles.tiles]
+        return [self._image]
+    
+    def get_source_tiles_metadata(self) -> Optional[List[dict]]:
+        """Tile layout of the underlying pixels, ignoring any crop."""
+        if self._pixel_loader is not None:
+            return self._lazy_tiles
+        return self.tiles.get_metadata() if self.tiles is not None else None
+    
+    def get_tiles_metadata(self) -> Optional[List[dict]]:
+        if self.crop_box is not None:
+            return None
+        return self.get_source_tiles_metadata()
+    
+    def derive(self, capture_id: str, x: int, y: int, width: int, height: int) -> "Capture":
+        """
+        Create a child capture that is a crop view of this capture's pixels.
+        
+        The child shares the pixel buffers (nothing is copied until it is
+        rendered) and has its own, initially empty, annotations.
+        """
+        x, y = max(0, int(x)), max(0, int(y))
+        right = min(self.width, x + int(width))
+        bottom = min(self.height, y + int(height))
+        if right <= x or bottom <= y:
+            raise ValueError(
+                f"Region {width}x{height} at ({x}, {y}) is outside capture "
+                f"'{self.id}' ({self.width}x{self.height})"
+            )
+        
+        self._ensure_pixels()
+        region = {"x": x, "y": y, "width": right - x, "height": bottom - y}
+        child = Capture(capture_id, self._image, self.monitor, region, tiles=self.tiles)
+        # Crops of crops still point straight at the shared source pixels
+        offset_x, offset_y = self.crop_box[:2] if self.crop_box is not None else (0, 0)
+        child.crop_box = (offset_x + x, offset_y + y, offset_x + right, offset_y + bottom)
+        child.parent_id = self.id
+        child.pixel_keys = list(self.pixel_keys)
+        return child
     
     def render_annotated_image(self) -> Image.Image:
         """Render the image with all annotations applied."""
-        # Create a copy of the original image
-        image = self.original_image.copy()
+        self._ensure_pixels()
+        # Draw on a copy of the original image (composites and crops are already fresh)
+        with self.pinned_pixels():
+            if self.crop_box is not None or self.tiles is not None:
+                image = self.original_image
+            else:
+                image = self._image.copy()
         draw = ImageDraw.Draw(image)
         
-        # Render each annotation
-        for annotation in self.annotations:
-            annotation.render(draw, image)
+        with self._annotations_lock:
+            self.annotations.render(draw)
         
         return image
     
-    def to_base64(self) -> str:
-        """Convert the annotated image to base64 data URI."""
-        image = self.render_annotated_image()
+    def _clip_box(self, box: Tuple[int, int, int, int]) -> Tuple[int, int, int, int]:
+        left, top = max(0, box[0]), max(0, box[1])
+        right, bottom = min(self.width, box[2]), min(self.height, box[3])
+        if right <= left or bottom <= top:
+            raise ValueError(f"Region {box} is outside capture '{self.id}' ({self.width}x{self.height})")
+        return left, top, right, bottom
+    
+    def render_annotated_region(self, box: Tuple[int, int, int, int], scale: float = 1.0) -> Image.Image:
+        """
+        Render just the (left, top, right, bottom) box of the annotated image,
+        resized by ``scale``.
+        
+        Only the pixels inside the box are copied, and annotations that do
+        not intersect it are skipped without being drawn. Annotations are
+        drawn after resizing, at scaled positions and sizes, so they stay
+        sharp at any zoom.
+        """
+        if not 0 < scale <= MAX_RENDER_SCALE:
+            raise ValueError(f"Scale must be greater than 0 and at most {MAX_RENDER_SCALE:g}")
+        left, top, right, bottom = self._clip_box(box)
+        
+        size = (max(1, round((right - left) * scale)), max(1, round((bottom - top) * scale)))
+        image = self._resized_pixels((left, top, right, bottom), size)
+        draw = ImageDraw.Draw(image)
+        
+        with self._annotations_lock:
+            self.annotations.render(draw, region=(left, top, right, bottom), scale=scale)
+        
+        return image
+    
+    def _resized_pixels(self, box: Tuple[int, int, int, int], size: Tuple[int, int]) -> Image.Image:
+        """The captured pixels in a clipped box, resized to ``size`` straight from the source buffers."""
+        self._ensure_pixels()
+        offset_x, offset_y = self.crop_box[:2] if self.crop_box is not None else (0, 0)
+        left, top, right, bottom = box
+        source_box = (offset_x + left, offset_y + top, offset_x + right, offset_y + bottom)
+        with self.pinned_pixels():
+            if (right - left, bottom - top) == size:
+                if self.tiles is not None:
+                    return self.tiles.crop(source_box)
+                return self._image.crop(source_box)
+            if self.tiles is not None:
+                return self.tiles.resize(source_box, size)
+            return _resize(self._image, source_box, size)
+    
+    def perceptual_hash(self) -> int:
+        """
+        dHash of the captured pixels, without compositing tiles or copying a
+        crop: both are hashed from a small reduction of the source pixels.
+        """
+        self._ensure_pixels()
+        if self.tiles is None and (self.crop_box is None or self._image.mode not in ("L", "RGB")):
+            # Reducing with alpha would premultiply the whole image first
+            with self.pinned_pixels():
+                return dhash(self._image, box=self.crop_box)
+        scale = min(1.0, HASH_PREVIEW_SIZE / max(self.width, self.height))
+        size = (max(9, round(self.width * scale)), max(8, round(self.height * scale)))
+        return dhash(self._resized_pixels((0, 0, self.width, self.height), size))
+    
+    def render_preview(self, max_size: int) -> Image.Image:
+        """
+        The annotated image scaled down to fit ``max_size`` pixels.
+        
+        The pixels are reduced first and annotations drawn on the result at
+        matching sizes, so nothing is copied, composited or drawn at full
+        resolution.
+        """
+        scale = min(1.0, max_size / max(self.width, self.height))
+        return self.render_annotated_region((0, 0, self.width, self.height), scale)
+    
+    def region_to_bytes(self, box: Tuple[int, int, int, int], scale: float = 1.0) -> bytes:
+        """
+        ``render_annotated_region`` as PNG bytes, cached by revision, box
+        and scale so repeated zooms into the same spot are not re-rendered.
+        """
+        box = self._clip_box(box)
+        key = (self.revision, box, float(scale))
+        with _REGION_CACHE_LOCK:
+            cached = self._region_cache.get(key)
+            if cached is not None:
+                self._region_cache.move_to_end(key)
+                return cached
         
-        # Convert to PNG bytes
         buffer = io.BytesIO()
-        image.save(buffer, format="PNG")
-        buffer.seek(0)
+        self.render_annotated_region(box, scale).save(buffer, format="PNG")
+        data = buffer.getvalue()
+        if key[0] == self.revision:
+            with _REGION_CACHE_LOCK:
+                self._region_cache[key] = data
+                while len(self._region_cache) > REGION_CACHE_ENTRIES:
+                    self._region_cache.popitem(last=False)
+        return data
+    
+    def query_annotations(self, box: Tuple[int, int, int, int]) -> List[dict]:
+        """Annotations whose drawn extent intersects the box, with index and bounds."""
+        with self._annotations_lock:
+            annotations = self.annotations
+            return [annotations.to_dict(i) for i in annotations.query(box)]
+    
+    def get_cached_png(self) -> Optional[bytes]:
+        """Return the encoded PNG if it is still current, otherwise None."""
+        cached = self._png_cache
+        if cached is not None and cached[0] == self.revision:
+            return cached[1]
+        return None
+    
+    def encode_png(self, sink, progress: Optional[ProgressCallback] = None) -> None:
+        """
+        Render and encode the annotated image as PNG, passing each chunk to
+        ``sink`` as soon as the encoder produces it.
+        
+        The complete result is cached against the current revision, so later
+        requests can be served with a known length (and byte ranges).
+        ``progress`` hears about the "render" and "encode" stages, and about
+        every chunk encoded.
+        """
+        cached = self.get_cached_png()
+        if cached is not None:
+            sink(cached)
+            return
+        
+        revision = self.revision
+        chunks: List[bytes] = []
+        
+        def collect(chunk: bytes):
+            if progress is not None:
+                progress("encode")
+            chunks.append(chunk)
+            sink(chunk)
         
-        # Encode to base64
-        img_base64 = base64.b64encode(buffer.read()).decode('utf-8')
+        if progress is not None:
+            progress("render")
+        image = self.render_annotated_image()
+        if progress is not None:
+            progress("encode")
+        image.save(_ChunkWriter(collect), format="PNG")
+        del image
+        
+        if revision == self.revision:
+            self._png_cache = (revision, b"".join(chunks))
+    
+    def to_base64(self) -> str:
+        """Convert the annotated image to base64 data URI."""
+        img_base64 = base64.b64encode(self.to_bytes()).decode('utf-8')
         return f"data:image/png;base64,{img_base64}"
     
-    def to_bytes(self) -> bytes:
+    def to_bytes(self, progress: Optional[ProgressCallback] = None) -> bytes:
         """Convert the annotated image to PNG bytes."""
-        image = self.render_annotated_image()
+        cached = self.get_cached_png()
+        if cached is None:
+            chunks: List[bytes] = []
+            self.encode_png(chunks.append, progress)
+            # Fall back to our own chunks if annotated while encoding
+            cached = self.get_cached_png() or b"".join(chunks)
+        return cached
+    
+    def to_thumbnail_bytes(self, max_size: int = THUMBNAIL_SIZE) -> bytes:
+        """The annotated image scaled to fit ``max_size`` pixels, as PNG bytes."""
+        cached = self._thumbnail_cache
+        if cached is not None and cached[0] == (self.revision, max_size):
+            return cached[1]
+        
+        key = (self.revision, max_size)
+        image = self.render_preview(max_size)
         buffer = io.BytesIO()
         image.save(buffer, format="PNG")
-        buffer.seek(0)
-        return buffer.read()
+        data = buffer.getvalue()
+        if key[0] == self.revision:
+            self._thumbnail_cache = (key, data)
+        return data
+    
+    def save(self, path: str, format: str = "png", quality: int = 90) -> str:
+        """
+        Write the annotated image to ``path`` as "png", "jpeg" or "webp".
+        
+        PNG reuses the cached encoding when it is current. The file is
+        written under a temporary name and renamed into place, so a reader
+        never sees a partial image. Returns ``path``.
+        """
+        format = format.lower()
+        if format not in SAVE_FORMATS:
+            raise ValueError(f"Unsupported save format '{format}' (use {', '.join(SAVE_FORMATS)})")
+        
+        partial = f"{path}.partial"
+        try:
+            if format == "png":
+                with open(partial, "wb") as f:
+                    f.write(self.to_bytes())
+            else:
+                image = self.render_annotated_image()
+                if image.mode != "RGB":
+                    image = image.convert("RGB")
+                image.save(partial, format=SAVE_FORMATS[format][0], quality=quality)
+            os.replace(partial, path)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        return path
     
     def to_markdown(self) -> str:
         """Convert to markdown image syntax."""
@@ -83,33 +610,243 @@ class Capture:
     
     def get_metadata(self) -> dict:
         """Get capture metadata."""
+        with self._annotations_lock:
+            revision = self.revision
+            annotations = self.annotations.to_dicts()
         return {
             "id": self.id,
             "timestamp": self.timestamp,
             "monitor": self.monitor,
             "region": self.region,
-            "width": self.original_image.width,
-            "height": self.original_image.height,
-            "annotation_count": len(self.annotations),
-            "annotations": [
-                {
-                    "type": ann.type,
-                    **(ann.model_dump(exclude={"type"}))
-                }
-                for ann in self.annotations
-            ]
+            "width": self.width,
+            "height": self.height,
+            "revision": revision,
+            "annotation_count": len(annotations),
+            "annotations": annotations,
+            "tiles": self.get_tiles_metadata(),
+            "parent_id": self.parent_id,
+            "expires_at": datetime.fromtimestamp(self.expires_at).isoformat() if self.expires_at is not None else None
         }
 
 
 class CaptureManager:
     """Manages screen captures and provides capture functionality."""
     
-    def __init__(self):
+    def __init__(self, store_dir: Optional[str] = None, shared: bool = False,
+                 default_ttl: Optional[float] = None):
+        """
+        Args:
+            store_dir: Optional directory for persisting captures across
+                restarts (SQLite metadata plus compressed pixel blobs)
+            shared: The store is shared with other processes (server
+                workers); call ``sync`` to pick up their changes
+            default_ttl: Seconds new captures live before ``sweep_expired``
+                removes them (None keeps them until deleted)
+        """
         self.captures: Dict[str, Capture] = {}
         self._capture_counter = 0
+        # Guards the captures dict, the ID counter and the similarity index,
+        # which worker threads change while the event loop reads them.
+        # Taken before _expiry_lock when both are needed.
+        self._lock = threading.RLock()
+        self.default_ttl = default_ttl
+        # (expires_at, capture_id) min-heap; entries whose capture has since
+        # been deleted or given another expiry are skipped when popped
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._expiry_lock = threading.Lock()
+        self.frame_pool = FrameBufferPool()
+        self.pixel_store = PixelStore()
+        # Makes releasing a capture's pixels and pinning them for a read
+        # mutually exclusive; never held while taking another lock but the
+        # pixel store's
+        self._pixel_lock = threading.Lock()
+        # Perceptual hashes of all captures, for near-duplicate search
+        self.similarity = BKTree()
+        # Called with an event dict whenever a capture is created, updated
+        # or deleted; may be called from worker threads
+        self.listeners: List[Callable[[dict], None]] = []
         self.mock_mode = not self._has_display()
         if self.mock_mode:
             print("⚠️  No display detected - using MOCK MODE with test images")
+        
+        if shared and not store_dir:
+            raise ValueError("A shared capture manager needs a store directory")
+        self.shared = shared
+        self.store: Optional[CaptureStore] = None
+        # Newest change in the shared store this manager has applied
+        self._synced_version = 0
+        self._sync_lock = threading.Lock()
+        if store_dir:
+            self.store = CaptureStore(store_dir, shared=shared)
+            atexit.register(self.store.close)
+            if shared:
+                self._synced_version = self.store.latest_change()
+            self._restore_from_store()
+    
+    def _restore_from_store(self):
+        """Index stored captures; pixels and annotations load on first use."""
+        with self._lock:
+            for row in self.store.load_index():
+                capture = self._capture_from_row(row)
+                self.captures[capture.id] = capture
+                if capture.dhash is not None:
+                    self.similarity.add(capture.id, capture.dhash)
+                self._track_expiry(capture)
+                self._note_capture_id(capture.id)
+        
+        if self.captures:
+            logger.info(f"Indexed {len(self.captures)} stored capture(s) from {self.store.directory}")
+    
+    def _capture_from_row(self, row: dict) -> Capture:
+        capture = Capture(row["id"], None, row["monitor"], row["region"])
+        capture.timestamp = row["timestamp"]
+        capture.revision = row["revision"]
+        capture.parent_id = row["parent_id"]
+        capture.crop_box = tuple(row["crop"]) if row["crop"] else None
+        capture.dhash = row["dhash"]
+        capture.expires_at = row["expires_at"]
+        capture.set_lazy_state(
+            (row["width"], row["height"]),
+            row["tiles"],
+            row["annotations_json"],
+            lambda c, keys=row["pixel_keys"], tiles=row["tiles"]: self._load_stored_pixels(c, keys, tiles)
+        )
+        capture.on_change = self._capture_changed
+        capture.pixel_pin = self._pin_pixels
+        return capture
+    
+    def sync(self):
+        """
+        Apply changes other processes made to a shared store since the last
+        call. Listeners hear about them as if they had happened here. A
+        no-op for a store that is not shared.
+        """
+        if not self.shared:
+            return
+        with self._sync_lock:
+            version, changes = self.store.changes_since(self._synced_version)
+            if changes is None:
+                self._resync()
+            else:
+                for capture_id, op in changes:
+                    self._apply_change(capture_id, op)
+            self._synced_version = version
+    
+    def _apply_change(self, capture_id: Optional[str], op: str):
+        if op == "clear":
+            if self.captures:
+                self._drop_all()
+                self._notify("cleared")
+            return
+        if op == "delete":
+            if self._drop(capture_id) is not None:
+                self._notify("deleted", capture_id=capture_id)
+            return
+        
+        row = self.store.load_row(capture_id)
+        if row is None:
+            # Deleted again since; a later change in this batch says so
+            return
+        with self._lock:
+            capture = self.captures.get(capture_id)
+            created = capture is None
+            if created:
+                capture = self._capture_from_row(row)
+                self.captures[capture_id] = capture
+                if capture.dhash is not None:
+                    self.similarity.add(capture_id, capture.dhash)
+                self._track_expiry(capture)
+        if created:
+            self._notify("created", capture)
+            return
+        if row["expires_at"] != capture.expires_at:
+            capture.expires_at = row["expires_at"]
+            self._track_expiry(capture)
+        # The store gives every write a higher revision than the one it
+        # replaced, so a newer row here means another worker's edit won
+        if row["revision"] > capture.revision:
+            capture.replace_annotations(row["annotations_json"], row["revision"])
+            self._notify("updated", capture)
+    
+    def _resync(self):
+        """Rebuild from the whole index, after falling too far behind the change log."""
+        self._drop_all()
+        self._restore_from_store()
+        self._notify("cleared")
+        for capture in self.all_captures():
+            self._notify("created", capture)
+    
+    def _note_capture_id(self, capture_id: str):
+        """Keep generated IDs from colliding with ``capture_id``."""
+        match = re.fullmatch(r"capture_(\d+)", capture_id)
+        if match:
+            number = int(match.group(1))
+            with self._lock:
+                self._capture_counter = max(self._capture_counter, number)
+            if self.shared:
+                self.store.reserve_capture_number(number)
+    
+    def _load_stored_pixels(self, capture: Capture, keys: List[str], tiles: Optional[List[dict]]):
+        """Pixel loader for restored captures, sharing buffers already in memory."""
+        images = []
+        for key in keys:
+            image = self.pixel_store.add_ref(key)
+            if image is None:
+                image = self.pixel_store.add(key, self.store.load_blob(key))
+            images.append(image)
+        
+        if tiles:
+            capture.tiles = TiledImage([
+                (tile["global_x"], tile["global_y"], image) for tile, image in zip(tiles, images)
+            ])
+        else:
+            capture._image = images[0]
+        with self._pixel_lock:
+            released = capture.pixels_released
+            if not released:
+                capture.pixel_keys = list(keys)
+        if released:
+            # Deleted while loading; nobody else will drop these references
+            self._release_keys(keys)
+    
+    def _add_capture(self, capture: Capture):
+        """Register a new capture and queue it for persistence."""
+        capture.on_change = self._capture_changed
+        capture.pixel_pin = self._pin_pixels
+        if capture.dhash is None:
+            capture.dhash = capture.perceptual_hash()
+        if capture.expires_at is None and self.default_ttl is not None:
+            capture.expires_at = time.time() + self.default_ttl
+        with self._lock:
+            self.captures[capture.id] = capture
+            self.similarity.add(capture.id, capture.dhash)
+            self._track_expiry(capture)
+            # Queued under the lock so a concurrent delete cannot overtake it
+            if self.store is not None:
+                self.store.save_capture(capture)
+        self._notify("created", capture)
+    
+    def _capture_changed(self, capture: Capture):
+        if capture.id not in self.captures:
+            return
+        if self.store is not None:
+            self.store.save_annotations(capture)
+        self._notify("updated", capture)
+    
+    def _notify(self, event_type: str, capture: Optional[Capture] = None, capture_id: Optional[str] = None):
+        """Tell listeners about a change: {"type", "id", "revision", "timestamp"}."""
+        if not self.listeners:
+            return
+        event = {"type": event_type}
+        if capture is not None:
+            event.update(id=capture.id, revision=capture.revision, timestamp=capture.timestamp)
+        elif capture_id is not None:
+            event["id"] = capture_id
+        for listener in list(self.listeners):
+            try:
+                listener(event)
+            except Exception as e:
+                logger.error(f"Capture listener failed: {e}", exc_info=True)
     
     def _has_display(self) -> bool:
         """Check if a display is available."""
@@ -185,11 +922,81 @@ class CaptureManager:
     
     def _generate_capture_id(self) -> str:
         """Generate a unique capture ID."""
-        self._capture_counter += 1
-        return f"capture_{self._capture_counter:03d}"
+        with self._lock:
+            if self.shared:
+                # Unique across every process using the store
+                self._capture_counter = self.store.next_capture_number()
+            else:
+                self._capture_counter += 1
+            return f"capture_{self._capture_counter:03d}"
+    
+    def _grab_monitor(self, monitor_region: dict, sct=None) -> Tuple[str, Image.Image]:
+        """
+        Grab one monitor or region into the pixel store.
+        
+        The raw grab is hashed before conversion, so an unchanged screen
+        reuses the stored frame and skips the BGRX->RGB decode entirely.
+        Without ``sct`` a private mss handle is opened, which makes this safe
+        to call from worker threads (mss handles are per-thread).
+        """
+        if sct is None:
+            with mss.mss() as own_sct:
+                return self._grab_monitor(monitor_region, own_sct)
+        
+        screenshot = sct.grab(monitor_region)
+        return self._store_raw(screenshot.raw, screenshot.size)
+    
+    def _store_raw(self, raw, size: Tuple[int, int]) -> Tuple[str, Image.Image]:
+        """Add a raw BGRX buffer to the pixel store, decoding it only if new."""
+        key = PixelStore.digest_raw(raw, size, "BGRX")
+        image = self.pixel_store.acquire(key)
+        if image is None:
+            # Decode the BGRX buffer in place into a pooled RGB frame
+            frame = self.frame_pool.frame_from_bgra(raw, size)
+            image = self.pixel_store.add(key, frame, pooled=True)
+            if image is not frame:
+                self.frame_pool.release(frame)
+        return key, image
+    
+    def _mock_pixels(self, width: int, height: int) -> Tuple[str, Image.Image]:
+        """Get a (shared) mock image of the given size from the pixel store."""
+        key = f"mock:{width}x{height}"
+        image = self.pixel_store.acquire(key)
+        if image is None:
+            image = self.pixel_store.add(key, self._create_mock_image(width, height))
+        return key, image
+    
+    def _capture_tiles(self) -> Tuple[List[str], TiledImage]:
+        """Grab every monitor in parallel and keep each one as a tile."""
+        if self.mock_mode:
+            grabs = [self._mock_pixels(1920, 1080) for _ in range(2)]
+            origins = [(0, 0), (1920, 0)]
+        else:
+            with mss.mss() as sct:
+                monitors = sct.monitors[1:]
+            with ThreadPoolExecutor(max_workers=len(monitors)) as executor:
+                futures = [executor.submit(self._grab_monitor, m) for m in monitors]
+            # Every grab has finished here; keep the ones that worked until we know all did
+            grabs, error = [], None
+            for future in futures:
+                try:
+                    grabs.append(future.result())
+                except Exception as e:
+                    error = error or e
+            if error is not None:
+                self._release_keys([key for key, _ in grabs])
+                raise error
+            origins = [(m["left"], m["top"]) for m in monitors]
+        
+        keys = [key for key, _ in grabs]
+        tiles = TiledImage([
+            (left, top, image) for (left, top), (_, image) in zip(origins, grabs)
+        ])
+        return keys, tiles
     
     def capture_screen(self, monitor: int = 0, region: Optional[dict] = None, 
-                       capture_id: Optional[str] = None) -> Capture:
+                       capture_id: Optional[str] = None, tiled: bool = False,
+                       progress: Optional[ProgressCallback] = None) -> Capture:
         """
         Capture a screenshot.
         
@@ -197,13 +1004,30 @@ class CaptureManager:
             monitor: Monitor number (0 for primary, 1+ for additional monitors)
             region: Optional dict with keys: x, y, width, height
             capture_id: Optional custom ID for the capture
+            tiled: With monitor 0 and no region, grab each monitor in parallel
+                and store them as separate tiles instead of one bounding box
+            progress: Told when the "grab" and "store" stages start; if it
+                raises OperationCancelled, the grabbed pixels are dropped
         
         Returns:
             Capture object
         """
+        if progress is not None:
+            progress("grab")
         if capture_id is None:
             capture_id = self._generate_capture_id()
         
+        if tiled and monitor == 0 and not region:
+            try:
+                keys, tiles = self._capture_tiles()
+                capture = Capture(capture_id, None, monitor, region, tiles=tiles)
+                capture.pixel_keys = keys
+            except Exception as e:
+                logger.warning(f"Tiled capture failed: {e}. Falling back to a single grab.")
+            else:
+                self._store_grab(capture, progress)
+                return capture
+        
         # Use mock mode if no display is available
         if self.mock_mode:
             # Determine size based on region or defaults
@@ -214,9 +1038,10 @@ class CaptureManager:
                 width = 1920
                 height = 1080
             
-            image = self._create_mock_image(width, height)
+            key, image = self._mock_pixels(width, height)
             capture = Capture(capture_id, image, monitor, region)
-            self.captures[capture_id] = capture
+            capture.pixel_keys = [key]
+            self._store_grab(capture, progress)
             return capture
         
         # Real screen capture
@@ -244,27 +1069,39 @@ class CaptureManager:
                     capture_region = monitor_region
                 
                 # Capture the screen
-                screenshot = sct.grab(capture_region)
-                
-                # Convert to PIL Image
-                image = Image.frombytes("RGB", screenshot.size, screenshot.bgra, "raw", "BGRX")
+                key, image = self._grab_monitor(capture_region, sct)
         except Exception as e:
             # Fallback to mock mode if capture fails
             print(f"⚠️  Screen capture failed: {e}. Using mock mode.")
             width = region.get('width', 1920) if region else 1920
             height = region.get('height', 1080) if region else 1080
-            image = self._create_mock_image(width, height)
+            key, image = self._mock_pixels(width, height)
         
         # Create capture object
         capture = Capture(capture_id, image, monitor, region)
-        self.captures[capture_id] = capture
+        capture.pixel_keys = [key]
+        self._store_grab(capture, progress)
         
         return capture
     
+    def _store_grab(self, capture: Capture, progress: Optional[ProgressCallback]):
+        """Register a freshly grabbed capture, unless the caller gives up first."""
+        if progress is not None:
+            try:
+                progress("store")
+            except OperationCancelled:
+                self._release_pixels(capture)
+                raise
+        self._add_capture(capture)
+    
     def create_capture_from_data(self, image_data: str, capture_id: Optional[str] = None) -> Capture:
         """
         Create a capture from base64 image data (typically from browser).
         
+        Identical uploads share one decoded pixel buffer: the encoded bytes
+        are hashed first (skipping the decode on an exact repeat), then the
+        decoded pixels, which catches re-encodes of the same content.
+        
         Args:
             image_data: Base64 data URL (e.g., "data:image/png;base64,...")
             capture_id: Optional custom ID for the capture
@@ -280,37 +1117,436 @@ class CaptureManager:
             image_data = image_data.split(',', 1)[1]
         
         # Decode base64 to image
-        image_bytes = base64.b64decode(image_data)
-        image = Image.open(io.BytesIO(image_bytes))
+        image_bytes = _decode_base64(image_data)
+        bytes_key = PixelStore.digest_bytes(image_bytes)
+        key, image = self.pixel_store.acquire_alias(bytes_key)
+        if image is None:
+            image = Image.open(io.BytesIO(image_bytes))
+            image.load()
+            key = PixelStore.digest_image(image)
+            image = self.pixel_store.add(key, image, alias=bytes_key)
         
         # Create capture object
         capture = Capture(capture_id, image, monitor=0, region=None)
-        self.captures[capture_id] = capture
+        capture.pixel_keys = [key]
+        self._add_capture(capture)
+        
+        return capture
+    
+    def create_capture_from_raw(self, raw, size: Tuple[int, int], monitor: int = 0,
+                                region: Optional[dict] = None,
+                                capture_id: Optional[str] = None) -> Capture:
+        """
+        Create a capture from a raw BGRX (or BGRA) pixel buffer, as grabbed by mss.
+        
+        The buffer is read in place and not kept, so it can be a view into
+        memory the caller reuses, such as a shared-memory segment.
+        
+        Args:
+            raw: Buffer of at least width * height * 4 bytes
+            size: (width, height) in pixels
+            monitor: Monitor the pixels came from
+            region: Optional dict with keys: x, y, width, height
+            capture_id: Optional custom ID for the capture
         
+        Returns:
+            Capture object
+        """
+        width, height = size
+        if width < 1 or height < 1:
+            raise ValueError(f"Invalid frame size {width}x{height}")
+        frame_bytes = width * height * 4
+        # Views are released on the way out, error or not: a traceback would
+        # otherwise keep them alive, and a shared-memory segment cannot be
+        # closed while views of it exist
+        with memoryview(raw) as view, view.cast("B") as flat:
+            if len(flat) < frame_bytes:
+                raise ValueError(f"Frame buffer holds {len(flat)} bytes, {width}x{height} needs {frame_bytes}")
+            
+            if capture_id is None:
+                capture_id = self._generate_capture_id()
+            with flat[:frame_bytes] as frame:
+                key, image = self._store_raw(frame, (width, height))
+        capture = Capture(capture_id, image, monitor, region)
+        capture.pixel_keys = [key]
+        self._add_capture(capture)
         return capture
     
+    def derive_capture(self, parent_id: str, x: int, y: int, width: int, height: int,
+                       capture_id: Optional[str] = None) -> Capture:
+        """
+        Create a capture that is a crop of an existing one without copying
+        pixels or re-capturing.
+        
+        Args:
+            parent_id: ID of the capture to crop
+            x, y, width, height: Region in the parent's coordinates
+            capture_id: Optional custom ID for the new capture
+        
+        Returns:
+            Capture object
+        """
+        if capture_id is None:
+            capture_id = self._generate_capture_id()
+        
+        # Locked so the parent cannot release its pixels before we hold them
+        with self._lock:
+            parent = self.captures.get(parent_id)
+            if parent is None:
+                raise KeyError(f"Capture '{parent_id}' not found")
+            capture = parent.derive(capture_id, x, y, width, height)
+            # Hold our own references so the pixels outlive the parent
+            for key in capture.pixel_keys:
+                self.pixel_store.add_ref(key)
+        self._add_capture(capture)
+        return capture
+    
+    def diff_captures(self, before_id: str, after_id: str, block_size: int = 8, threshold: int = 32,
+                      capture_id: Optional[str] = None) -> Tuple[Capture, List[Tuple[int, int, int, int]]]:
+        """
+        Compare two captures and box every region that changed.
+        
+        Args:
+            before_id: ID of the earlier capture
+            after_id: ID of the later capture
+            block_size: Size in pixels of the blocks compared
+            threshold: Per-channel difference (0-255) a pixel must exceed to count as changed
+            capture_id: Optional custom ID for the result
+        
+        Returns:
+            (capture, regions): a view of the ``after`` capture's pixels with
+            a box annotation around each changed region, and the regions as
+            (left, top, right, bottom) boxes
+        """
+        before = self.get_capture(before_id)
+        after = self.get_capture(after_id)
+        for requested, capture in ((before_id, before), (after_id, after)):
+            if capture is None:
+                raise KeyError(f"Capture '{requested}' not found")
+        
+        with before.pinned_pixels(), after.pinned_pixels():
+            regions = diff_regions(before.original_image, after.original_image, int(block_size), int(threshold))
+        
+        if capture_id is None:
+            capture_id = self._generate_capture_id()
+        with self._lock:
+            if self.captures.get(after_id) is not after:
+                raise KeyError(f"Capture '{after_id}' was deleted during the comparison")
+            result = after.derive(capture_id, 0, 0, after.width, after.height)
+            # Hold our own references so the pixels outlive the compared captures
+            for key in result.pixel_keys:
+                self.pixel_store.add_ref(key)
+        # Same pixels as ``after``, so the same perceptual hash
+        result.dhash = after.dhash
+        for left, top, right, bottom in regions:
+            result.annotations.add_box(left, top, right - left - 1, bottom - top - 1, color="red", line_width=2)
+        self._add_capture(result)
+        return result, regions
+    
+    def captures_between(self, since: Optional[str] = None, until: Optional[str] = None) -> List[Capture]:
+        """Captures taken within an (inclusive) ISO 8601 time range, oldest first."""
+        start = datetime.fromisoformat(since) if since else None
+        end = datetime.fromisoformat(until) if until else None
+        selected = []
+        for capture in self.all_captures():
+            taken = datetime.fromisoformat(capture.timestamp)
+            if (start is None or taken >= start) and (end is None or taken <= end):
+                selected.append(capture)
+        selected.sort(key=lambda capture: capture.timestamp)
+        return selected
+    
+    def export_animation(self, capture_ids: List[str], format: str = "gif", duration: int = 500,
+                         loop: int = 0, reuse_palette: bool = True, crop_deltas: bool = True,
+                         quality: Optional[int] = None) -> Iterator[bytes]:
+        """
+        Encode captures, with their annotations, as an animation.
+        
+        Returns an iterator over the encoded file's chunks. Frames are
+        rendered and encoded one at a time as the iterator is consumed;
+        arguments are checked up front. See ``animation.iter_animation``
+        for the options.
+        """
+        captures = []
+        for capture_id in capture_ids:
+            capture = self.get_capture(capture_id)
+            if capture is None:
+                raise KeyError(f"Capture '{capture_id}' not found")
+            captures.append(capture)
+        if not captures:
+            raise ValueError("No captures to export")
+        
+        size = (max(c.width for c in captures), max(c.height for c in captures))
+        frames = (capture.render_annotated_image() for capture in captures)
+        return iter_animation(frames, len(captures), size, format, duration, loop,
+                              reuse_palette, crop_deltas, quality)
+    
+    def export_archive(self, capture_ids: List[str], sink: Callable[[bytes], None]):
+        """
+        Write captures as a tar archive (see ``archive``), passing each chunk
+        to ``sink`` as it is produced.
+        """
+        captures = []
+        for capture_id in capture_ids:
+            capture = self.get_capture(capture_id)
+            if capture is None:
+                raise KeyError(f"Capture '{capture_id}' not found")
+            captures.append(capture)
+        write_archive(captures, _ChunkWriter(sink))
+    
+    def import_archive(self, fileobj) -> Dict[str, str]:
+        """
+        Add the captures in a tar archive read from ``fileobj``.
+        
+        Captures keep their IDs, timestamps and annotations; an ID that is
+        already taken is replaced with a new one. Returns a mapping of
+        archived ID to imported ID.
+        """
+        imported: Dict[str, str] = {}
+        for metadata, image in read_archive(fileobj):
+            image_hash = dhash(image)
+            key = PixelStore.digest_image(image)
+            image = self.pixel_store.acquire(key) or self.pixel_store.add(key, image)
+            
+            capture = Capture(metadata["id"], image, metadata.get("monitor", 0), metadata.get("region"))
+            capture.pixel_keys = [key]
+            capture.dhash = image_hash
+            capture.timestamp = metadata.get("timestamp", capture.timestamp)
+            try:
+                capture.annotations.extend_from_dicts(metadata.get("annotations", []))
+            except ValueError:
+                self._release_pixels(capture)
+                raise
+            
+            # Checking and taking the ID in one step, so no other thread takes it in between
+            with self._lock:
+                if capture.id in self.captures or capture.id in imported.values() or (
+                    self.shared and self.store.load_row(capture.id) is not None
+                ):
+                    capture.id = self._generate_capture_id()
+                else:
+                    self._note_capture_id(capture.id)
+                self._add_capture(capture)
+            imported[metadata["id"]] = capture.id
+        
+        return imported
+    
     def get_capture(self, capture_id: str) -> Optional[Capture]:
         """Get a capture by ID."""
         return self.captures.get(capture_id)
     
     def list_captures(self) -> List[dict]:
         """List all captures with metadata."""
-        return [capture.get_metadata() for capture in self.captures.values()]
+        return [capture.get_metadata() for capture in self.all_captures()]
+    
+    def all_captures(self) -> List[Capture]:
+        """The captures at this moment, safe to iterate while others change."""
+        with self._lock:
+            return list(self.captures.values())
     
     def delete_capture(self, capture_id: str) -> bool:
         """Delete a specific capture."""
-        if capture_id in self.captures:
-            del self.captures[capture_id]
-            return True
-        return False
+        with self._lock:
+            if self._drop(capture_id) is None:
+                return False
+            if self.store is not None:
+                self.store.delete_capture(capture_id)
+        self._notify("deleted", capture_id=capture_id)
+        return True
     
     def clear_all(self):
         """Clear all captures."""
-        self.captures.clear()
-        self._capture_counter = 0
+        with self._lock:
+            self._drop_all()
+            if self.store is not None:
+                self.store.clear()
+        self._notify("cleared")
+    
+    def _drop(self, capture_id: str) -> Optional[int]:
+        """
+        Forget a capture here, leaving the store alone. Returns the bytes
+        of pixels and cached PNG freed, or None if there was no such capture.
+        """
+        with self._lock:
+            capture = self.captures.pop(capture_id, None)
+            if capture is None:
+                return None
+            self.similarity.remove(capture_id)
+            freed = self._release_pixels(capture)
+        if capture._png_cache is not None:
+            freed += len(capture._png_cache[1])
+        if capture._thumbnail_cache is not None:
+            freed += len(capture._thumbnail_cache[1])
+        freed += sum(len(data) for data in list(capture._region_cache.values()))
+        return freed
+    
+    def _drop_all(self):
+        with self._lock:
+            captures = list(self.captures.values())
+            self.captures.clear()
+            self._capture_counter = 0
+            self.similarity.clear()
+            with self._expiry_lock:
+                self._expiry_heap.clear()
+            for capture in captures:
+                self._release_pixels(capture)
+    
+    def _release_pixels(self, capture: Capture) -> int:
+        """
+        Drop a capture's pixel references, recycling buffers nobody shares.
+        Returns the bytes no capture references any more.
+        """
+        with self._pixel_lock:
+            keys, capture.pixel_keys = capture.pixel_keys, []
+            capture.pixels_released = True
+        return self._release_keys(keys)
+    
+    def _release_keys(self, keys: List[str]) -> int:
+        """Drop one reference to each key; returns the bytes freed."""
+        freed = 0
+        for key in keys:
+            image, pooled = self.pixel_store.release(key)
+            if image is not None:
+                freed += image_nbytes(image)
+                if pooled:
+                    self.frame_pool.release(image)
+        return freed
+    
+    @contextmanager
+    def _pin_pixels(self, capture: Capture):
+        """
+        Hold an extra reference to each of a capture's pixel buffers while
+        they are read, so that a concurrent delete leaves the last release,
+        and with it the recycling of pooled frames, to the reader.
+        """
+        capture._ensure_pixels()
+        with self._pixel_lock:
+            if capture.pixels_released:
+                raise KeyError(f"Capture '{capture.id}' was deleted")
+            keys = list(capture.pixel_keys)
+            for key in keys:
+                self.pixel_store.add_ref(key)
+        try:
+            yield
+        finally:
+            self._release_keys(keys)
+    
+    def _track_expiry(self, capture: Capture):
+        if capture.expires_at is None:
+            return
+        with self._lock, self._expiry_lock:
+            heapq.heappush(self._expiry_heap, (capture.expires_at, capture.id))
+            if len(self._expiry_heap) > 2 * len(self.captures) + 64:
+                # Mostly stale entries: rebuild from the live expiry times
+                self._expiry_heap = [
+                    (c.expires_at, c.id) for c in list(self.captures.values()) if c.expires_at is not None
+                ]
+                heapq.heapify(self._expiry_heap)
+    
+    def set_capture_ttl(self, capture_id: str, ttl: Optional[float]) -> Optional[Capture]:
+        """
+        Make a capture expire ``ttl`` seconds from now, or never if ``ttl``
+        is None. Returns the capture, or None if not found.
+        """
+        if ttl is not None and ttl < 0:
+            raise ValueError("ttl must not be negative")
+        capture = self.captures.get(capture_id)
+        if capture is None:
+            return None
+        capture.expires_at = time.time() + ttl if ttl is not None else None
+        self._track_expiry(capture)
+        if self.store is not None:
+            self.store.save_expiry(capture)
+        return capture
+    
+    def sweep_expired(self, limit: int = 32, now: Optional[float] = None) -> Tuple[int, int]:
+        """
+        Delete up to ``limit`` captures whose expiry time has passed, soonest
+        first. Returns (captures deleted, bytes freed); fewer than ``limit``
+        deleted means none are left to sweep.
+        """
+        now = time.time() if now is None else now
+        expired = []
+        freed = 0
+        while len(expired) < limit:
+            with self._expiry_lock:
+                if not self._expiry_heap or self._expiry_heap[0][0] > now:
+                    break
+                expires_at, capture_id = heapq.heappop(self._expiry_heap)
+            capture = self.captures.get(capture_id)
+            if capture is None or capture.expires_at != expires_at:
+                continue
+            dropped = self._drop(capture_id)
+            if dropped is not None:
+                freed += dropped
+                expired.append(capture_id)
+        
+        if expired:
+            if self.store is not None:
+                self.store.delete_captures(expired)
+            for capture_id in expired:
+                self._notify("deleted", capture_id=capture_id)
+        return len(expired), freed
+    
+    def get_stats(self) -> dict:
+        """Get capture, deduplication and frame pool statistics."""
+        return {
+            "captures": len(self.captures),
+            "pixel_store": self.pixel_store.get_stats(),
+            "frame_pool": self.frame_pool.get_stats(),
+        }
+    
+    def find_similar_captures(self, capture_id: str, max_distance: int = 10,
+                              limit: int = 10) -> List[dict]:
+        """
+        Find the captures whose pixels look most like this capture's.
+        
+        Matches are ranked by the Hamming distance between perceptual hashes
+        (0 = visually identical, 64 = unrelated) and only hashes are
+        compared, so no image is decoded. Raises KeyError if the capture
+        does not exist.
+        """
+        capture = self.captures.get(capture_id)
+        if capture is None:
+            raise KeyError(capture_id)
+        self._backfill_hashes()
+        
+        max_distance = max(0, min(int(max_distance), HASH_BITS))
+        matches = []
+        with self._lock:
+            found = self.similarity.search(capture.dhash, max_distance)
+        for distance, other_id in found:
+            other = self.captures.get(other_id)
+            if other is None or other_id == capture_id:
+                continue
+            matches.append((distance, other))
+        # Nearest first; among equals, the most recent first
+        matches.sort(key=lambda match: match[1].timestamp, reverse=True)
+        matches.sort(key=lambda match: match[0])
+        
+        return [
+            {
+                "id": other.id,
+                "distance": distance,
+                "timestamp": other.timestamp,
+                "width": other.width,
+                "height": other.height,
+                "parent_id": other.parent_id,
+            }
+            for distance, other in matches[:max(0, int(limit))]
+        ]
+    
+    def _backfill_hashes(self):
+        """Hash captures restored from a store written before hashes were kept."""
+        for capture in self.all_captures():
+            if capture.dhash is None:
+                capture.dhash = capture.perceptual_hash()
+                with self._lock:
+                    if self.captures.get(capture.id) is capture:
+                        self.similarity.add(capture.id, capture.dhash)
+                if self.store is not None:
+                    self.store.save_dhash(capture)
     
     def get_latest_capture(self) -> Optional[Capture]:
         """Get the most recently created capture."""
-        if not self.captures:
-            return None
-        return list(self.captures.values())[-1]
+        captures = self.all_captures()
+        return captures[-1] if captures else None
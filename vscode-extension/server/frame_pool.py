@@ -0,0 +1,69 @@
+"""
+Frame buffer pool for Grabitar.
+Reuses preallocated RGB frames so continuous capture does not churn allocations.
+"""
+
+import threading
+from typing import Dict, List, Tuple
+from PIL import Image
+
+
+class FrameBufferPool:
+    """Per-resolution pool of reusable RGB frame buffers."""
+    
+    def __init__(self, max_per_size: int = 4):
+        self.max_per_size = max_per_size
+        self._free: Dict[Tuple[int, int], List[Image.Image]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def acquire(self, size: Tuple[int, int]) -> Image.Image:
+        """Get a frame of the given size, reusing a released one if possible."""
+        size = (int(size[0]), int(size[1]))
+        with self._lock:
+            free = self._free.get(size)
+            if free:
+                self.hits += 1
+                return free.pop()
+            self.misses += 1
+        return Image.new("RGB", size)
+    
+    def release(self, image: Image.Image):
+        """
+        Return a frame to the pool.
+        
+        The caller must not touch the frame afterwards; its pixels will be
+        overwritten by the next capture of the same resolution.
+        """
+        if image.mode != "RGB" or image.readonly:
+            return
+        with self._lock:
+            free = self._free.setdefault(image.size, [])
+            if len(free) < self.max_per_size:
+                free.append(image)
+    
+    def frame_from_bgra(self, raw, size: Tuple[int, int]) -> Image.Image:
+        """
+        Decode a BGRA/BGRX buffer (as produced by mss) into a pooled frame.
+        
+        The raw buffer is read in place, so there is no intermediate
+        ``bytes`` copy and no fresh allocation once the pool is warm.
+        """
+        frame = self.acquire(size)
+        frame.frombytes(raw, "raw", "BGRX")
+        return frame
+    
+    def get_stats(self) -> dict:
+        """Get pool usage statistics."""
+        with self._lock:
+            pooled = sum(len(free) for free in self._free.values())
+            pooled_bytes = sum(
+                w * h * 3 * len(free) for (w, h), free in self._free.items()
+            )
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "pooled_frames": pooled,
+            "pooled_bytes": pooled_bytes,
+        }
@@ -0,0 +1,264 @@
+"""
+Local client for the Grabitar server.
+Talks HTTP over the server's Unix domain socket and hands full frames over
+through shared memory, so a local capture reaches the server without PNG
+encoding or copying pixels through the socket.
+"""
+
+import http.client
+import io
+import json
+import os
+import socket
+import tempfile
+import threading
+from multiprocessing import shared_memory
+from typing import List, Optional, Tuple
+from urllib.parse import quote
+from PIL import Image
+import mss
+from mss.exception import ScreenShotError
+
+from save_formats import SAVE_FORMATS
+
+
+class RequestError(RuntimeError):
+    """A request the server answered with an error status."""
+    
+    def __init__(self, message: str, status: int):
+        super().__init__(message)
+        self.status = status
+
+
+def default_socket_path() -> str:
+    """The server's socket path: $GRABITAR_SOCKET, else one per user in the temp dir."""
+    path = os.environ.get("GRABITAR_SOCKET")
+    if path:
+        return path
+    user = os.getuid() if hasattr(os, "getuid") else os.getlogin()
+    return os.path.join(tempfile.gettempdir(), f"grabitar-{user}.sock")
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self._path = path
+    
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._path)
+
+
+class GrabitarClient:
+    """
+    HTTP client for a Grabitar server on this machine.
+    
+    Each thread keeps its own keep-alive connection to the socket. Frames
+    are written into a shared-memory segment that the server reads in place
+    while handling the request; the segment is reused for later frames that
+    fit and released by ``close``.
+    """
+    
+    def __init__(self, socket_path: Optional[str] = None, timeout: float = 10.0):
+        self.socket_path = socket_path or default_socket_path()
+        self.timeout = timeout
+        self._local = threading.local()
+        self._frame_lock = threading.Lock()
+        self._segment: Optional[shared_memory.SharedMemory] = None
+    
+    def is_available(self) -> bool:
+        """Whether a server is listening on the socket."""
+        if not hasattr(socket, "AF_UNIX") or not os.path.exists(self.socket_path):
+            return False
+        try:
+            self.request("GET", "/api/stats")
+        except (OSError, RuntimeError):
+            return False
+        return True
+    
+    def _connection(self) -> _UnixHTTPConnection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = _UnixHTTPConnection(self.socket_path, self.timeout)
+        return connection
+    
+    def _send(self, method: str, path: str, body: Optional[bytes], headers: dict) -> Tuple[int, bytes]:
+        connection = self._connection()
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            return response.status, response.read()
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            raise
+    
+    def request_raw(self, method: str, path: str, body: Optional[dict] = None) -> bytes:
+        """Send a request and return the response body; raises RequestError on an error status."""
+        data = json.dumps(body).encode() if body is not None else None
+        headers = {"Content-Type": "application/json"} if data is not None else {}
+        try:
+            status, payload = self._send(method, path, data, headers)
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            # The server closed an idle keep-alive connection; retry once on a new one
+            status, payload = self._send(method, path, data, headers)
+        
+        if status >= 400:
+            try:
+                detail = json.loads(payload).get("detail", payload.decode(errors="replace"))
+            except ValueError:
+                detail = payload.decode(errors="replace")
+            raise RequestError(f"{method} {path} failed ({status}): {detail}", status)
+        return payload
+    
+    def request(self, method: str, path: str, body: Optional[dict] = None):
+        """Send a request and decode the JSON response."""
+        return json.loads(self.request_raw(method, path, body))
+    
+    def send_frame(self, raw, size: Tuple[int, int], monitor: int = 0,
+                   region: Optional[dict] = None) -> dict:
+        """
+        Create a capture from a raw BGRX/BGRA buffer (such as an mss grab).
+        
+        Returns the new capture's metadata.
+        """
+        width, height = size
+        frame_bytes = width * height * 4
+        raw = memoryview(raw).cast("B")
+        if len(raw) < frame_bytes:
+            raise ValueError(f"Frame buffer holds {len(raw)} bytes, {width}x{height} needs {frame_bytes}")
+        with self._frame_lock:
+            segment = self._segment
+            if segment is None or segment.size < frame_bytes:
+                self._release_segment()
+                segment = self._segment = shared_memory.SharedMemory(create=True, size=frame_bytes)
+            segment.buf[:frame_bytes] = raw[:frame_bytes]
+            # The server has finished reading the segment by the time it responds
+            return self.request("POST", "/api/frames", {
+                "shm": segment.name,
+                "width": width,
+                "height": height,
+                "monitor": monitor,
+                "region": region,
+            })
+    
+    def _release_segment(self):
+        if self._segment is not None:
+            self._segment.close()
+            self._segment.unlink()
+            self._segment = None
+    
+    def close(self):
+        """Release the shared-memory segment and this thread's connection."""
+        with self._frame_lock:
+            self._release_segment()
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+class RemoteCapture:
+    """
+    A capture held by the server, with the parts of the ``Capture``
+    interface the overlay uses.
+    """
+    
+    def __init__(self, client: GrabitarClient, metadata: dict):
+        self.client = client
+        self.id = metadata["id"]
+        self.region = metadata.get("region") or {}
+        self.width = metadata.get("width")
+        self.height = metadata.get("height")
+    
+    def add_box_annotation(self, x: int, y: int, width: int, height: int,
+                           color: str = "red", line_width: int = 3, label: Optional[str] = None):
+        self.client.request("POST", f"/api/captures/{self.id}/annotations/box", {
+            "x": x, "y": y, "width": width, "height": height,
+            "color": color, "line_width": line_width, "label": label,
+        })
+    
+    def add_text_annotation(self, x: int, y: int, text: str,
+                            font_size: int = 20, color: str = "red", background: Optional[str] = "white"):
+        self.client.request("POST", f"/api/captures/{self.id}/annotations/text", {
+            "x": x, "y": y, "text": text,
+            "font_size": font_size, "color": color, "background": background,
+        })
+    
+    def clear_annotations(self):
+        self.client.request("DELETE", f"/api/captures/{self.id}/annotations")
+    
+    def to_bytes(self) -> bytes:
+        """The annotated image as PNG bytes, rendered by the server."""
+        return self.client.request_raw("GET", f"/api/captures/{self.id}/image")
+    
+    def save(self, path: str, format: str = "png", quality: int = 90) -> str:
+        """Write the annotated image to ``path``, like ``Capture.save``."""
+        format = format.lower()
+        if format not in SAVE_FORMATS:
+            raise ValueError(f"Unsupported save format '{format}' (use {', '.join(SAVE_FORMATS)})")
+        
+        data = self.to_bytes()
+        partial = f"{path}.partial"
+        try:
+            if format == "png":
+                with open(partial, "wb") as f:
+                    f.write(data)
+            else:
+                image = Image.open(io.BytesIO(data)).convert("RGB")
+                image.save(partial, format=SAVE_FORMATS[format][0], quality=quality)
+            os.replace(partial, path)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        return path
+
+
+class RemoteCaptureManager:
+    """
+    Drop-in for the parts of ``CaptureManager`` the overlay uses, backed by
+    a local server: screens are grabbed here and handed over as raw frames,
+    everything else is stored and rendered by the server.
+    """
+    
+    def __init__(self, client: GrabitarClient):
+        self.client = client
+    
+    def capture_screen(self, monitor: int = 0, region: Optional[dict] = None) -> RemoteCapture:
+        try:
+            with mss.mss() as sct:
+                if monitor >= len(sct.monitors):
+                    raise ValueError(f"Monitor {monitor} not found. Available monitors: {len(sct.monitors) - 1}")
+                if region:
+                    grab_region = {
+                        "left": region["x"], "top": region["y"],
+                        "width": region["width"], "height": region["height"],
+                    }
+                else:
+                    grab_region = sct.monitors[monitor]
+                screenshot = sct.grab(grab_region)
+        except ScreenShotError:
+            # Let the server grab (or mock) the screen itself
+            return RemoteCapture(self.client, self.client.request(
+                "POST", "/api/capture", {"monitor": monitor, "region": region}
+            ))
+        
+        return RemoteCapture(self.client, self.client.send_frame(
+            screenshot.raw, screenshot.size, monitor, region
+        ))
+    
+    def get_capture(self, capture_id: str) -> Optional[RemoteCapture]:
+        try:
+            metadata = self.client.request("GET", f"/api/captures/{quote(capture_id, safe='')}")
+        except RequestError as e:
+            if e.status == 404:
+                return None
+            raise
+        return RemoteCapture(self.client, metadata)
+    
+    def list_captures(self) -> List[dict]:
+        return self.client.request("GET", "/api/captures")
+    
+    def close(self):
+        self.client.close()
@@ -0,0 +1,146 @@
+"""
+Content-addressed pixel storage for Grabitar.
+Captures with identical pixels share one stored buffer under their own IDs.
+"""
+
+import hashlib
+import threading
+from typing import Dict, Optional, Set, Tuple
+from PIL import Image
+
+# Rows hashed per strip, so hashing never needs a full copy of the frame
+_HASH_STRIP_ROWS = 256
+
+
+def _bytes_per_pixel(image: Image.Image) -> int:
+    return len(image.getbands()) if image.mode not in ("I", "F", "I;16") else 4
+
+
+def image_nbytes(image: Image.Image) -> int:
+    """Approximate in-memory size of an image's pixel buffer."""
+    return image.width * image.height * _bytes_per_pixel(image)
+
+
+class PixelStore:
+    """Reference-counted, content-addressed store of pixel buffers."""
+    
+    def __init__(self):
+        # key -> [image, refcount, pooled]
+        self._entries: Dict[str, list] = {}
+        # digest of encoded upload bytes -> pixel key
+        self._aliases: Dict[str, str] = {}
+        self._aliases_by_key: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.dedup_hits = 0
+        self.bytes_saved = 0
+    
+    @staticmethod
+    def digest_bytes(data) -> str:
+        """Digest of an encoded upload (before decoding)."""
+        return "bytes:" + hashlib.blake2b(data, digest_size=16).hexdigest()
+    
+    @staticmethod
+    def digest_raw(raw, size: Tuple[int, int], rawmode: str) -> str:
+        """Digest of a raw pixel buffer, such as an mss grab."""
+        h = hashlib.blake2b(raw, digest_size=16)
+        h.update(f"{rawmode}:{size[0]}x{size[1]}".encode())
+        return f"raw:{h.hexdigest()}"
+    
+    @staticmethod
+    def digest_image(image: Image.Image) -> str:
+        """Digest of a decoded image's pixels, hashed strip by strip."""
+        h = hashlib.blake2b(digest_size=16)
+        h.update(f"{image.mode}:{image.width}x{image.height}".encode())
+        for top in range(0, image.height, _HASH_STRIP_ROWS):
+            bottom = min(top + _HASH_STRIP_ROWS, image.height)
+            h.update(image.crop((0, top, image.width, bottom)).tobytes())
+        return f"pixels:{h.hexdigest()}"
+    
+    def acquire(self, key: str) -> Optional[Image.Image]:
+        """
+        Take a reference to a stored buffer for newly ingested content,
+        counting it as a dedup hit; None if it is not stored.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry[1] += 1
+            self.dedup_hits += 1
+            self.bytes_saved += image_nbytes(entry[0])
+            return entry[0]
+    
+    def add_ref(self, key: str) -> Optional[Image.Image]:
+        """
+        Take another reference to a stored buffer that is already in use,
+        such as a derived capture's; not counted as a dedup hit.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry[1] += 1
+            return entry[0]
+    
+    def acquire_alias(self, alias: str) -> Tuple[Optional[str], Optional[Image.Image]]:
+        """Take a reference via an upload digest; returns (key, image)."""
+        with self._lock:
+            key = self._aliases.get(alias)
+        if key is None:
+            return None, None
+        image = self.acquire(key)
+        return (key, image) if image is not None else (None, None)
+    
+    def add(self, key: str, image: Image.Image, pooled: bool = False,
+            alias: Optional[str] = None) -> Image.Image:
+        """
+        Store a buffer and take a reference to it.
+        
+        If another thread stored the same content first, its buffer is
+        returned instead and ``image`` can be discarded.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[1] += 1
+                self.dedup_hits += 1
+                self.bytes_saved += image_nbytes(entry[0])
+            else:
+                entry = self._entries[key] = [image, 1, pooled]
+            if alias is not None:
+                self._aliases[alias] = key
+                self._aliases_by_key.setdefault(key, set()).add(alias)
+            return entry[0]
+    
+    def release(self, key: str) -> Tuple[Optional[Image.Image], bool]:
+        """
+        Drop a reference.
+        
+        Returns (image, pooled) once the last reference is gone so the caller
+        can recycle the buffer, otherwise (None, False).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, False
+            entry[1] -= 1
+            if entry[1] > 0:
+                return None, False
+            del self._entries[key]
+            for alias in self._aliases_by_key.pop(key, ()):
+                self._aliases.pop(alias, None)
+            return entry[0], entry[2]
+    
+    def get_stats(self) -> dict:
+        """Get deduplication statistics."""
+        with self._lock:
+            stored_bytes = sum(image_nbytes(entry[0]) for entry in self._entries.values())
+            references = sum(entry[1] for entry in self._entries.values())
+            buffers = len(self._entries)
+        return {
+            "unique_buffers": buffers,
+            "references": references,
+            "stored_bytes": stored_bytes,
+            "dedup_hits": self.dedup_hits,
+            "bytes_saved": self.bytes_saved,
+        }
@@ -4,31 +4,103 @@ Hybrid server supporting both MCP protocol for Copilot and FastAPI for web UI
 """
 
 import asyncio
+import base64
 import logging
+import io
+import json
+import queue
+import socket
+import tarfile
+import tempfile
+import re
+import threading
+import time
+import weakref
+from multiprocessing import resource_tracker, shared_memory
 from typing import Optional
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Request
-from fastapi.responses import HTMLResponse, Response, JSONResponse, FileResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import HTMLResponse, Response, JSONResponse, FileResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import AnyUrl, BaseModel, ValidationError
 import os
 import uvicorn
 
 from mcp.server.models import InitializationOptions
 from mcp.server import NotificationOptions, Server
+from mcp.server.lowlevel.helper_types import ReadResourceContents
 from mcp.server.stdio import stdio_server
-from mcp.types import Tool, TextContent, ImageContent, EmbeddedResource
+from mcp.types import Tool, TextContent, ImageContent, EmbeddedResource, Resource, ResourceTemplate
 
-from capture_manager import CaptureManager
+from admission import AdmissionMiddleware, DecodeLimiter, RateLimited, RateLimiter, retry_after_header
+from animation import FORMATS as ANIMATION_FORMATS
+from capture_manager import MAX_RENDER_SCALE, THUMBNAIL_SIZE, Capture, CaptureManager, OperationCancelled
+from compression import CompressionMiddleware
+from grabitar_client import default_socket_path
+from static_assets import StaticAssets
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("grabitar")
 
-# Global capture manager
-capture_manager = CaptureManager()
+# Web server worker processes (GRABITAR_WORKERS or --workers); several
+# workers share one capture store, a per-user temp directory by default
+WORKERS = max(1, int(os.environ.get("GRABITAR_WORKERS", "1")))
+STORE_SYNC_SECONDS = 0.5
+
+# Captures expire this many seconds after they are taken (unset: kept until deleted)
+CAPTURE_TTL_SECONDS = float(os.environ["GRABITAR_CAPTURE_TTL"]) if os.environ.get("GRABITAR_CAPTURE_TTL") else None
+# Expired captures are swept this often, a batch at a time so requests get in between
+SWEEP_INTERVAL_SECONDS = 1.0
+SWEEP_BATCH_SIZE = 32
+
+
+def default_shared_store_dir() -> str:
+    user = os.getuid() if hasattr(os, "getuid") else os.getlogin()
+    return os.path.join(tempfile.gettempdir(), f"grabitar-store-{user}")
+
+
+# Global capture manager (set GRABITAR_STORE_DIR to keep captures across restarts)
+capture_manager = CaptureManager(
+    store_dir=os.environ.get("GRABITAR_STORE_DIR") or (default_shared_store_dir() if WORKERS > 1 else None),
+    shared=WORKERS > 1,
+    default_ttl=CAPTURE_TTL_SECONDS,
+)
+
+# Totals since startup, reported by /api/stats
+sweep_stats = {
+    "sweeps": 0,
+    "expired": 0,
+    "reclaimed_bytes": 0,
+    "last_sweep_ms": 0.0,
+    "max_sweep_ms": 0.0,
+    "max_batch_ms": 0.0,
+}
+
+
+async def _sweep_expired_periodically():
+    """Delete expired captures, yielding to the event loop between batches."""
+    while True:
+        await asyncio.sleep(SWEEP_INTERVAL_SECONDS)
+        started = time.perf_counter()
+        try:
+            while True:
+                batch_started = time.perf_counter()
+                expired, reclaimed = capture_manager.sweep_expired(SWEEP_BATCH_SIZE)
+                sweep_stats["max_batch_ms"] = round(max(sweep_stats["max_batch_ms"],
+                                                        (time.perf_counter() - batch_started) * 1000), 3)
+                sweep_stats["expired"] += expired
+                sweep_stats["reclaimed_bytes"] += reclaimed
+                if expired < SWEEP_BATCH_SIZE:
+                    break
+                await asyncio.sleep(0)
+        except Exception as e:
+            logger.error(f"Expiry sweep failed: {e}", exc_info=True)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        sweep_stats["sweeps"] += 1
+        sweep_stats["last_sweep_ms"] = round(elapsed_ms, 3)
+        sweep_stats["max_sweep_ms"] = round(max(sweep_stats["max_sweep_ms"], elapsed_ms), 3)
 
 # MCP Server setup
 mcp_server = Server("grabitar")
@@ -38,6 +110,7 @@ mcp_server = Server("grabitar")
 @mcp_server.list_tools()
 async def handle_list_tools() -> list[Tool]:
     """List all available MCP tools."""
+    resource_notifier.attach()
     return [
         Tool(
             name="capture_screen",
@@ -63,10 +136,34 @@ async def handle_list_tools() -> list[Tool]:
                     "capture_id": {
                         "type": "string",
                         "description": "Optional custom ID for the capture"
+                    },
+                    "tiled": {
+                        "type": "boolean",
+                        "description": "With monitor 0, grab each monitor in parallel as a separate tile "
+                                       "instead of one bounding box (annotations still use one coordinate space)",
+                        "default": False
                     }
                 }
             }
         ),
+        Tool(
+            name="set_capture_ttl",
+            description="Set how long a capture is kept before it is deleted automatically",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "capture_id": {
+                        "type": "string",
+                        "description": "ID of the capture"
+                    },
+                    "ttl_seconds": {
+                        "type": ["number", "null"],
+                        "description": "Seconds from now until the capture expires; null keeps it until deleted"
+                    }
+                },
+                "required": ["capture_id", "ttl_seconds"]
+            }
+        ),
         Tool(
             name="add_box_annotation",
             description="Add a box/rectangle annotation to a capture",
@@ -131,6 +228,143 @@ async def handle_list_tools() -> list[Tool]:
                 "required": ["capture_id", "x", "y", "text"]
             }
         ),
+        Tool(
+            name="derive_capture",
+            description="Create a new capture from a region of an existing one, without re-capturing. "
+                        "The new capture shares the original's pixels and has its own annotations.",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "capture_id": {
+                        "type": "string",
+                        "description": "ID of the capture to crop from"
+                    },
+                    "x": {"type": "integer", "description": "X position of the region's top-left corner"},
+                    "y": {"type": "integer", "description": "Y position of the region's top-left corner"},
+                    "width": {"type": "integer", "description": "Width of the region"},
+                    "height": {"type": "integer", "description": "Height of the region"},
+                    "new_capture_id": {
+                        "type": "string",
+                        "description": "Optional custom ID for the derived capture"
+                    }
+                },
+                "required": ["capture_id", "x", "y", "width", "height"]
+            }
+        ),
+        Tool(
+            name="query_annotations",
+            description="Find the annotations on a capture that cover a point or intersect a rectangle "
+                        "(give width and height for a rectangle, omit them for a point)",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "capture_id": {
+                        "type": "string",
+                        "description": "ID of the capture to search"
+                    },
+                    "x": {"type": "integer", "description": "X position of the point or rectangle"},
+                    "y": {"type": "integer", "description": "Y position of the point or rectangle"},
+                    "width": {"type": "integer", "description": "Optional rectangle width"},
+                    "height": {"type": "integer", "description": "Optional rectangle height"}
+                },
+                "required": ["capture_id", "x", "y"]
+            }
+        ),
+        Tool(
+            name="find_similar_captures",
+            description="Find earlier captures of the same screen: captures whose pixels look like the given "
+                        "capture's, nearest first, by perceptual hash distance (0 = identical)",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "capture_id": {
+                        "type": "string",
+                        "description": "ID of the capture to compare against"
+                    },
+                    "max_distance": {
+                        "type": "integer",
+                        "description": "Maximum Hamming distance between 64-bit hashes (default: 10)",
+                        "default": 10
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "Maximum number of matches to return (default: 10)",
+                        "default": 10
+                    }
+                },
+                "required": ["capture_id"]
+            }
+        ),
+        Tool(
+            name="diff_captures",
+            description="Compare two captures (e.g. before and after a code change) and create a new capture "
+                        "of the later one with a box around every region that changed",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "before_id": {
+                        "type": "string",
+                        "description": "ID of the earlier capture"
+                    },
+                    "after_id": {
+                        "type": "string",
+                        "description": "ID of the later capture"
+                    },
+                    "block_size": {
+                        "type": "integer",
+                        "description": "Size in pixels of the blocks compared (default: 8)",
+                        "default": 8
+                    },
+                    "threshold": {
+                        "type": "integer",
+                        "description": "Per-channel difference (0-255) a pixel must exceed to count as changed (default: 32)",
+                        "default": 32
+                    },
+                    "new_capture_id": {
+                        "type": "string",
+                        "description": "Optional custom ID for the diff capture"
+                    }
+                },
+                "required": ["before_id", "after_id"]
+            }
+        ),
+        Tool(
+            name="export_animation",
+            description="Export a sequence of captures, with annotations, as an animated GIF, APNG or WebP file "
+                        "(e.g. a repro animation for reviewers). Give capture IDs in order, or a time range.",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "capture_ids": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "IDs of the captures to use as frames, in order"
+                    },
+                    "since": {
+                        "type": "string",
+                        "description": "Use captures taken at or after this ISO 8601 time (if no IDs given)"
+                    },
+                    "until": {
+                        "type": "string",
+                        "description": "Use captures taken at or before this ISO 8601 time (if no IDs given)"
+                    },
+                    "format": {
+                        "type": "string",
+                        "enum": ["gif", "apng", "webp"],
+                        "default": "gif"
+                    },
+                    "duration": {
+                        "type": "integer",
+                        "description": "Milliseconds each frame is shown (default: 500)",
+                        "default": 500
+                    },
+                    "output_path": {
+                        "type": "string",
+                        "description": "File to write (default: a file in the system temp directory)"
+                    }
+                }
+            }
+        ),
         Tool(
             name="get_capture_image",
             description="Get the annotated image for attachment to chat context",
@@ -151,6 +385,34 @@ async def handle_list_tools() -> list[Tool]:
                 "required": ["capture_id"]
             }
         ),
+        Tool(
+            name="zoom_capture",
+            description="Get a close-up of part of a capture: the rectangle is rendered on its own, "
+                        "scaled up (or down) with its annotations, and returned as an image",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "capture_id": {
+                        "type": "string",
+                        "description": "ID of the capture"
+                    },
+                    "x": {"type": "integer", "description": "Left edge of the rectangle (default 0)"},
+                    "y": {"type": "integer", "description": "Top edge of the rectangle (default 0)"},
+                    "width": {"type": "integer", "description": "Width of the rectangle (default: to the right edge)"},
+                    "height": {"type": "integer", "description": "Height of the rectangle (default: to the bottom edge)"},
+                    "scale": {
+                        "type": "number",
+                        "description": f"Zoom factor, up to {MAX_RENDER_SCALE:g} (default: fit max_size)"
+                    },
+                    "max_size": {
+                        "type": "integer",
+                        "description": "Without scale, zoom so the longest side is this many pixels",
+                        "default": 800
+                    }
+                },
+                "required": ["capture_id"]
+            }
+        ),
         Tool(
             name="list_captures",
             description="List all captures in the current session",
@@ -206,25 +468,108 @@ async def handle_list_tools() -> list[Tool]:
     ]
 
 
+# Stages reported as MCP progress, per tool
+TOOL_STAGES = {
+    "capture_screen": {"grab": "Grabbing the screen", "store": "Storing the capture"},
+    "get_capture_image": {"render": "Rendering annotations", "encode": "Encoding PNG"},
+    "export_animation": {"encode": "Encoding frames"},
+}
+
+
+class _ToolCall:
+    """
+    Progress and cancellation for one MCP tool call.
+    
+    ``run`` does blocking work on a worker thread, so other tool calls
+    proceed meanwhile. The work reports its stages through ``progress``;
+    each new stage is sent to the client as a progress notification (if
+    the request carried a progress token), and once the call is cancelled
+    the next ``progress`` call raises OperationCancelled, so the abandoned
+    work stops instead of running to completion.
+    """
+    
+    def __init__(self, name: str):
+        self.stages = list(TOOL_STAGES.get(name, {}).items())
+        self._stage_names = [stage for stage, _ in self.stages]
+        self._started = 0
+        self._cancelled = threading.Event()
+        self._loop = asyncio.get_running_loop()
+        try:
+            context = mcp_server.request_context
+        except LookupError:
+            context = None
+        self._session = context.session if context is not None else None
+        self._token = getattr(context.meta, "progressToken", None) if context is not None and context.meta else None
+        self._request_id = str(context.request_id) if context is not None else None
+    
+    def progress(self, stage: str):
+        """Progress callback for the worker thread (see capture_manager.ProgressCallback)."""
+        if self._cancelled.is_set():
+            raise OperationCancelled(f"Cancelled during {stage}")
+        if stage in self._stage_names:
+            index = self._stage_names.index(stage)
+            if index >= self._started:
+                self._started = index + 1
+                asyncio.run_coroutine_threadsafe(self._notify(index, self.stages[index][1]), self._loop)
+    
+    async def _notify(self, completed: int, message: str):
+        if self._token is None or self._session is None:
+            return
+        try:
+            await self._session.send_progress_notification(
+                self._token, completed, total=len(self.stages), message=message,
+                related_request_id=self._request_id,
+            )
+        except Exception as e:
+            logger.debug(f"Progress notification failed: {e}")
+    
+    async def run(self, work, *args, **kwargs):
+        """Run ``work`` on a worker thread; cancelling the call stops it at its next progress check."""
+        try:
+            return await asyncio.to_thread(work, *args, **kwargs)
+        except asyncio.CancelledError:
+            self._cancelled.set()
+            raise
+    
+    async def finish(self):
+        if self.stages:
+            await self._notify(len(self.stages), "Done")
+
+
 @mcp_server.call_tool()
 async def handle_call_tool(name: str, arguments: dict) -> list[TextContent | ImageContent | EmbeddedResource]:
-    """Handle MCP tool calls."""
+    """
+    Handle MCP tool calls.
+    
+    Slow tools run on worker threads, so calls are handled concurrently;
+    see _ToolCall for their progress notifications and cancellation.
+    """
     
     try:
+        resource_notifier.attach()
+        capture_manager.sync()
+        call = _ToolCall(name)
         if name == "capture_screen":
             monitor = arguments.get("monitor", 0)
             region = arguments.get("region")
             capture_id = arguments.get("capture_id")
+            tiled = arguments.get("tiled", False)
             
-            capture = capture_manager.capture_screen(monitor, region, capture_id)
+            capture = await call.run(
+                capture_manager.capture_screen, monitor, region, capture_id, tiled=tiled, progress=call.progress
+            )
+            await call.finish()
+            tile_note = f"Tiles: {len(capture.tiles.tiles)} monitors\n" if capture.tiles is not None else ""
             
             return [TextContent(
                 type="text",
                 text=f"Screen captured successfully!\n\nCapture ID: {capture.id}\n"
-                     f"Dimensions: {capture.original_image.width}x{capture.original_image.height}\n"
-                     f"Timestamp: {capture.timestamp}\n\n"
+                     f"Dimensions: {capture.width}x{capture.height}\n"
+                     f"{tile_note}"
+                     f"Timestamp: {capture.timestamp}\n"
+                     f"Resource: {RESOURCE_PREFIX}{capture.id}\n\n"
                      f"Use 'add_box_annotation' or 'add_text_annotation' to annotate, "
-                     f"then 'get_capture_image' to view."
+                     f"then read the resource (or call 'get_capture_image') to view."
             )]
         
         elif name == "add_box_annotation":
@@ -276,6 +621,149 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent | Ima
                      f"Total annotations: {len(capture.annotations)}"
             )]
         
+        elif name == "derive_capture":
+            capture_id = arguments["capture_id"]
+            if not capture_manager.get_capture(capture_id):
+                return [TextContent(type="text", text=f"Error: Capture '{capture_id}' not found")]
+            
+            capture = capture_manager.derive_capture(
+                capture_id,
+                x=arguments["x"],
+                y=arguments["y"],
+                width=arguments["width"],
+                height=arguments["height"],
+                capture_id=arguments.get("new_capture_id")
+            )
+            
+            return [TextContent(
+                type="text",
+                text=f"Derived capture created from '{capture_id}'!\n\n"
+                     f"Capture ID: {capture.id}\n"
+                     f"Region: {capture.width}x{capture.height} at ({capture.region['x']}, {capture.region['y']})\n\n"
+                     f"Annotate it with 'add_box_annotation' or 'add_text_annotation'; "
+                     f"the original capture is unchanged."
+            )]
+        
+        elif name == "query_annotations":
+            capture_id = arguments["capture_id"]
+            capture = capture_manager.get_capture(capture_id)
+            
+            if not capture:
+                return [TextContent(type="text", text=f"Error: Capture '{capture_id}' not found")]
+            
+            x, y = int(arguments["x"]), int(arguments["y"])
+            width, height = int(arguments.get("width", 1)), int(arguments.get("height", 1))
+            annotations = capture.query_annotations((x, y, x + width, y + height))
+            
+            area = f"{width}x{height} at ({x}, {y})" if "width" in arguments else f"point ({x}, {y})"
+            if not annotations:
+                return [TextContent(type="text", text=f"No annotations on '{capture_id}' at {area}.")]
+            
+            result = f"**{len(annotations)} annotation(s) on '{capture_id}' at {area}:**\n\n"
+            for ann in annotations:
+                if ann["type"] == "text":
+                    result += f"- #{ann['index']} text '{ann['text']}' at ({ann['x']}, {ann['y']})\n"
+                else:
+                    label = f" '{ann['label']}'" if ann["label"] else ""
+                    result += (f"- #{ann['index']} box{label} {ann['width']}x{ann['height']} "
+                               f"at ({ann['x']}, {ann['y']})\n")
+            
+            return [TextContent(type="text", text=result)]
+        
+        elif name == "find_similar_captures":
+            capture_id = arguments["capture_id"]
+            if not capture_manager.get_capture(capture_id):
+                return [TextContent(type="text", text=f"Error: Capture '{capture_id}' not found")]
+            
+            matches = capture_manager.find_similar_captures(
+                capture_id,
+                max_distance=arguments.get("max_distance", 10),
+                limit=arguments.get("limit", 10)
+            )
+            
+            if not matches:
+                return [TextContent(type="text", text=f"No captures similar to '{capture_id}' found.")]
+            
+            result = f"**Captures similar to '{capture_id}':**\n\n"
+            for match in matches:
+                result += (f"- **{match['id']}** (distance {match['distance']}) - "
+                           f"{match['width']}x{match['height']}, {match['timestamp']}\n")
+            
+            return [TextContent(type="text", text=result)]
+        
+        elif name == "diff_captures":
+            before_id, after_id = arguments["before_id"], arguments["after_id"]
+            for capture_id in (before_id, after_id):
+                if not capture_manager.get_capture(capture_id):
+                    return [TextContent(type="text", text=f"Error: Capture '{capture_id}' not found")]
+            
+            capture, regions = await call.run(
+                capture_manager.diff_captures,
+                before_id,
+                after_id,
+                block_size=arguments.get("block_size", 8),
+                threshold=arguments.get("threshold", 32),
+                capture_id=arguments.get("new_capture_id")
+            )
+            
+            if not regions:
+                summary = "No changes found."
+            else:
+                summary = f"{len(regions)} changed region(s):\n" + "".join(
+                    f"- {right - left}x{bottom - top} at ({left}, {top})\n"
+                    for left, top, right, bottom in regions
+                )
+            
+            return [TextContent(
+                type="text",
+                text=f"Compared '{before_id}' with '{after_id}'.\n\n"
+                     f"{summary}\n"
+                     f"Diff capture ID: {capture.id} (use 'get_capture_image' to view it)"
+            )]
+        
+        elif name == "export_animation":
+            capture_ids = arguments.get("capture_ids")
+            if not capture_ids:
+                capture_ids = [c.id for c in capture_manager.captures_between(
+                    arguments.get("since"), arguments.get("until")
+                )]
+            format_name = arguments.get("format", "gif")
+            
+            try:
+                chunks = capture_manager.export_animation(
+                    capture_ids, format_name, duration=arguments.get("duration", 500)
+                )
+            except (KeyError, ValueError) as e:
+                return [TextContent(type="text", text=f"Error: {e.args[0]}")]
+            
+            output_path = arguments.get("output_path") or os.path.join(
+                tempfile.gettempdir(), f"grabitar_{capture_ids[0]}_{capture_ids[-1]}.{format_name}"
+            )
+            
+            def write_file() -> int:
+                written = 0
+                try:
+                    with open(output_path, "wb") as f:
+                        for chunk in chunks:
+                            call.progress("encode")
+                            f.write(chunk)
+                            written += len(chunk)
+                except OperationCancelled:
+                    os.remove(output_path)
+                    raise
+                return written
+            
+            size = await call.run(write_file)
+            await call.finish()
+            
+            return [TextContent(
+                type="text",
+                text=f"Animation exported!\n\n"
+                     f"File: {output_path}\n"
+                     f"Frames: {len(capture_ids)} ({', '.join(capture_ids)})\n"
+                     f"Size: {size / 1024:.1f} KB"
+            )]
+        
         elif name == "get_capture_image":
             capture_id = arguments["capture_id"]
             capture = capture_manager.get_capture(capture_id)
@@ -285,13 +773,42 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent | Ima
             
             format_type = arguments.get("format", "markdown")
             
+            def encode() -> str:
+                png = capture.to_bytes(progress=call.progress)
+                return "data:image/png;base64," + base64.b64encode(png).decode("utf-8")
+            
+            base64_uri = await call.run(encode)
+            await call.finish()
+            
             if format_type == "markdown":
-                markdown = capture.to_markdown()
-                return [TextContent(type="text", text=markdown)]
+                return [TextContent(type="text", text=f"![Capture {capture.id}]({base64_uri})")]
             else:
-                base64_uri = capture.to_base64()
                 return [TextContent(type="text", text=base64_uri)]
         
+        elif name == "zoom_capture":
+            capture_id = arguments["capture_id"]
+            capture = capture_manager.get_capture(capture_id)
+            
+            if not capture:
+                return [TextContent(type="text", text=f"Error: Capture '{capture_id}' not found")]
+            
+            x, y = arguments.get("x", 0), arguments.get("y", 0)
+            width = arguments.get("width", capture.width - x)
+            height = arguments.get("height", capture.height - y)
+            # Report the part of the region that lies inside the capture
+            width = min(x + width, capture.width) - max(0, x)
+            height = min(y + height, capture.height) - max(0, y)
+            x, y = max(0, x), max(0, y)
+            scale = arguments.get("scale")
+            if scale is None:
+                scale = min(MAX_RENDER_SCALE, arguments.get("max_size", 800) / max(1, width, height))
+            
+            png = await call.run(capture.region_to_bytes, (x, y, x + width, y + height), scale)
+            return [
+                TextContent(type="text", text=f"'{capture_id}' at ({x}, {y}), {width}x{height}, zoomed {scale:.2f}x"),
+                ImageContent(type="image", data=base64.b64encode(png).decode("utf-8"), mimeType="image/png"),
+            ]
+        
         elif name == "list_captures":
             captures = capture_manager.list_captures()
             
@@ -320,6 +837,16 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent | Ima
             capture_manager.clear_all()
             return [TextContent(type="text", text="All captures cleared successfully.")]
         
+        elif name == "set_capture_ttl":
+            capture_id = arguments["capture_id"]
+            capture = capture_manager.set_capture_ttl(capture_id, arguments.get("ttl_seconds"))
+            
+            if not capture:
+                return [TextContent(type="text", text=f"Error: Capture '{capture_id}' not found")]
+            
+            expires = capture.get_metadata()["expires_at"] or "never (kept until deleted)"
+            return [TextContent(type="text", text=f"Capture '{capture_id}' expires: {expires}")]
+        
         elif name == "get_bookmarklet":
             server_url = arguments.get("server_url", "http://localhost:8080")
             bookmarklet_code = f"javascript:(function(){{var s=document.createElement('script');s.src='{server_url}/static/grabitar-inject.js';document.head.appendChild(s);}})()"
@@ -331,7 +858,7 @@ To use Grabitar on any webpage:
 **Method 1: Bookmarklet (Recommended)**
 1. Drag this link to your bookmarks bar: 
    [📸 Grabitar]({bookmarklet_code})
-   
+
 2. Or create a bookmark with this code:
    ```
    {bookmarklet_code}
@@ -426,9 +953,202 @@ Once overlay is loaded:
         return [TextContent(type="text", text=f"Error: {str(e)}")]
 
 
+# ========== MCP RESOURCES ==========
+
+# grabitar://captures/<id>            annotated image (PNG)
+# grabitar://captures/<id>/thumbnail  annotated image scaled down (PNG)
+# grabitar://captures/<id>/metadata   get_metadata() as JSON
+RESOURCE_PREFIX = "grabitar://captures/"
+_RESOURCE_URI = re.compile(r"grabitar://captures/([^/]+)(?:/(thumbnail|metadata))?")
+
+
+def capture_resource_uris(capture_id: str) -> list[str]:
+    base = RESOURCE_PREFIX + capture_id
+    return [base, f"{base}/thumbnail", f"{base}/metadata"]
+
+
+class _ResourceNotifier:
+    """
+    Tells MCP sessions about capture resource changes.
+    
+    Captures coming and going send ``resources/list_changed``; annotating a
+    capture sends ``resources/updated`` for each of its URIs the session
+    subscribed to. Sessions are remembered as they make requests.
+    ``publish`` is a capture listener and may be called from any thread.
+    """
+    
+    def __init__(self):
+        # session -> subscribed URIs
+        self._sessions: "weakref.WeakKeyDictionary[object, set]" = weakref.WeakKeyDictionary()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks = set()
+    
+    def attach(self) -> set:
+        """Remember the session of the current request; returns its subscriptions."""
+        self._loop = asyncio.get_running_loop()
+        session = mcp_server.request_context.session
+        subscriptions = self._sessions.get(session)
+        if subscriptions is None:
+            subscriptions = self._sessions[session] = set()
+        return subscriptions
+    
+    def publish(self, event: dict):
+        loop = self._loop
+        if loop is None or not self._sessions:
+            return
+        try:
+            loop.call_soon_threadsafe(self._dispatch, event)
+        except RuntimeError:
+            pass  # Loop closed: the MCP server has stopped
+    
+    def _dispatch(self, event: dict):
+        uris = set(capture_resource_uris(event["id"])) if "id" in event else set()
+        for session, subscriptions in list(self._sessions.items()):
+            if event["type"] in ("created", "deleted", "cleared"):
+                self._send(session.send_resource_list_changed())
+            if event["type"] == "updated":
+                for uri in sorted(uris & subscriptions):
+                    self._send(session.send_resource_updated(AnyUrl(uri)))
+            elif event["type"] == "deleted":
+                subscriptions -= uris
+            elif event["type"] == "cleared":
+                subscriptions.clear()
+    
+    def _send(self, notification):
+        async def send():
+            try:
+                await notification
+            except Exception as e:
+                logger.debug(f"Resource notification failed: {e}")
+        
+        task = asyncio.ensure_future(send())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+resource_notifier = _ResourceNotifier()
+capture_manager.listeners.append(resource_notifier.publish)
+
+
+def _resource_capture(uri) -> tuple:
+    """(capture, kind) for a resource URI; kind is None, "thumbnail" or "metadata"."""
+    match = _RESOURCE_URI.fullmatch(str(uri))
+    if not match:
+        raise ValueError(f"Unknown resource '{uri}'")
+    capture = capture_manager.get_capture(match.group(1))
+    if capture is None:
+        raise ValueError(f"Capture '{match.group(1)}' not found")
+    return capture, match.group(2)
+
+
+@mcp_server.list_resources()
+async def handle_list_resources() -> list[Resource]:
+    """One resource per capture, its annotated image; see the templates for the others."""
+    resource_notifier.attach()
+    capture_manager.sync()
+    return [
+        Resource(
+            uri=RESOURCE_PREFIX + capture.id,
+            name=capture.id,
+            description=f"{capture.width}x{capture.height} capture from {capture.timestamp}",
+            mimeType="image/png",
+        )
+        for capture in capture_manager.all_captures()
+    ]
+
+
+@mcp_server.list_resource_templates()
+async def handle_list_resource_templates() -> list[ResourceTemplate]:
+    return [
+        ResourceTemplate(uriTemplate=RESOURCE_PREFIX + "{id}", name="capture",
+                         description="Annotated capture image", mimeType="image/png"),
+        ResourceTemplate(uriTemplate=RESOURCE_PREFIX + "{id}/thumbnail", name="capture-thumbnail",
+                         description=f"Annotated capture scaled to fit {THUMBNAIL_SIZE}px", mimeType="image/png"),
+        ResourceTemplate(uriTemplate=RESOURCE_PREFIX + "{id}/metadata", name="capture-metadata",
+                         description="Capture metadata and annotations", mimeType="application/json"),
+    ]
+
+
+@mcp_server.read_resource()
+async def handle_read_resource(uri: AnyUrl) -> list[ReadResourceContents]:
+    resource_notifier.attach()
+    capture_manager.sync()
+    capture, kind = _resource_capture(uri)
+    if kind == "metadata":
+        return [ReadResourceContents(content=json.dumps(capture.get_metadata()), mime_type="application/json")]
+    render = capture.to_thumbnail_bytes if kind == "thumbnail" else capture.to_bytes
+    return [ReadResourceContents(content=await asyncio.to_thread(render), mime_type="image/png")]
+
+
+@mcp_server.subscribe_resource()
+async def handle_subscribe_resource(uri: AnyUrl):
+    _resource_capture(uri)
+    resource_notifier.attach().add(str(uri))
+
+
+@mcp_server.unsubscribe_resource()
+async def handle_unsubscribe_resource(uri: AnyUrl):
+    resource_notifier.attach().discard(str(uri))
+
+
 # ========== FASTAPI WEB UI ==========
 
-app = FastAPI(title="Grabitar", description="Screen Capture with Annotations")
+async def _sync_store_periodically():
+    """Pick up other workers' changes, so event streams hear about them too."""
+    while True:
+        await asyncio.sleep(STORE_SYNC_SECONDS)
+        try:
+            capture_manager.sync()
+        except Exception as e:
+            logger.error(f"Capture store sync failed: {e}", exc_info=True)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tasks = [asyncio.create_task(_sweep_expired_periodically())]
+    if capture_manager.shared:
+        tasks.append(asyncio.create_task(_sync_store_periodically()))
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+class StoreSyncMiddleware:
+    """Bring this worker up to date with the shared store before each request."""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] in ("http", "websocket"):
+            capture_manager.sync()
+        await self.app(scope, receive, send)
+
+
+app = FastAPI(title="Grabitar", description="Screen Capture with Annotations", lifespan=lifespan)
+
+if capture_manager.shared:
+    # Innermost, so requests turned away by admission control skip the sync
+    app.add_middleware(StoreSyncMiddleware)
+
+# Upload admission (see admission.py for the 413/429 contract). Added
+# before CORS so rejections still carry CORS headers the page can read.
+MAX_UPLOAD_BYTES = int(float(os.environ.get("GRABITAR_MAX_UPLOAD_MB", "64")) * 1024 * 1024)
+upload_limiter = RateLimiter(
+    rate=float(os.environ.get("GRABITAR_UPLOAD_RATE", "2")),
+    burst=float(os.environ.get("GRABITAR_UPLOAD_BURST", "10")),
+)
+decode_limiter = DecodeLimiter(int(os.environ.get("GRABITAR_DECODE_SLOTS", min(4, os.cpu_count() or 1))))
+app.add_middleware(
+    AdmissionMiddleware,
+    limiter=upload_limiter,
+    rate_limited_paths=["/api/capture", "/api/frames", "/api/import"],
+    max_body_bytes=MAX_UPLOAD_BYTES,
+    # Archives are streamed to the importer and may be much larger
+    unlimited_paths=["/api/import"],
+)
 
 # Enable CORS so the injected script can work from any origin
 app.add_middleware(
@@ -439,17 +1159,40 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount static files directory
-static_dir = os.path.join(os.path.dirname(__file__), "static")
-if os.path.exists(static_dir):
-    app.mount("/static", StaticFiles(directory=static_dir), name="static")
+# Compress JSON, HTML and other text responses for clients that accept it
+app.add_middleware(CompressionMiddleware)
+
+# Static files are loaded, fingerprinted and precompressed once, at startup
+static_assets = StaticAssets(os.path.join(os.path.dirname(__file__), "static"))
 
 # Pydantic models for API
 class CaptureRequest(BaseModel):
     monitor: int = 0
     region: Optional[dict] = None
+    tiled: bool = False  # Grab monitors as separate tiles (monitor 0 only)
     imageData: Optional[str] = None  # Base64 data URL from browser capture
 
+class FrameRequest(BaseModel):
+    shm: str  # Name of a shared-memory segment holding BGRX pixels
+    width: int
+    height: int
+    monitor: int = 0
+    region: Optional[dict] = None
+
+class DeriveCaptureRequest(BaseModel):
+    x: int
+    y: int
+    width: int
+    height: int
+    capture_id: Optional[str] = None
+
+class DiffCapturesRequest(BaseModel):
+    before_id: str
+    after_id: str
+    block_size: int = 8
+    threshold: int = 32
+    capture_id: Optional[str] = None
+
 class BoxAnnotationRequest(BaseModel):
     x: int
     y: int
@@ -467,19 +1210,29 @@ class TextAnnotationRequest(BaseModel):
     color: str = "red"
     background: Optional[str] = "white"
 
+class CaptureTTLRequest(BaseModel):
+    ttl_seconds: Optional[float] = None  # None keeps the capture until deleted
+
 
 @app.get("/", response_class=HTMLResponse)
-async def serve_ui():
+async def serve_ui(request: Request):
     """Serve the main web UI."""
-    try:
-        static_path = os.path.join(os.path.dirname(__file__), "static", "index.html")
-        with open(static_path, "r") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
+    response = static_assets.response(request, "index.html")
+    if response is None:
         return HTMLResponse(
             content="<h1>Grabitar</h1><p>UI not found. Please ensure static files exist.</p>",
             status_code=503
         )
+    return response
+
+
+@app.get("/static/{name:path}")
+async def serve_static(name: str, request: Request):
+    """Serve a static asset by plain or fingerprinted name."""
+    response = static_assets.response(request, name)
+    if response is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return response
 
 
 @app.get("/api/captures")
@@ -488,28 +1241,150 @@ async def list_captures_api():
     return JSONResponse(content=capture_manager.list_captures())
 
 
+@app.get("/api/captures/{capture_id}")
+async def get_capture_api(capture_id: str):
+    """Get one capture's metadata."""
+    capture = capture_manager.get_capture(capture_id)
+    if not capture:
+        raise HTTPException(status_code=404, detail="Capture not found")
+    
+    return JSONResponse(content=capture.get_metadata())
+
+
+@app.get("/api/stats")
+async def get_stats_api():
+    """Capture store metrics, including deduplication savings and expiry sweeps."""
+    return JSONResponse(content={**capture_manager.get_stats(), "expiry": sweep_stats})
+
+
+# Capture requests at least this large carry image data; they are parsed,
+# like the image itself is decoded, on a worker thread under a decode slot
+INLINE_CAPTURE_BODY_BYTES = 64 * 1024
+
+
+def _capture_from_body(body: bytes) -> Capture:
+    """Parse a /api/capture body and create the capture it asks for."""
+    request = CaptureRequest.model_validate_json(body)
+    # Log for debugging
+    logger.info(f"Capture request: monitor={request.monitor}, region={request.region}, has_imageData={bool(request.imageData)}")
+    
+    # If browser-captured image data is provided, use it
+    if request.imageData:
+        logger.info(f"Using browser-captured imageData (size: {len(request.imageData)} chars)")
+        return capture_manager.create_capture_from_data(request.imageData)
+    
+    # Fall back to OS-level screen capture
+    logger.info("Falling back to OS-level screen capture")
+    return capture_manager.capture_screen(request.monitor, request.region, tiled=request.tiled)
+
+
 @app.post("/api/capture")
-async def capture_screen_api(request: CaptureRequest):
-    """Capture screen."""
+async def capture_screen_api(request: Request):
+    """
+    Capture screen, or create a capture from browser ``imageData`` (see
+    CaptureRequest). The body is parsed off the event loop, so a large
+    upload does not hold up other clients.
+    """
+    body = await request.body()
     try:
-        # Log for debugging
-        logger.info(f"Capture request: monitor={request.monitor}, region={request.region}, has_imageData={bool(request.imageData)}")
-        
-        # If browser-captured image data is provided, use it
-        if request.imageData:
-            logger.info(f"Using browser-captured imageData (size: {len(request.imageData)} chars)")
-            capture = capture_manager.create_capture_from_data(request.imageData)
+        if len(body) >= INLINE_CAPTURE_BODY_BYTES:
+            # Parse and decode a bounded number at a time
+            async with decode_limiter.slot():
+                capture = await asyncio.to_thread(_capture_from_body, body)
         else:
-            # Fall back to OS-level screen capture
-            logger.info("Falling back to OS-level screen capture")
-            capture = capture_manager.capture_screen(request.monitor, request.region)
+            capture = await asyncio.to_thread(_capture_from_body, body)
         
         return JSONResponse(content=capture.get_metadata())
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=json.loads(e.json()))
+    except RateLimited as e:
+        raise HTTPException(status_code=429, detail=str(e), headers=retry_after_header(e.retry_after))
     except Exception as e:
         logger.error(f"Capture error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _open_shared_frame(name: str) -> shared_memory.SharedMemory:
+    """Attach to a client's frame segment without taking over its cleanup."""
+    segment = shared_memory.SharedMemory(name=name)
+    if os.name == "posix":
+        # Attaching registers the segment with this process's resource
+        # tracker, which would unlink it when we exit; the client owns it
+        resource_tracker.unregister(segment._name, "shared_memory")
+    return segment
+
+
+@app.post("/api/frames")
+async def create_capture_from_frame_api(request: Request, frame: FrameRequest):
+    """
+    Create a capture from raw pixels a local client left in shared memory.
+    
+    Only served on the Unix domain socket: the pixels are read in place,
+    and the segment belongs to the client, which may reuse it once this
+    returns.
+    """
+    server = request.scope.get("server")
+    if server is None or server[1] is not None:
+        raise HTTPException(status_code=403, detail="Frames are only accepted on the local socket")
+    
+    try:
+        segment = _open_shared_frame(frame.shm)
+    except (FileNotFoundError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Cannot open shared memory '{frame.shm}': {e}")
+    
+    try:
+        capture = await asyncio.to_thread(
+            capture_manager.create_capture_from_raw,
+            segment.buf, (frame.width, frame.height), frame.monitor, frame.region
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        segment.close()
+    
+    return JSONResponse(content=capture.get_metadata())
+
+
+@app.post("/api/captures/{capture_id}/derive")
+async def derive_capture_api(capture_id: str, request: DeriveCaptureRequest):
+    """Create a capture that is a crop view of an existing capture."""
+    if not capture_manager.get_capture(capture_id):
+        raise HTTPException(status_code=404, detail="Capture not found")
+    
+    try:
+        capture = capture_manager.derive_capture(
+            capture_id, request.x, request.y, request.width, request.height,
+            capture_id=request.capture_id
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return JSONResponse(content=capture.get_metadata())
+
+
+@app.post("/api/captures/diff")
+async def diff_captures_api(request: DiffCapturesRequest):
+    """Compare two captures; returns a new capture with the changed regions boxed."""
+    try:
+        capture, regions = await asyncio.to_thread(
+            capture_manager.diff_captures,
+            request.before_id, request.after_id, request.block_size, request.threshold,
+            capture_id=request.capture_id
+        )
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return JSONResponse(content={
+        "capture": capture.get_metadata(),
+        "regions": [
+            {"x": left, "y": top, "width": right - left, "height": bottom - top}
+            for left, top, right, bottom in regions
+        ]
+    })
+
+
 @app.post("/api/captures/{capture_id}/annotations/box")
 async def add_box_annotation_api(capture_id: str, annotation: BoxAnnotationRequest):
     """Add box annotation."""
@@ -517,7 +1392,10 @@ async def add_box_annotation_api(capture_id: str, annotation: BoxAnnotationReque
     if not capture:
         raise HTTPException(status_code=404, detail="Capture not found")
     
-    capture.add_box_annotation(**annotation.model_dump())
+    try:
+        capture.add_box_annotation(**annotation.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     return JSONResponse(content={"success": True, "annotation_count": len(capture.annotations)})
 
@@ -529,23 +1407,440 @@ async def add_text_annotation_api(capture_id: str, annotation: TextAnnotationReq
     if not capture:
         raise HTTPException(status_code=404, detail="Capture not found")
     
-    capture.add_text_annotation(**annotation.model_dump())
+    try:
+        capture.add_text_annotation(**annotation.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     return JSONResponse(content={"success": True, "annotation_count": len(capture.annotations)})
 
 
-@app.get("/api/captures/{capture_id}/image")
-async def get_capture_image_api(capture_id: str, format: str = "png"):
-    """Get capture image."""
+@app.delete("/api/captures/{capture_id}/annotations")
+async def clear_annotations_api(capture_id: str):
+    """Remove all annotations from a capture."""
+    capture = capture_manager.get_capture(capture_id)
+    if not capture:
+        raise HTTPException(status_code=404, detail="Capture not found")
+    
+    capture.clear_annotations()
+    
+    return JSONResponse(content={"success": True, "annotation_count": 0})
+
+
+@app.put("/api/captures/{capture_id}/ttl")
+async def set_capture_ttl_api(capture_id: str, request: CaptureTTLRequest):
+    """Expire a capture ``ttl_seconds`` from now, or never with null."""
+    try:
+        capture = capture_manager.set_capture_ttl(capture_id, request.ttl_seconds)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not capture:
+        raise HTTPException(status_code=404, detail="Capture not found")
+    
+    return JSONResponse(content={"id": capture.id, "expires_at": capture.get_metadata()["expires_at"]})
+
+
+@app.get("/api/captures/{capture_id}/similar")
+async def find_similar_captures_api(capture_id: str, max_distance: int = 10, limit: int = 10):
+    """Get captures that look like this one, nearest first."""
+    try:
+        matches = capture_manager.find_similar_captures(capture_id, max_distance, limit)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Capture not found")
+    
+    return JSONResponse(content={"capture_id": capture_id, "matches": matches})
+
+
+def _parse_ints(value: str, count: int, name: str) -> tuple:
+    """Parse a comma-separated list of ``count`` integers from a query parameter."""
+    try:
+        numbers = tuple(int(part) for part in value.split(","))
+    except ValueError:
+        numbers = ()
+    if len(numbers) != count:
+        raise HTTPException(status_code=400, detail=f"'{name}' must be {count} comma-separated integers")
+    return numbers
+
+
+@app.get("/api/captures/{capture_id}/annotations")
+async def query_annotations_api(capture_id: str, bbox: Optional[str] = None, point: Optional[str] = None):
+    """
+    Get the annotations intersecting a rectangle (``bbox=x,y,width,height``)
+    or covering a point (``point=x,y``); all annotations if neither is given.
+    """
     capture = capture_manager.get_capture(capture_id)
     if not capture:
         raise HTTPException(status_code=404, detail="Capture not found")
     
-    if format == "base64":
-        return JSONResponse(content={"image": capture.to_base64()})
+    if bbox is not None:
+        x, y, width, height = _parse_ints(bbox, 4, "bbox")
+        box = (x, y, x + width, y + height)
+    elif point is not None:
+        x, y = _parse_ints(point, 2, "point")
+        box = (x, y, x + 1, y + 1)
     else:
-        image_bytes = capture.to_bytes()
+        box = (-2 ** 31, -2 ** 31, 2 ** 31 - 1, 2 ** 31 - 1)
+    
+    annotations = capture.query_annotations(box)
+    return JSONResponse(content={
+        "capture_id": capture_id,
+        "count": len(annotations),
+        "annotations": annotations
+    })
+
+
+# Encoded chunks buffered between the encoder thread and the client
+STREAM_QUEUE_DEPTH = 8
+
+
+class _StreamCancelled(Exception):
+    """Raised inside the encoder thread once the client has gone away."""
+
+
+async def _stream_png(capture):
+    """Stream a capture's PNG as the encoder produces it on a worker thread."""
+    async for chunk in _stream_from_worker(capture.encode_png):
+        yield chunk
+
+
+async def _stream_from_worker(produce):
+    """
+    Run ``produce(sink)`` on a worker thread, streaming each chunk it passes
+    to ``sink``. At most STREAM_QUEUE_DEPTH chunks are buffered, so a slow
+    client throttles the producer instead of letting output pile up.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=STREAM_QUEUE_DEPTH)
+    cancelled = threading.Event()
+    
+    def sink(chunk: bytes):
+        if cancelled.is_set():
+            raise _StreamCancelled()
+        asyncio.run_coroutine_threadsafe(queue.put(chunk), loop).result()
+    
+    def work():
+        try:
+            produce(sink)
+        except _StreamCancelled:
+            pass
+        finally:
+            asyncio.run_coroutine_threadsafe(queue.put(None), loop).result()
+    
+    worker = loop.run_in_executor(None, work)
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                break
+            yield chunk
+        await worker
+    finally:
+        # Unblock and stop the encoder if the client disconnected early
+        cancelled.set()
+        while not queue.empty():
+            queue.get_nowait()
+
+
+def _parse_range(range_header: str, size: int) -> Optional[tuple]:
+    """Parse a single ``bytes=start-end`` range; None if unsatisfiable."""
+    unit, _, spec = range_header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    start_str, _, end_str = spec.strip().partition("-")
+    try:
+        if start_str:
+            start = int(start_str)
+            end = int(end_str) if end_str else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start = max(0, size - int(end_str))
+            end = size - 1
+    except ValueError:
+        return None
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        return None
+    return start, end
+
+
+@app.get("/api/captures/{capture_id}/image")
+async def get_capture_image_api(capture_id: str, request: Request, format: str = "png",
+                                crop: Optional[str] = None, scale: float = 1.0,
+                                max_size: Optional[int] = None):
+    """
+    Get capture image. ``crop=x,y,width,height`` renders only that rectangle
+    and ``scale`` resizes the result; annotations are clipped and scaled to
+    match. ``max_size`` caps the result's longer side at that many pixels,
+    for previews: alone it scales the image down to fit, and with an
+    explicit ``scale`` it wins whenever that scale would exceed it.
+    """
+    capture = capture_manager.get_capture(capture_id)
+    if not capture:
+        raise HTTPException(status_code=404, detail="Capture not found")
+    
+    if crop is not None or scale != 1.0 or max_size is not None:
+        if crop is not None:
+            x, y, width, height = _parse_ints(crop, 4, "crop")
+            box = (x, y, x + width, y + height)
+        else:
+            box = (0, 0, capture.width, capture.height)
+        if max_size is not None:
+            if max_size < 1:
+                raise HTTPException(status_code=400, detail="max_size must be at least 1")
+            longest = max(min(box[2], capture.width) - max(box[0], 0), min(box[3], capture.height) - max(box[1], 0))
+            scale = min(scale, max_size / max(1, longest))
+        try:
+            image_bytes = await asyncio.to_thread(capture.region_to_bytes, box, scale)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except KeyError:
+            # Deleted while rendering
+            raise HTTPException(status_code=404, detail="Capture not found")
+        if format == "base64":
+            return JSONResponse(content={"image": "data:image/png;base64," + base64.b64encode(image_bytes).decode("utf-8")})
         return Response(content=image_bytes, media_type="image/png")
+    
+    try:
+        if format == "base64":
+            image_base64 = await asyncio.to_thread(capture.to_base64)
+            return JSONResponse(content={"image": image_base64})
+        
+        range_header = request.headers.get("range")
+        image_bytes = capture.get_cached_png()
+        if image_bytes is None and range_header:
+            # A range needs the full length up front, so finish the encode first
+            image_bytes = await asyncio.to_thread(capture.to_bytes)
+    except KeyError:
+        # Deleted while rendering
+        raise HTTPException(status_code=404, detail="Capture not found")
+    
+    if image_bytes is None:
+        return StreamingResponse(_stream_png(capture), media_type="image/png")
+    
+    headers = {"Accept-Ranges": "bytes"}
+    if range_header:
+        byte_range = _parse_range(range_header, len(image_bytes))
+        if byte_range is None:
+            return Response(
+                status_code=416,
+                headers={"Content-Range": f"bytes */{len(image_bytes)}"}
+            )
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{len(image_bytes)}"
+        return Response(
+            content=image_bytes[start:end + 1],
+            status_code=206,
+            media_type="image/png",
+            headers=headers
+        )
+    
+    return Response(content=image_bytes, media_type="image/png", headers=headers)
+
+
+def _select_capture_ids(ids: Optional[str], since: Optional[str], until: Optional[str]) -> list:
+    """Capture IDs from an ``ids`` list, else from a time range (default: all captures)."""
+    if ids:
+        return [capture_id for capture_id in ids.split(",") if capture_id]
+    try:
+        return [c.id for c in capture_manager.captures_between(since, until)]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/api/animation")
+async def export_animation_api(ids: Optional[str] = None, since: Optional[str] = None,
+                               until: Optional[str] = None, format: str = "gif", duration: int = 500,
+                               loop: int = 0, reuse_palette: bool = True, crop_deltas: bool = True,
+                               quality: Optional[int] = None):
+    """
+    Stream captures as an animated GIF, APNG or WebP. Frames are the
+    comma-separated ``ids`` in order, or the captures between ``since``
+    and ``until`` (ISO 8601).
+    """
+    capture_ids = _select_capture_ids(ids, since, until)
+    
+    try:
+        chunks = capture_manager.export_animation(
+            capture_ids, format, duration, loop, reuse_palette, crop_deltas, quality
+        )
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    format = format.lower()
+    return StreamingResponse(
+        chunks,
+        media_type=ANIMATION_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="grabitar.{format}"'}
+    )
+
+
+@app.get("/api/export")
+async def export_captures_api(ids: Optional[str] = None, since: Optional[str] = None,
+                              until: Optional[str] = None):
+    """
+    Stream captures as a tar archive: a manifest of their metadata, then the
+    original and rendered PNG of each. Selects the comma-separated ``ids``,
+    or the captures between ``since`` and ``until``; all by default.
+    """
+    capture_ids = _select_capture_ids(ids, since, until)
+    missing = [capture_id for capture_id in capture_ids if not capture_manager.get_capture(capture_id)]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Capture '{missing[0]}' not found")
+    
+    return StreamingResponse(
+        _stream_from_worker(lambda sink: capture_manager.export_archive(capture_ids, sink)),
+        media_type="application/x-tar",
+        headers={"Content-Disposition": 'attachment; filename="grabitar-captures.tar"'}
+    )
+
+
+class _QueueReader(io.RawIOBase):
+    """Readable stream over chunks put on a queue, ending at a None chunk."""
+    
+    def __init__(self, chunks: queue.Queue):
+        self._chunks = chunks
+        self._buffer = memoryview(b"")
+        self._done = False
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, b) -> int:
+        while not self._buffer and not self._done:
+            chunk = self._chunks.get()
+            if chunk is None:
+                self._done = True
+            else:
+                self._buffer = memoryview(chunk)
+        count = min(len(b), len(self._buffer))
+        b[:count] = self._buffer[:count]
+        self._buffer = self._buffer[count:]
+        return count
+
+
+@app.post("/api/import")
+async def import_captures_api(request: Request):
+    """
+    Import a tar archive made by ``/api/export`` from the request body.
+    
+    The body is read and decoded incrementally on a worker thread; at most
+    STREAM_QUEUE_DEPTH chunks of it are buffered at a time.
+    """
+    chunks: queue.Queue = queue.Queue(maxsize=STREAM_QUEUE_DEPTH)
+    reader = io.BufferedReader(_QueueReader(chunks))
+    finished = threading.Event()
+    
+    def run_import():
+        try:
+            return capture_manager.import_archive(reader)
+        finally:
+            finished.set()
+    
+    def feed(chunk) -> bool:
+        # Stop feeding once the import has finished (or failed) early
+        while not finished.is_set():
+            try:
+                chunks.put(chunk, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    worker = asyncio.ensure_future(asyncio.to_thread(run_import))
+    try:
+        async for chunk in request.stream():
+            if chunk and not await asyncio.to_thread(feed, chunk):
+                break
+    finally:
+        await asyncio.to_thread(feed, None)
+    
+    try:
+        imported = await worker
+    except (ValueError, tarfile.TarError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid capture archive: {e}")
+    
+    return JSONResponse(content={"imported": len(imported), "captures": imported})
+
+
+# Events buffered per subscriber; a subscriber that falls further behind
+# than this misses events (and is told to resync)
+EVENT_QUEUE_DEPTH = 256
+# Comment lines sent on an idle event stream so proxies keep it open
+EVENT_KEEPALIVE_SECONDS = 15
+
+
+class _EventBroadcaster:
+    """
+    Fans capture events out to async subscribers.
+    
+    ``publish`` may be called from any thread; events are handed to each
+    subscriber's event loop.
+    """
+    
+    def __init__(self):
+        self._subscribers: dict = {}
+        self._lock = threading.Lock()
+    
+    def subscribe(self) -> asyncio.Queue:
+        events: asyncio.Queue = asyncio.Queue(maxsize=EVENT_QUEUE_DEPTH)
+        with self._lock:
+            self._subscribers[events] = asyncio.get_running_loop()
+        return events
+    
+    def unsubscribe(self, events: asyncio.Queue):
+        with self._lock:
+            self._subscribers.pop(events, None)
+    
+    def publish(self, event: dict):
+        with self._lock:
+            subscribers = list(self._subscribers.items())
+        for events, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, events, event)
+            except RuntimeError:
+                # The subscriber's loop has closed
+                self.unsubscribe(events)
+    
+    @staticmethod
+    def _deliver(events: asyncio.Queue, event: dict):
+        if events.full():
+            # Replace the backlog with a marker telling the client to refetch
+            while not events.empty():
+                events.get_nowait()
+            event = {"type": "resync"}
+        events.put_nowait(event)
+
+
+capture_events = _EventBroadcaster()
+capture_manager.listeners.append(capture_events.publish)
+
+
+@app.get("/api/events")
+async def capture_events_api():
+    """
+    Server-sent events for capture changes: ``created``, ``updated`` and
+    ``deleted`` carry the capture's id (and revision/timestamp), ``cleared``
+    means every capture is gone, ``resync`` that events were dropped.
+    """
+    events = capture_events.subscribe()
+    
+    async def stream():
+        try:
+            yield "retry: 2000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(events.get(), EVENT_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            capture_events.unsubscribe(events)
+    
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
 
 
 @app.delete("/api/captures/{capture_id}")
@@ -574,24 +1869,102 @@ async def websocket_endpoint(websocket: WebSocket):
 
 async def run_mcp_server():
     """Run the MCP server for Copilot integration."""
-    async with stdio_server() as (read_stream, write_stream):
-        await mcp_server.run(
-            read_stream,
-            write_stream,
-            InitializationOptions(
-                server_name="grabitar",
-                server_version="1.0.0",
-                capabilities=mcp_server.get_capabilities(
-                    notification_options=NotificationOptions(),
-                    experimental_capabilities={},
+    capabilities = mcp_server.get_capabilities(
+        notification_options=NotificationOptions(resources_changed=True),
+        experimental_capabilities={},
+    )
+    # The SDK never advertises resource subscriptions, even with handlers registered
+    capabilities.resources.subscribe = True
+    
+    sweeper = asyncio.create_task(_sweep_expired_periodically())
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await mcp_server.run(
+                read_stream,
+                write_stream,
+                InitializationOptions(
+                    server_name="grabitar",
+                    server_version="1.0.0",
+                    capabilities=capabilities,
                 )
             )
-        )
+    finally:
+        sweeper.cancel()
+
+
+def _bind_unix_socket(path: str) -> Optional[socket.socket]:
+    """
+    Listen on a Unix domain socket readable only by this user, replacing a
+    stale socket file but never one a running server still answers on.
+    """
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except ConnectionRefusedError:
+            os.remove(path)
+        else:
+            logger.warning(f"Another server is listening on {path}; not binding it")
+            return None
+        finally:
+            probe.close()
+    
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o177)
+    try:
+        sock.bind(path)
+    finally:
+        os.umask(old_umask)
+    sock.set_inheritable(True)
+    return sock
 
 
-def run_web_server():
-    """Run the FastAPI web server."""
-    uvicorn.run(app, host="0.0.0.0", port=9876, log_level="info")
+def run_web_server(workers: int = 1):
+    """
+    Run the FastAPI web server on TCP port 9876 and, where supported, on a
+    Unix domain socket for local clients (see grabitar_client.py).
+    
+    With several workers, each is a separate process importing this module
+    and serving both sockets; they share the capture store named by
+    GRABITAR_STORE_DIR (set before the workers start).
+    """
+    if workers > 1:
+        os.environ["GRABITAR_WORKERS"] = str(workers)
+        os.environ.setdefault("GRABITAR_STORE_DIR", default_shared_store_dir())
+        logger.info(f"Starting {workers} workers sharing the capture store in {os.environ['GRABITAR_STORE_DIR']}")
+        config = uvicorn.Config("server:app", host="0.0.0.0", port=9876, log_level="info", workers=workers)
+    else:
+        config = uvicorn.Config(app, host="0.0.0.0", port=9876, log_level="info")
+    server = uvicorn.Server(config)
+    sockets = [config.bind_socket()]
+    
+    socket_path = default_socket_path()
+    unix_socket = None
+    if hasattr(socket, "AF_UNIX"):
+        try:
+            unix_socket = _bind_unix_socket(socket_path)
+        except OSError as e:
+            logger.warning(f"Cannot listen on {socket_path}: {e}")
+    if unix_socket is not None:
+        sockets.append(unix_socket)
+        logger.info(f"Local clients can connect on unix socket {socket_path}")
+    
+    try:
+        if workers > 1:
+            from uvicorn.supervisors import Multiprocess
+            try:
+                supervisor = Multiprocess(config, target=server.run, sockets=sockets)
+            except TypeError:
+                # Newer uvicorn builds each worker's server itself
+                supervisor = Multiprocess(config, sockets=sockets)
+            supervisor.run()
+        else:
+            server.run(sockets=sockets)
+    finally:
+        if unix_socket is not None:
+            unix_socket.close()
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
 
 
 if __name__ == "__main__":
@@ -602,5 +1975,8 @@ if __name__ == "__main__":
         asyncio.run(run_mcp_server())
     else:
         # Run in web server mode
+        workers = WORKERS
+        if "--workers" in sys.argv:
+            workers = max(1, int(sys.argv[sys.argv.index("--workers") + 1]))
         logger.info("Starting Grabitar web server on http://localhost:9876")
-        run_web_server()
+        run_web_server(workers)
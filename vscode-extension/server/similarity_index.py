@@ -0,0 +1,127 @@
+"""
+Perceptual similarity search for Grabitar captures.
+Captures are hashed with a 64-bit difference hash (dHash) and indexed in a
+BK-tree, so near-duplicates are found by Hamming distance without decoding.
+"""
+
+from typing import Dict, Hashable, List, Optional, Tuple
+from PIL import Image
+
+HASH_BITS = 64
+
+
+def dhash(image: Image.Image, box: Optional[Tuple[int, int, int, int]] = None) -> int:
+    """
+    64-bit difference hash of an image.
+    
+    The image is shrunk to 9x8 grayscale and each bit records whether a
+    pixel is brighter than its right-hand neighbour, so the hash survives
+    rescaling, recompression and small edits. With a ``box``, only that
+    part of the image is hashed, without cropping it out first.
+    """
+    small = image.convert("L", dither=Image.Dither.NONE) if image.mode != "L" else image
+    small = small.resize((9, 8), Image.Resampling.BOX, box=box, reducing_gap=2.0)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(8):
+        offset = row * 9
+        for col in range(8):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over 64-bit hashes under Hamming distance.
+    
+    Items sharing a hash share a node. Removal only drops the item from its
+    node; emptied nodes stay in place as routing nodes until the tree is
+    rebuilt, which happens once they outnumber the live ones.
+    """
+    
+    def __init__(self):
+        # node: [hash, items, {distance: child node}]
+        self._root: Optional[list] = None
+        self._nodes: Dict[int, list] = {}
+        self._hash_of: Dict[Hashable, int] = {}
+        self._empty_nodes = 0
+    
+    def __len__(self) -> int:
+        return len(self._hash_of)
+    
+    def __contains__(self, item: Hashable) -> bool:
+        return item in self._hash_of
+    
+    def add(self, item: Hashable, value: int):
+        """Index ``item`` under hash ``value`` (replacing any earlier hash)."""
+        if item in self._hash_of:
+            self.remove(item)
+        self._hash_of[item] = value
+        
+        node = self._nodes.get(value)
+        if node is not None:
+            if not node[1]:
+                self._empty_nodes -= 1
+            node[1].add(item)
+            return
+        
+        node = [value, {item}, {}]
+        self._nodes[value] = node
+        if self._root is None:
+            self._root = node
+            return
+        parent = self._root
+        while True:
+            distance = hamming(value, parent[0])
+            child = parent[2].get(distance)
+            if child is None:
+                parent[2][distance] = node
+                return
+            parent = child
+    
+    def remove(self, item: Hashable):
+        value = self._hash_of.pop(item, None)
+        if value is None:
+            return
+        items = self._nodes[value][1]
+        items.discard(item)
+        if not items:
+            self._empty_nodes += 1
+            if self._empty_nodes > len(self._nodes) // 2:
+                self._rebuild()
+    
+    def clear(self):
+        self._root = None
+        self._nodes.clear()
+        self._hash_of.clear()
+        self._empty_nodes = 0
+    
+    def _rebuild(self):
+        items = list(self._hash_of.items())
+        self.clear()
+        for item, value in items:
+            self.add(item, value)
+    
+    def search(self, value: int, max_distance: int) -> List[Tuple[int, Hashable]]:
+        """All (distance, item) pairs within ``max_distance`` of ``value``, nearest first."""
+        results: List[Tuple[int, Hashable]] = []
+        if self._root is None:
+            return results
+        
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= max_distance:
+                results.extend((distance, item) for item in node[1])
+            # Triangle inequality: only children in this band can be close enough
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        
+        results.sort(key=lambda result: result[0])
+        return results
@@ -0,0 +1,123 @@
+"""
+Static assets for Grabitar.
+Everything under static/ is read once at startup, fingerprinted by content
+hash and precompressed, then served from memory.
+"""
+
+import hashlib
+import mimetypes
+import os
+import re
+from typing import Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from compression import COMPRESSIBLE_TYPES, ENCODINGS, choose_encoding, compress
+
+# Fingerprinted URLs never change content, so clients may keep them forever
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+# Plain URLs (such as the one saved in bookmarklets) are revalidated each
+# time; an unchanged asset costs a 304 without a body
+REVALIDATE_CACHE = "no-cache"
+
+
+class _Asset:
+    def __init__(self, name: str, data: bytes):
+        self.name = name
+        self.media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if self.media_type.startswith("text/") or self.media_type == "application/javascript":
+            self.media_type += "; charset=utf-8"
+        digest = hashlib.sha256(data).hexdigest()
+        # Weak: the same tag covers the identity and compressed bodies
+        self.etag = f'W/"{digest[:32]}"'
+        stem, extension = os.path.splitext(name)
+        self.hashed_name = f"{stem}.{digest[:12]}{extension}"
+        self.bodies: Dict[Optional[str], bytes] = {None: data}
+    
+    def precompress(self):
+        if self.media_type.split(";")[0] not in COMPRESSIBLE_TYPES:
+            return
+        for encoding in ENCODINGS:
+            body = compress(self.bodies[None], encoding, static=True)
+            if len(body) < len(self.bodies[None]):
+                self.bodies[encoding] = body
+
+
+class StaticAssets:
+    """
+    In-memory static files with content-hash URLs.
+    
+    ``url(name)`` gives an asset's fingerprinted URL (``/static/app.<hash>.js``),
+    served with immutable caching. The plain URL keeps working for links that
+    cannot change, such as saved bookmarklets, and is revalidated by ETag.
+    HTML files have their ``/static/...`` references rewritten to
+    fingerprinted URLs.
+    """
+    
+    def __init__(self, directory: str, url_prefix: str = "/static"):
+        self.directory = directory
+        self.url_prefix = url_prefix.rstrip("/")
+        self._by_name: Dict[str, _Asset] = {}
+        self._by_hashed_name: Dict[str, _Asset] = {}
+        
+        if os.path.isdir(directory):
+            for root, _, files in os.walk(directory):
+                for filename in sorted(files):
+                    path = os.path.join(root, filename)
+                    name = os.path.relpath(path, directory).replace(os.sep, "/")
+                    with open(path, "rb") as f:
+                        self._by_name[name] = _Asset(name, f.read())
+        
+        # Rewrite HTML only after every asset has its hash
+        for asset in list(self._by_name.values()):
+            if asset.media_type.startswith("text/html"):
+                html = self._rewrite_links(asset.bodies[None].decode("utf-8"))
+                self._by_name[asset.name] = _Asset(asset.name, html.encode("utf-8"))
+        for asset in self._by_name.values():
+            asset.precompress()
+            self._by_hashed_name[asset.hashed_name] = asset
+    
+    def __contains__(self, name: str) -> bool:
+        return name in self._by_name
+    
+    def url(self, name: str) -> str:
+        """The fingerprinted URL of an asset."""
+        return f"{self.url_prefix}/{self._by_name[name].hashed_name}"
+    
+    def _rewrite_links(self, html: str) -> str:
+        pattern = re.escape(self.url_prefix) + r"/([\w./-]+)"
+        
+        def replace(match):
+            name = match.group(1)
+            return self.url(name) if name in self._by_name else match.group(0)
+        
+        return re.sub(pattern, replace, html)
+    
+    def response(self, request: Request, name: str) -> Optional[Response]:
+        """
+        The response for an asset by plain or fingerprinted name, or None if
+        there is no such asset.
+        """
+        asset = self._by_hashed_name.get(name)
+        cache_control = IMMUTABLE_CACHE
+        if asset is None:
+            asset = self._by_name.get(name)
+            cache_control = REVALIDATE_CACHE
+        if asset is None:
+            return None
+        
+        headers = {
+            "Cache-Control": cache_control,
+            "ETag": asset.etag,
+            "Vary": "Accept-Encoding",
+        }
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and asset.etag in (tag.strip() for tag in if_none_match.split(",")):
+            return Response(status_code=304, headers=headers)
+        
+        encoding = choose_encoding(request.headers.get("accept-encoding"),
+                                   [e for e in asset.bodies if e is not None])
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        return Response(content=asset.bodies[encoding], media_type=asset.media_type, headers=headers)